@@ -0,0 +1,206 @@
+"""Python API for running clowder commands in process and returning their results"""
+
+from __future__ import print_function
+
+import contextlib
+import os
+import re
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import clowder.util.logs as logs
+from clowder.clowder_controller import ClowderController
+from clowder.error.clowder_error import ClowderError
+from clowder.git.project_repo import ProjectRepo
+from clowder.util.forall import ForallRunner, ForallTask, load_function
+
+# Disable warnings shown by pylint for catching too general exception
+# pylint: disable=W0703
+
+
+class Workspace(object):
+    """Class loading clowder.yaml once and returning results of commands instead of printing them and exiting"""
+
+    def __init__(self, root_directory):
+        self.root_directory = os.path.abspath(root_directory)
+        self.controller = None
+        self.reload()
+
+    def forall(self, command, group_names=None, project_names=None, skip=None, ignore_errors=True, jobs=1,
+               python=False):
+        """Run command, or python function given as module:function, in project directories"""
+
+        projects = self.projects(group_names=group_names, project_names=project_names, skip=skip)
+        if python:
+            try:
+                load_function(command, self.root_directory)
+            except (ImportError, AttributeError, ValueError) as err:
+                raise ClowderError('Failed to load forall function ' + command + ': ' + str(err))
+
+        tasks = [ForallTask(p.name, p.path, p.full_path(), command, p.forall_env()) for p in projects]
+        runner = ForallRunner(jobs, output='json')
+        logs.start(self.root_directory, 'api forall ' + command)
+        with _quiet():
+            if python:
+                runner.run_python(tasks)
+            else:
+                runner.run(tasks)
+
+        results = []
+        for task in tasks:
+            result = task.record()
+            result['status'] = 'skipped' if task.missing else 'failed' if task.failed() else 'ok'
+            results.append(result)
+        if not ignore_errors and any([r['status'] == 'failed' for r in results]):
+            raise ClowderError('forall command failed: ' + command)
+        return results
+
+    def herd(self, group_names=None, project_names=None, skip=None, branch=None, tag=None, depth=None,
+             rebase=False, jobs=1):
+        """Clone projects or update latest from upstream, returning result for each project"""
+
+        projects = self.projects(group_names=group_names, project_names=project_names, skip=skip)
+
+        def herd_project(project):
+            """Herd project"""
+
+            project.herd(branch=branch, tag=tag, depth=depth, rebase=rebase, parallel=True)
+
+        return self._run('herd', projects, herd_project, jobs)
+
+    def projects(self, group_names=None, project_names=None, skip=None):
+        """Return projects in groups, or projects if given, without skipped projects"""
+
+        groups = self.controller.groups
+        if project_names is None:
+            group_names = [g.name for g in groups] if group_names is None else group_names
+            _validate_names('group', group_names, [g.name for g in groups])
+            projects = [p for g in groups if g.name in group_names for p in g.projects]
+        else:
+            _validate_names('project', project_names, [p.name for g in groups for p in g.projects])
+            projects = [p for g in groups for p in g.projects if p.name in project_names]
+        return [p for p in projects if skip is None or p.name not in skip]
+
+    def reload(self):
+        """Load clowder.yaml, raising ClowderError if it's invalid"""
+
+        with _quiet() as output:
+            try:
+                controller = ClowderController(self.root_directory)
+            except (ClowderError, KeyError) as err:
+                raise ClowderError(_error_message(err, output))
+            except SystemExit:
+                raise ClowderError(_error_message('Failed to load clowder.yaml', output))
+        self.controller = controller
+
+    def reset(self, group_names=None, project_names=None, skip=None, timestamp_project=None, jobs=1):
+        """Reset project branches to upstream or checkout tag/sha, returning result for each project"""
+
+        timestamp = None
+        if timestamp_project is not None:
+            project = self.projects(project_names=[timestamp_project])[0]
+            timestamp = project.get_current_timestamp()
+        projects = self.projects(group_names=group_names, project_names=project_names, skip=skip)
+
+        def reset_project(project):
+            """Reset project"""
+
+            project.reset(timestamp=timestamp, parallel=True)
+
+        return self._run('reset', projects, reset_project, jobs)
+
+    def status(self, group_names=None, project_names=None, skip=None):
+        """Return current ref and commit counts for each project"""
+
+        records = []
+        for group in self.controller.groups:
+            for project in self.projects(group_names=group_names, project_names=project_names, skip=skip):
+                if project not in group.projects:
+                    continue
+                record = {'name': project.name, 'path': project.path, 'group': group.name,
+                          'missing': not ProjectRepo.existing_git_repository(project.full_path()),
+                          'ref': None, 'detached': None, 'dirty': None,
+                          'local_commits': None, 'upstream_commits': None}
+                if not record['missing']:
+                    status = ProjectRepo.cached_ref_status(project.full_path())
+                    record.update({'ref': status['ref'], 'detached': status['detached'],
+                                   'dirty': project.is_dirty(),
+                                   'local_commits': int(status['local_commits']),
+                                   'upstream_commits': int(status['upstream_commits'])})
+                records.append(record)
+        return records
+
+    def _run(self, command, projects, function, jobs):
+        """Call function for projects with bounded concurrency, returning result for each project"""
+
+        def run_project(project):
+            """Call function for project, catching errors"""
+
+            result = {'name': project.name, 'path': project.path, 'status': 'ok', 'error': None,
+                      'duration': 0.0, 'log_file': None, 'output': ''}
+            if project.is_dirty():
+                result.update({'status': 'skipped', 'error': 'Dirty repo, commit or stash changes first'})
+                return result
+            start = time.time()
+            try:
+                function(project)
+            except SystemExit:
+                result.update({'status': 'failed', 'error': 'Command failed'})
+            except Exception as err:
+                result.update({'status': 'failed', 'error': _plain(str(err).strip()) or 'Command failed'})
+            result['duration'] = round(time.time() - start, 3)
+            tail = logs.tail(project.full_path())
+            if tail is not None:
+                result.update({'log_file': tail[0], 'output': '\n'.join(tail[1])})
+            return result
+
+        if not projects:
+            return []
+        logs.start(self.root_directory, 'api ' + command)
+        with _quiet():
+            pool = ThreadPool(max(1, min(jobs, len(projects))))
+            try:
+                return pool.map(run_project, projects)
+            finally:
+                pool.close()
+                pool.join()
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Capture stdout, yielding the buffer it's written to"""
+
+    output = StringIO()
+    stdout = sys.stdout
+    sys.stdout = output
+    try:
+        yield output
+    finally:
+        sys.stdout = stdout
+
+
+def _error_message(err, output):
+    """Return error message with output printed before the error, without color codes"""
+
+    lines = [l for l in output.getvalue().splitlines() if l.strip()] + [str(err)]
+    return _plain('\n'.join(lines))
+
+
+def _plain(text):
+    """Return text without terminal color codes"""
+
+    return re.sub(r'\x1b\[[0-9;]*m', '', text)
+
+
+def _validate_names(kind, names, valid_names):
+    """Raise ClowderError for names that aren't in clowder.yaml"""
+
+    unknown = [n for n in names if n not in valid_names]
+    if unknown:
+        raise ClowderError('Unknown ' + kind + ' ' + ', '.join(unknown))
@@ -2,44 +2,63 @@
 
 from __future__ import print_function
 
+import atexit
 import multiprocessing as mp
 import os
 import signal
 import sys
+import time
+
+from multiprocessing.pool import ThreadPool
 
 import psutil
 from termcolor import cprint
 
 import clowder.util.formatting as fmt
 import clowder.util.clowder_yaml as clowder_yaml
+import clowder.util.logs as logs
+import clowder.util.metrics as metrics
+import clowder.util.profiler as profiler
 from clowder.error.clowder_error import ClowderError
+from clowder.error.clowder_git_error import ClowderGitError
 from clowder.model.group import Group
 from clowder.model.source import Source
-from clowder.util.progress import Progress
+from clowder.util.forall import ForallRunner, ForallTask, load_function, print_json, print_summary
+from clowder.util.progress import Progress, set_progress_queue
 
 
-def herd_project(project, branch, tag, depth, rebase):
+def herd_project(project, branch, tag, depth, rebase, run):
     """Clone project or update latest from upstream"""
 
-    project.herd(branch=branch, tag=tag, depth=depth, rebase=rebase, parallel=True)
+    logs.set_run(run)
+    with metrics.project(project, 'herd'):
+        project.herd(branch=branch, tag=tag, depth=depth, rebase=rebase, parallel=True)
 
 
-def reset_project(project, timestamp):
-    """Reset project branches to upstream or checkout tag/sha as detached HEAD"""
+def prune_project(project, local_branches, remote_branches, force):
+    """Prune project branches, returning error message if it failed"""
 
-    project.reset(timestamp=timestamp, parallel=True)
+    try:
+        project.prune(local_branches, remote_branches, force=force, parallel=True)
+    except ClowderGitError as err:
+        return str(err)
+    return None
 
 
-def run_project(project, command, ignore_errors):
-    """Run command or script in project directory"""
+def reset_project(project, timestamp, run):
+    """Reset project branches to upstream or checkout tag/sha as detached HEAD"""
 
-    project.run(command, ignore_errors, parallel=True)
+    logs.set_run(run)
+    with metrics.project(project, 'reset'):
+        project.reset(timestamp=timestamp, parallel=True)
 
 
-def sync_project(project, rebase):
+def sync_project(project, rebase, run):
     """Sync fork project with upstream"""
 
-    project.sync(rebase, parallel=True)
+    logs.set_run(run)
+    with metrics.project(project, 'sync'):
+        project.sync(rebase, parallel=True)
 
 
 def async_callback(val):
@@ -52,12 +71,15 @@ def async_callback(val):
 __clowder_parent_id__ = os.getpid()
 
 
-def worker_init():
+def worker_init(progress_queue, metrics_queue):
     """
     Process pool terminator
     Adapted from https://stackoverflow.com/a/45259908
     """
 
+    set_progress_queue(progress_queue)
+    metrics.set_metrics_queue(metrics_queue)
+
     def sig_int(signal_num, frame):
         """Signal handler"""
 
@@ -74,10 +96,40 @@ def worker_init():
 
 
 __clowder_results__ = []
-__clowder_pool__ = mp.Pool(initializer=worker_init)
+__clowder_pool__ = None
 __clowder_progress__ = Progress()
 
 
+def clowder_pool():
+    """
+    Return process pool, creating it on first use
+    Workers are forked lazily so they inherit environment changes made during startup, and are kept for later
+    commands run by the same process
+    """
+
+    global __clowder_pool__  # pylint: disable=W0603
+    if __clowder_pool__ is None:
+        __clowder_pool__ = mp.Pool(initializer=worker_init,
+                                   initargs=(__clowder_progress__.queue(), metrics.queue()))
+        atexit.register(close_pool)
+    return __clowder_pool__
+
+
+def close_pool(terminate=False):
+    """Wait for worker processes to finish, or stop them immediately if terminate is True"""
+
+    global __clowder_pool__  # pylint: disable=W0603
+    if __clowder_pool__ is None:
+        return
+    pool, __clowder_pool__ = __clowder_pool__, None
+    if terminate:
+        pool.close()
+        pool.terminate()
+        return
+    pool.close()
+    pool.join()
+
+
 class ClowderController(object):
     """Class encapsulating project information from clowder.yaml for controlling clowder"""
 
@@ -88,8 +140,10 @@ class ClowderController(object):
         self.sources = []
         self._max_import_depth = 10
         yaml_file = os.path.join(self.root_directory, 'clowder.yaml')
-        self._validate_yaml(yaml_file, self._max_import_depth)
-        self._load_yaml()
+        with profiler.phase('manifest validation'):
+            self._validate_yaml(yaml_file, self._max_import_depth)
+        with profiler.phase('manifest load'):
+            self._load_yaml()
 
     def branch(self, group_names, project_names=None, skip=None, local=False, remote=False):
         """Show branches"""
@@ -160,8 +214,9 @@ class ClowderController(object):
         for group in groups:
             self._run_group_command(group, [], 'fetch_all')
 
-    def forall(self, command, ignore_errors, group_names, project_names=None, skip=None, parallel=False):
-        """Runs command or script in project directories specified"""
+    def forall(self, command, ignore_errors, group_names, project_names=None, skip=None, parallel=False,
+               jobs=None, output=None, python=False):
+        """Runs command, script, or python function in project directories specified"""
 
         if skip is None:
             skip = []
@@ -171,8 +226,10 @@ class ClowderController(object):
         else:
             projects = [p for g in self.groups for p in g.projects if p.name in project_names]
 
-        if parallel:
-            self._forall_parallel(command, skip, ignore_errors, projects)
+        if parallel and jobs is None:
+            jobs = mp.cpu_count()
+        if jobs is not None or output is not None or python:
+            self._forall_jobs(command, skip, ignore_errors, projects, jobs or 1, output or 'prefix', python)
             return
 
         # Serial
@@ -245,8 +302,8 @@ class ClowderController(object):
             for project in projects:
                 if project.name in skip:
                     continue
-                result = __clowder_pool__.apply_async(herd_project, args=(project, branch, tag, depth, rebase),
-                                                      callback=async_callback)
+                args = (project, branch, tag, depth, rebase, logs.current_run())
+                result = clowder_pool().apply_async(herd_project, args=args, callback=async_callback)
                 __clowder_results__.append(result)
             pool_handler(len(projects))
             return
@@ -257,8 +314,8 @@ class ClowderController(object):
         for project in projects:
             if project.name in skip:
                 continue
-            result = __clowder_pool__.apply_async(herd_project, args=(project, branch, tag, depth, rebase),
-                                                  callback=async_callback)
+            args = (project, branch, tag, depth, rebase, logs.current_run())
+            result = clowder_pool().apply_async(herd_project, args=args, callback=async_callback)
             __clowder_results__.append(result)
         pool_handler(len(projects))
 
@@ -271,20 +328,122 @@ class ClowderController(object):
             clowder_yaml.print_yaml(self.root_directory)
         sys.exit()  # exit early to prevent printing extra newline
 
-    def prune(self, group_names, branch, project_names=None, skip=None, force=False, local=False, remote=False):
-        """Prune branches"""
+    def maintenance(self, group_names, project_names=None, skip=None, jobs=1):
+        """Run incremental git maintenance for projects"""
+
+        projects = self._selected_projects(group_names, project_names, skip)
+        print(' - Run maintenance with ' + str(jobs) + ' jobs\n')
+
+        start = time.time()
+        pool = ThreadPool(max(1, min(jobs, len(projects))))
+        failed = False
+        reclaimed = 0
+        try:
+            for project, result in pool.imap_unordered(lambda p: (p, p.maintenance()), projects):
+                print(fmt.maintenance_result(project.path, result))
+                if result is None:
+                    continue
+                reclaimed += result['size_before'] - result['size_after']
+                failed = failed or result['failed_command'] is not None
+        except (KeyboardInterrupt, SystemExit):
+            pool.terminate()
+            sys.exit(1)
+        pool.close()
+        pool.join()
+
+        print('\n' + fmt.maintenance_summary(len(projects), reclaimed, time.time() - start))
+        if failed:
+            sys.exit(1)
+
+    def maintenance_schedule(self, group_names, project_names=None, skip=None, enable=True):
+        """Register projects for or unregister them from git's background maintenance"""
+
+        for project in self._selected_projects(group_names, project_names, skip):
+            print(project.status())
+            project.maintenance_schedule(enable=enable)
+
+        if enable:
+            print("\n - Registered projects are maintained hourly while git's scheduler is running")
+            print(' - Start it once with ' + fmt.command('git maintenance start'))
+
+    def prefetch(self, group_names, project_names=None, skip=None, jobs=1):
+        """Fetch project remotes into refs/prefetch without updating remote tracking branches or work trees"""
+
+        projects = self._selected_projects(group_names, project_names, skip)
+        print(' - Prefetch with ' + str(jobs) + ' jobs\n')
+
+        start = time.time()
+        pool = ThreadPool(max(1, min(jobs, len(projects))))
+        failed = False
+        try:
+            for project, result in pool.imap_unordered(lambda p: (p, p.prefetch()), projects):
+                print(fmt.prefetch_result(project.path, result))
+                failed = failed or (result is not None and result['failed_command'] is not None)
+        except (KeyboardInterrupt, SystemExit):
+            pool.terminate()
+            sys.exit(1)
+        pool.close()
+        pool.join()
+
+        print('\n' + fmt.prefetch_summary(len(projects), time.time() - start))
+        if failed:
+            sys.exit(1)
+
+    def prune(self, group_names, branches, project_names=None, skip=None, force=False, local=False, remote=False):
+        """Prune branches matching names or glob patterns"""
 
         if skip is None:
             skip = []
         if project_names is None:
             groups = [g for g in self.groups if g.name in group_names]
             self._validate_groups(groups)
-            self._prune_groups(groups, branch, skip=skip, force=force, local=local, remote=remote)
-            return
+            projects = [p for g in groups for p in g.projects]
+        else:
+            projects = [p for g in self.groups for p in g.projects if p.name in project_names]
+            self._validate_projects(projects)
+        projects = [p for p in projects if p.name not in skip]
 
-        projects = [p for g in self.groups for p in g.projects if p.name in project_names]
-        self._validate_projects(projects)
-        self._prune_projects(projects, branch, skip=skip, force=force, local=local, remote=remote)
+        pool = ThreadPool(max(1, min(mp.cpu_count(), len(projects))))
+        try:
+            candidates = pool.map(lambda p: p.prune_candidates(branches, local=local, remote=remote), projects)
+        except (KeyboardInterrupt, SystemExit):
+            pool.terminate()
+            sys.exit(1)
+
+        prune_projects = [(p, c[0], c[1]) for p, c in zip(projects, candidates) if c[0] or c[1]]
+        if not prune_projects:
+            pool.close()
+            if local and remote:
+                cprint(' - No local or remote branches to prune\n', 'red')
+            elif local:
+                print(' - No local branches to prune\n')
+            else:
+                cprint(' - No remote branches to prune\n', 'red')
+            sys.exit()
+
+        if local and remote:
+            print(' - Prune local and remote branches\n')
+
+        failed = False
+        try:
+            results = pool.imap(lambda p: prune_project(p[0], p[1], p[2], force), prune_projects)
+            for (project, local_branches, remote_branches), error in zip(prune_projects, results):
+                print(project.status())
+                if local_branches:
+                    print(' - Delete local branches ' + fmt.ref_list(local_branches))
+                if remote_branches:
+                    print(' - Delete remote branches ' + fmt.ref_list(remote_branches))
+                if error is not None:
+                    failed = True
+                    print(error)
+        except (KeyboardInterrupt, SystemExit):
+            pool.terminate()
+            sys.exit(1)
+        pool.close()
+        pool.join()
+
+        if failed:
+            sys.exit(1)
 
     def reset(self, group_names, project_names=None, skip=None, timestamp_project=None, parallel=False):
         """Reset project branches to upstream or checkout tag/sha as detached HEAD"""
@@ -375,10 +534,11 @@ class ClowderController(object):
         """Print status for groups"""
 
         groups = [g for g in self.groups if g.name in group_names]
-        for group in groups:
-            print(fmt.group_name(group.name))
-            for project in group.projects:
-                print(project.status(padding=padding))
+        with profiler.phase('output'):
+            for group in groups:
+                print(fmt.group_name(group.name))
+                for project in group.projects:
+                    print(project.status(padding=padding))
 
     def sync(self, project_names, rebase=False, parallel=False):
         """Sync projects"""
@@ -390,19 +550,30 @@ class ClowderController(object):
 
         # Serial
         for project in projects:
-            project.sync(rebase=rebase)
-
-    @staticmethod
-    def _existing_branch_groups(groups, branch, is_remote):
-        """Checks whether at least one branch exists for projects in groups"""
+            with profiler.phase('project sync'), metrics.project(project, 'sync'):
+                project.sync(rebase=rebase)
 
-        return any([p.existing_branch(branch, is_remote=is_remote) for g in groups for p in g.projects])
+    def worktree_add(self, primary_directory, branch=None):
+        """Add projects as worktrees of their clones in primary workspace, sharing their object stores"""
 
-    @staticmethod
-    def _existing_branch_projects(projects, branch, is_remote):
-        """Checks whether at least one branch exists for projects"""
+        projects = [p for g in self.groups for p in g.projects]
+        start = time.time()
+        pool = ThreadPool(max(1, min(mp.cpu_count(), len(projects))))
+        failed = False
+        try:
+            for project, result in pool.imap(lambda p: (p, p.worktree_add(primary_directory, branch=branch)),
+                                             projects):
+                print(fmt.worktree_result(project.path, result))
+                failed = failed or (result is not None and result['failed_command'] is not None)
+        except (KeyboardInterrupt, SystemExit):
+            pool.terminate()
+            sys.exit(1)
+        pool.close()
+        pool.join()
 
-        return any([p.existing_branch(branch, is_remote=is_remote) for p in projects])
+        print('\n' + fmt.worktree_summary(len(projects), time.time() - start, self.root_directory))
+        if failed:
+            sys.exit(1)
 
     def _fetch_groups(self, group_names):
         """Fetch all projects for specified groups"""
@@ -418,27 +589,43 @@ class ClowderController(object):
         for project in projects:
             project.fetch_all()
 
-    @staticmethod
-    def _forall_parallel(command, skip, ignore_errors, projects):
-        """Runs command or script in project directories specified"""
+    def _forall_jobs(self, command, skip, ignore_errors, projects, jobs, output, python):
+        """Runs command, script, or python function in project directories with bounded concurrency"""
 
-        print(' - Run forall commands in parallel\n')
-        for project in projects:
-            if project.name in skip:
-                continue
-            print(project.status())
-            if not os.path.isdir(project.full_path()):
-                cprint(" - Project is missing", 'red')
+        projects = [p for p in projects if p.name not in skip]
+        tasks = [ForallTask(p.name, p.path, p.full_path(), command, p.forall_env()) for p in projects]
+        if python:
+            try:
+                load_function(command, self.root_directory)
+            except (ImportError, AttributeError, ValueError) as err:
+                cprint(' - Failed to load forall function ' + command, 'red')
+                print(fmt.error(err))
+                sys.exit(1)
 
-        print('\n' + fmt.command(command))
-        for project in projects:
-            if project.name in skip:
-                continue
-            result = __clowder_pool__.apply_async(run_project, args=(project, command, ignore_errors),
-                                                  callback=async_callback)
-            __clowder_results__.append(result)
+        if output != 'json':
+            print(' - Run forall commands with ' + str(jobs) + ' jobs\n')
+            print(fmt.command(command) + '\n')
 
-        pool_handler(len(projects))
+        start = time.time()
+        runner = ForallRunner(jobs, output=output)
+        if python:
+            runner.run_python(tasks)
+        else:
+            runner.run(tasks)
+        duration = time.time() - start
+        if output == 'json':
+            print_json(command, tasks)
+        else:
+            print_summary(tasks, duration)
+
+        for task in tasks:
+            status = 'skipped' if task.missing else 'failed' if task.failed() else 'ok'
+            metrics.record_project({'project': task.name, 'command': 'forall', 'status': status,
+                                    'duration': task.duration, 'bytes': 0, 'noop': False})
+        metrics.record_pool(jobs, duration, sum([t.duration for t in tasks]))
+
+        if not ignore_errors and any([t.failed() for t in tasks]):
+            sys.exit(1)
 
     def _get_timestamp(self, timestamp_project):
         """Return timestamp for project"""
@@ -546,69 +733,6 @@ class ClowderController(object):
                 print('  ' + fmt.fork_string(project.name))
                 print('  ' + fmt.fork_string(project.fork.name))
 
-    def _prune_groups(self, groups, branch, skip=None, force=False, local=False, remote=False):
-        """Prune group branches"""
-
-        if local and remote:
-            local_branch_exists = self._existing_branch_groups(groups, branch, is_remote=False)
-            remote_branch_exists = self._existing_branch_groups(groups, branch, is_remote=True)
-            branch_exists = local_branch_exists or remote_branch_exists
-            if not branch_exists:
-                cprint(' - No local or remote branches to prune\n', 'red')
-                sys.exit()
-
-            print(' - Prune local and remote branches\n')
-            for group in groups:
-                local_branch_exists = group.existing_branch(branch, is_remote=False)
-                remote_branch_exists = group.existing_branch(branch, is_remote=True)
-                if local_branch_exists or remote_branch_exists:
-                    self._run_group_command(group, skip, 'prune', branch, force=force, local=True, remote=True)
-        elif local:
-            if not self._existing_branch_groups(groups, branch, is_remote=False):
-                print(' - No local branches to prune\n')
-                sys.exit()
-
-            for group in groups:
-                if group.existing_branch(branch, is_remote=False):
-                    self._run_group_command(group, skip, 'prune', branch, force=force, local=True)
-        elif remote:
-            if not self._existing_branch_groups(groups, branch, is_remote=True):
-                cprint(' - No remote branches to prune\n', 'red')
-                sys.exit()
-
-            for group in groups:
-                if group.existing_branch(branch, is_remote=True):
-                    self._run_group_command(group, skip, 'prune', branch, remote=True)
-
-    def _prune_projects(self, projects, branch, skip=None, force=False, local=False, remote=False):
-        """Prune project branches"""
-
-        if local and remote:
-            local_branch_exists = self._existing_branch_projects(projects, branch, is_remote=False)
-            remote_branch_exists = self._existing_branch_projects(projects, branch, is_remote=True)
-            branch_exists = local_branch_exists or remote_branch_exists
-            if not branch_exists:
-                cprint(' - No local or remote branches to prune\n', 'red')
-                sys.exit()
-
-            print(' - Prune local and remote branches\n')
-            for project in projects:
-                self._run_project_command(project, skip, 'prune', branch, force=force, local=True, remote=True)
-        elif local:
-            if not self._existing_branch_projects(projects, branch, is_remote=False):
-                print(' - No local branches to prune\n')
-                sys.exit()
-
-            for project in projects:
-                self._run_project_command(project, skip, 'prune', branch, force=force, local=True)
-        elif remote:
-            if not self._existing_branch_projects(projects, branch, is_remote=True):
-                cprint(' - No remote branches to prune\n', 'red')
-                sys.exit()
-
-            for project in projects:
-                self._run_project_command(project, skip, 'prune', branch, remote=True)
-
     def _reset_parallel(self, group_names, project_names=None, skip=None, timestamp_project=None):
         """Reset project branches to upstream or checkout tag/sha as detached HEAD in parallel"""
 
@@ -628,7 +752,8 @@ class ClowderController(object):
             for project in projects:
                 if project.name in skip:
                     continue
-                result = __clowder_pool__.apply_async(reset_project, args=(project, timestamp), callback=async_callback)
+                args = (project, timestamp, logs.current_run())
+                result = clowder_pool().apply_async(reset_project, args=args, callback=async_callback)
                 __clowder_results__.append(result)
             pool_handler(len(projects))
             return
@@ -639,7 +764,8 @@ class ClowderController(object):
         for project in projects:
             if project.name in skip:
                 continue
-            result = __clowder_pool__.apply_async(reset_project, args=(project, timestamp), callback=async_callback)
+            args = (project, timestamp, logs.current_run())
+            result = clowder_pool().apply_async(reset_project, args=args, callback=async_callback)
             __clowder_results__.append(result)
         pool_handler(len(projects))
 
@@ -649,21 +775,38 @@ class ClowderController(object):
 
         print(fmt.group_name(group.name))
         for project in group.projects:
-            print(project.status())
+            with profiler.phase('output'):
+                print(project.status())
             if project.name in skip:
                 print(fmt.skip_project_message())
+                metrics.record_skipped(project, command)
                 continue
-            getattr(project, command)(*args, **kwargs)
+            with profiler.phase('project ' + command), metrics.project(project, command):
+                getattr(project, command)(*args, **kwargs)
 
     @staticmethod
     def _run_project_command(project, skip, command, *args, **kwargs):
         """Run project command and print output"""
 
-        print(project.status())
+        with profiler.phase('output'):
+            print(project.status())
         if project.name in skip:
             print(fmt.skip_project_message())
+            metrics.record_skipped(project, command)
             return
-        getattr(project, command)(*args, **kwargs)
+        with profiler.phase('project ' + command), metrics.project(project, command):
+            getattr(project, command)(*args, **kwargs)
+
+    def _selected_projects(self, group_names, project_names, skip):
+        """Return projects in groups, or projects if given, without skipped projects"""
+
+        if skip is None:
+            skip = []
+        if project_names is None:
+            projects = [p for g in self.groups if g.name in group_names for p in g.projects]
+        else:
+            projects = [p for g in self.groups for p in g.projects if p.name in project_names]
+        return [p for p in projects if p.name not in skip]
 
     @staticmethod
     def _sync_parallel(projects, rebase=False):
@@ -677,7 +820,8 @@ class ClowderController(object):
                 print('  ' + fmt.fork_string(project.fork.name))
 
         for project in projects:
-            result = __clowder_pool__.apply_async(sync_project, args=(project, rebase), callback=async_callback)
+            args = (project, rebase, logs.current_run())
+            result = clowder_pool().apply_async(sync_project, args=args, callback=async_callback)
             __clowder_results__.append(result)
         pool_handler(len(projects))
 
@@ -757,26 +901,39 @@ class ClowderController(object):
 def pool_handler(count):
     """Pool handler for finishing parallel jobs"""
 
+    start = time.time()
+    with profiler.phase('parallel projects'):
+        _pool_handler(count)
+    metrics.record_pool(mp.cpu_count(), time.time() - start)
+
+
+def _pool_handler(count):
+    """Wait for parallel jobs, exiting if any failed"""
+
     print()
     __clowder_progress__.start(count)
 
+    pending = list(__clowder_results__)
+    del __clowder_results__[:]
     try:
-        for result in __clowder_results__:
-            result.get()
-            if not result.successful():
-                __clowder_progress__.close()
-                __clowder_pool__.close()
-                __clowder_pool__.terminate()
-                cprint('\n - Command failed\n', 'red')
-                sys.exit(1)
+        while pending:
+            __clowder_progress__.poll(0.1)
+            # Workers can't exit until the parent reads what they sent, so drain it while waiting
+            metrics.drain()
+            for result in [r for r in pending if r.ready()]:
+                pending.remove(result)
+                result.get()
+                if not result.successful():
+                    __clowder_progress__.close()
+                    close_pool(terminate=True)
+                    cprint('\n - Command failed\n', 'red')
+                    sys.exit(1)
     except Exception as err:
         __clowder_progress__.close()
-        __clowder_pool__.close()
-        __clowder_pool__.terminate()
+        close_pool(terminate=True)
         cprint('\n' + str(err) + '\n', 'red')
         sys.exit(1)
     else:
+        metrics.drain()
         __clowder_progress__.complete()
         __clowder_progress__.close()
-        __clowder_pool__.close()
-        __clowder_pool__.join()
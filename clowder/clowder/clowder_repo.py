@@ -108,6 +108,15 @@ class ClowderRepo(object):
         print(' - Symlink ' + path_output)
         force_symlink(yaml_file, yaml_symlink)
 
+    def linked_version(self):
+        """Return version clowder.yaml symlink points to, or None if it points to the default clowder.yaml"""
+
+        target = os.path.realpath(os.path.join(self.root_directory, 'clowder.yaml'))
+        versions_dir = os.path.realpath(os.path.join(self.clowder_path, 'versions'))
+        if os.path.dirname(os.path.dirname(target)) != versions_dir:
+            return None
+        return os.path.basename(os.path.dirname(target))
+
     def print_status(self, fetch=False):
         """Print clowder repo status"""
 
@@ -164,6 +173,16 @@ class ClowderRepo(object):
         repo = ProjectRepo(self.clowder_path, self.remote, self.default_ref)
         repo.status_verbose()
 
+    def worktree_add(self, root_directory):
+        """Add clowder repo as worktree of this one in new workspace, detached at the current commit"""
+
+        repo = ProjectRepo(self.clowder_path, self.remote, self.default_ref)
+        print(' - Add clowder repo worktree')
+        failed_command = repo.worktree_add(os.path.join(root_directory, '.clowder'), repo.sha())
+        if failed_command is not None:
+            print(fmt.command_failed_error(failed_command))
+            sys.exit(1)
+
     def _validate_groups(self):
         """Validate status of clowder repo"""
 
@@ -4,19 +4,29 @@ from __future__ import print_function
 
 import argparse
 import atexit
+import multiprocessing
 import os
+import shlex
 import sys
+import time
 
 import argcomplete
 import colorama
 from termcolor import cprint, colored
 
+import clowder.daemon as daemon
+import clowder.git.backend as git_backend
 import clowder.util.formatting as fmt
+import clowder.util.logs as logs
+import clowder.util.metrics as metrics
+import clowder.util.profiler as profiler
+import clowder.util.trace as trace
 from clowder.clowder_controller import ClowderController
 from clowder.clowder_repo import ClowderRepo
 from clowder.error.clowder_error import ClowderError
 from clowder.util.connectivity import is_offline
-from clowder.util.subparsers import configure_argparse
+from clowder.util.ssh import SSHMultiplexer
+from clowder.util.subparsers import configure_argparse, parse_global_options
 
 
 def main():
@@ -33,57 +43,120 @@ class Command(object):
     """Command class for parsing commandline options"""
 
     def __init__(self):
+        trace.start_from_environment()
+        # Profiling starts before clowder.yaml is loaded, so global options are parsed ahead of the full parser
+        global_options = parse_global_options(sys.argv[1:])
+        if global_options.profile:
+            profiler.start(global_options.profile_output, memory=global_options.profile_memory)
+
+        try:
+            git_backend.set_backend(global_options.git_backend or git_backend.backend_name())
+        except ClowderError as err:
+            cprint('\n - ' + str(err) + '\n', 'red')
+            sys.exit(1)
+
         self.root_directory = os.getcwd()
+        # Status and diff are answered by the workspace daemon when it's running, skipping clowder.yaml loading
+        if not global_options.profile and daemon.run_command(self.root_directory, sys.argv[1:]):
+            return
+
         self.clowder = None
         self.clowder_repo = None
         self.versions = None
+        self.parser = None
+        self.ssh_multiplexer = SSHMultiplexer()
         self._invalid_yaml = False
+        self._clowder_yaml_loaded = None
         self._version = '2.4.0'
         clowder_path = os.path.join(self.root_directory, '.clowder')
 
         # Load current clowder.yaml config if it exists
         if os.path.isdir(clowder_path):
             clowder_symlink = os.path.join(self.root_directory, 'clowder.yaml')
-            self.clowder_repo = ClowderRepo(self.root_directory)
-            if not os.path.islink(clowder_symlink):
-                print()
-                clowder_output = colored('.clowder', 'green')
-                print(clowder_output)
-                self.clowder_repo.link()
-            try:
-                self.clowder = ClowderController(self.root_directory)
-                self.versions = self.clowder.get_saved_version_names()
-            except (ClowderError, KeyError) as err:
-                self._invalid_yaml = True
-                self._error = err
-            except (KeyboardInterrupt, SystemExit):
-                sys.exit(1)
+            with profiler.phase('startup'):
+                self.clowder_repo = ClowderRepo(self.root_directory)
+                if not os.path.islink(clowder_symlink):
+                    print()
+                    clowder_output = colored('.clowder', 'green')
+                    print(clowder_output)
+                    self.clowder_repo.link()
+            self._load_clowder_yaml()
 
         # clowder argparse setup
-        command_description = 'Utility for managing multiple git repositories'
-        parser = argparse.ArgumentParser(description=command_description,
-                                         formatter_class=argparse.RawDescriptionHelpFormatter)
-        configure_argparse(parser, self.clowder, self.versions)
+        with profiler.phase('argparse'):
+            self.parser = self._configure_parser()
 
-        # Argcomplete and arguments parsing
-        argcomplete.autocomplete(parser)
+            # Argcomplete and arguments parsing
+            argcomplete.autocomplete(self.parser)
 
         # Register exit handler to display trailing newline
         self._display_trailing_newline = True
         atexit.register(self._exit_handler_formatter)
         if not self._invalid_yaml:
             print()
-        self.args = parser.parse_args()
+        self.args = self.parser.parse_args()
         self._display_trailing_newline = False
 
         # Check for unrecognized command
         if self.args.clowder_command is None or not hasattr(self, self.args.clowder_command):
-            exit_unrecognized_command(parser)
+            exit_unrecognized_command(self.parser)
+
+        if self.args.trace:
+            trace.start(self.args.trace, append=False)
+        # The JSON Lines trace is kept, and the Chrome export is written next to it
+        if self.args.trace_format == 'chrome' and not trace.export_chrome_at_exit():
+            cprint(' - --trace-format chrome requires --trace PATH or CLOWDER_TRACE=PATH\n', 'red')
+            sys.exit(1)
+        if self.args.metrics_file:
+            metrics.start(self.args.metrics_file, self.args.clowder_command)
+        if self.clowder_repo is not None:
+            logs.start(self.root_directory, ' '.join(['clowder'] + sys.argv[1:]))
+
+        if self.args.ssh_multiplex and self.clowder is not None:
+            self.ssh_multiplexer.start(self.clowder.sources)
 
         # use dispatch pattern to invoke method with same name
-        getattr(self, self.args.clowder_command)()
+        with profiler.phase('command ' + self.args.clowder_command):
+            getattr(self, self.args.clowder_command)()
         print()
 
+    def batch(self):
+        """clowder batch command"""
+
+        self._validate_clowder_yaml()
+        if self.clowder_repo is None:
+            exit_clowder_not_found()
+
+        try:
+            if self.args.file == '-':
+                commands = read_batch_commands(sys.stdin)
+            else:
+                with open(self.args.file) as batch_file:
+                    commands = read_batch_commands(batch_file)
+        except (IOError, ValueError) as err:
+            print(fmt.batch_file_error(self.args.file, err) + '\n')
+            sys.exit(1)
+
+        batch_args = self.args
+        results = []
+        start = time.time()
+        for line_number, command_args in commands:
+            print(fmt.batch_command(line_number, command_args) + '\n')
+            command_start = time.time()
+            return_code = self._run_batch_command(command_args)
+            self.args = batch_args
+            results.append({'line': line_number, 'args': command_args, 'return_code': return_code,
+                            'duration': time.time() - command_start})
+            print()
+            if return_code != 0 and not self.args.keep_going:
+                break
+
+        for result in results:
+            print(fmt.batch_result(result))
+        print(fmt.batch_summary(len(results), len(commands), time.time() - start))
+        if any([r['return_code'] != 0 for r in results]):
+            sys.exit(1)
+
     def branch(self):
         """clowder branch command"""
 
@@ -136,6 +209,54 @@ class Command(object):
         self.clowder.clean(group_names=self.args.groups, project_names=self.args.projects,
                            skip=self.args.skip, args=clean_args, recursive=self.args.recursive)
 
+    def daemon(self):
+        """clowder daemon command"""
+
+        self._validate_clowder_yaml()
+        if self.clowder_repo is None:
+            exit_clowder_not_found()
+
+        daemon_command = 'daemon_' + self.args.daemon_command
+        getattr(self, daemon_command)()
+
+    def daemon_start(self):
+        """clowder daemon start command"""
+
+        if daemon.request(self.root_directory, {'command': 'ping'}) is not None:
+            print(' - Daemon is already running\n')
+            return
+        if self.args.foreground:
+            print(' - Serve status on ' + daemon.socket_path(self.root_directory) + '\n')
+        pid = daemon.start(self.root_directory, foreground=self.args.foreground)
+        if pid is None:
+            cprint(' - Failed to start daemon, see ' + daemon.log_path(self.root_directory) + '\n', 'red')
+            sys.exit(1)
+        if not self.args.foreground:
+            print(' - Started daemon with pid ' + str(pid))
+
+    def daemon_status(self):
+        """clowder daemon status command"""
+
+        response = daemon.request(self.root_directory, {'command': 'ping'})
+        if response is None:
+            print(' - Daemon is not running')
+            return
+        print(' - Daemon is running with pid ' + str(response['pid']))
+        if response['watches'] is None:
+            print(' - File watching is unavailable, status is recomputed for each request')
+        else:
+            print(' - Watching ' + str(response['watches']) + ' directories')
+        for name in response['unwatched']:
+            print(' - ' + colored(name, 'yellow') + ' is not watched, status is recomputed for each request')
+
+    def daemon_stop(self):
+        """clowder daemon stop command"""
+
+        if not daemon.stop(self.root_directory):
+            print(' - Daemon is not running')
+            return
+        print(' - Stopped daemon')
+
     def diff(self):
         """clowder diff command"""
 
@@ -156,13 +277,26 @@ class Command(object):
         if self.clowder_repo is None:
             exit_clowder_not_found()
 
-        self.clowder_repo.print_status()
+        if self.args.jobs is not None and self.args.jobs < 1:
+            cprint(' - --jobs must be at least 1\n', 'red')
+            sys.exit(1)
+
+        if self.args.output != 'json':
+            self.clowder_repo.print_status()
         if self.clowder is None:
             sys.exit(1)
 
+        if self.args.python is not None:
+            self.clowder.forall(self.args.python[0], self.args.ignore_errors,
+                                group_names=self.args.groups, project_names=self.args.projects,
+                                skip=self.args.skip, parallel=self.args.parallel,
+                                jobs=self.args.jobs, output=self.args.output, python=True)
+            return
+
         self.clowder.forall(self.args.command[0], self.args.ignore_errors,
                             group_names=self.args.groups, project_names=self.args.projects,
-                            skip=self.args.skip, parallel=self.args.parallel)
+                            skip=self.args.skip, parallel=self.args.parallel,
+                            jobs=self.args.jobs, output=self.args.output)
 
     def herd(self):
         """clowder herd command"""
@@ -172,7 +306,7 @@ class Command(object):
             exit_clowder_not_found()
 
         self.clowder_repo.print_status(fetch=True)
-        if is_offline():
+        if self._is_offline():
             print(fmt.offline_error())
             sys.exit(1)
 
@@ -223,6 +357,89 @@ class Command(object):
             version = self.args.version[0]
         self.clowder_repo.link(version)
 
+    def logs(self):
+        """clowder logs command"""
+
+        self._validate_clowder_yaml()
+        if self.clowder_repo is None:
+            exit_clowder_not_found()
+
+        if self.args.list:
+            logs.print_runs(self.root_directory)
+            return
+
+        run_ids = logs.run_ids(self.root_directory)
+        run_id = self.args.run if self.args.run is not None else run_ids[-1] if run_ids else None
+        if run_id not in run_ids:
+            message = ' - No logs for run ' + run_id if run_id is not None else ' - No logs'
+            cprint(message + '\n', 'red')
+            sys.exit(1)
+
+        project_paths = None
+        if self.args.projects is not None:
+            project_paths = [p.path for g in self.clowder.groups for p in g.projects if p.name in self.args.projects]
+        logs.print_run(self.root_directory, run_id, project_paths=project_paths, tail_lines=self.args.tail)
+
+    def maintenance(self):
+        """clowder maintenance command"""
+
+        self._validate_clowder_yaml()
+        if self.clowder_repo is None:
+            exit_clowder_not_found()
+
+        self.clowder_repo.print_status()
+        if self.clowder is None:
+            sys.exit(1)
+
+        maintenance_command = 'maintenance_' + self.args.maintenance_command
+        getattr(self, maintenance_command)()
+
+    def maintenance_run(self):
+        """clowder maintenance run command"""
+
+        jobs = self.args.jobs if self.args.jobs is not None else multiprocessing.cpu_count()
+        if jobs < 1:
+            cprint(' - --jobs must be at least 1\n', 'red')
+            sys.exit(1)
+
+        self.clowder.maintenance(group_names=self.args.groups, project_names=self.args.projects,
+                                 skip=self.args.skip, jobs=jobs)
+
+    def maintenance_schedule(self):
+        """clowder maintenance schedule command"""
+
+        self.clowder.maintenance_schedule(group_names=self.args.groups, project_names=self.args.projects,
+                                          skip=self.args.skip, enable=True)
+
+    def maintenance_unschedule(self):
+        """clowder maintenance unschedule command"""
+
+        self.clowder.maintenance_schedule(group_names=self.args.groups, project_names=self.args.projects,
+                                          skip=self.args.skip, enable=False)
+
+    def prefetch(self):
+        """clowder prefetch command"""
+
+        self._validate_clowder_yaml()
+        if self.clowder_repo is None:
+            exit_clowder_not_found()
+
+        self.clowder_repo.print_status()
+        if self.clowder is None:
+            sys.exit(1)
+
+        if self._is_offline():
+            print(fmt.offline_error())
+            sys.exit(1)
+
+        jobs = self.args.jobs if self.args.jobs is not None else multiprocessing.cpu_count()
+        if jobs < 1:
+            cprint(' - --jobs must be at least 1\n', 'red')
+            sys.exit(1)
+
+        self.clowder.prefetch(group_names=self.args.groups, project_names=self.args.projects,
+                              skip=self.args.skip, jobs=jobs)
+
     def prune(self):
         """clowder prune command"""
         self._validate_clowder_yaml()
@@ -234,24 +451,24 @@ class Command(object):
             sys.exit(1)
 
         if self.args.all:
-            if is_offline():
+            if self._is_offline():
                 print(fmt.offline_error())
                 sys.exit(1)
 
-            self.clowder.prune(self.args.groups, self.args.branch, project_names=self.args.projects,
+            self.clowder.prune(self.args.groups, self.args.branches, project_names=self.args.projects,
                                skip=self.args.skip, force=self.args.force, local=True, remote=True)
             return
 
         if self.args.remote:
-            if is_offline():
+            if self._is_offline():
                 print(fmt.offline_error())
                 sys.exit(1)
 
-            self.clowder.prune(self.args.groups, self.args.branch, project_names=self.args.projects,
+            self.clowder.prune(self.args.groups, self.args.branches, project_names=self.args.projects,
                                skip=self.args.skip, remote=True)
             return
 
-        self.clowder.prune(self.args.groups, self.args.branch, project_names=self.args.projects,
+        self.clowder.prune(self.args.groups, self.args.branches, project_names=self.args.projects,
                            skip=self.args.skip, force=self.args.force, local=True)
 
     def repo(self):
@@ -350,7 +567,7 @@ class Command(object):
             exit_clowder_not_found()
 
         self.clowder_repo.print_status(fetch=True)
-        if is_offline():
+        if self._is_offline():
             print(fmt.offline_error())
             sys.exit(1)
 
@@ -391,7 +608,7 @@ class Command(object):
             sys.exit(1)
 
         if self.args.tracking:
-            if is_offline():
+            if self._is_offline():
                 print(fmt.offline_error())
                 sys.exit(1)
 
@@ -425,7 +642,7 @@ class Command(object):
             sys.exit(1)
 
         if self.args.fetch:
-            if is_offline():
+            if self._is_offline():
                 print(fmt.offline_error())
                 sys.exit(1)
 
@@ -447,7 +664,7 @@ class Command(object):
         if self.clowder is None:
             sys.exit(1)
 
-        if is_offline():
+        if self._is_offline():
             print(fmt.offline_error())
             sys.exit(1)
 
@@ -463,6 +680,40 @@ class Command(object):
         print('clowder version ' + self._version + '\n')
         sys.exit()
 
+    def worktree(self):
+        """clowder worktree command"""
+
+        self._validate_clowder_yaml()
+        if self.clowder_repo is None:
+            exit_clowder_not_found()
+
+        self.clowder_repo.print_status()
+        if self.clowder is None:
+            sys.exit(1)
+
+        worktree_command = 'worktree_' + self.args.worktree_command
+        getattr(self, worktree_command)()
+
+    def worktree_add(self):
+        """clowder worktree add command"""
+
+        parent_directory = os.path.dirname(self.root_directory)
+        root_directory = os.path.normpath(os.path.join(parent_directory, self.args.name))
+        if os.path.exists(root_directory):
+            print(fmt.worktree_exists_error(root_directory) + '\n')
+            sys.exit(1)
+
+        if self.args.version is not None:
+            version = self.args.version[0]
+        else:
+            version = self.clowder_repo.linked_version()
+        branch = None if self.args.branch is None else self.args.branch[0]
+
+        self.clowder_repo.worktree_add(root_directory)
+        ClowderRepo(root_directory).link(version)
+        print()
+        ClowderController(root_directory).worktree_add(self.root_directory, branch=branch)
+
     def yaml(self):
         """clowder yaml command"""
 
@@ -475,12 +726,81 @@ class Command(object):
 
         self.clowder.print_yaml(self.args.resolved)
 
+    def _clowder_yaml_signature(self):
+        """Return path and modification time of clowder.yaml symlink target"""
+
+        clowder_yaml = os.path.realpath(os.path.join(self.root_directory, 'clowder.yaml'))
+        try:
+            return clowder_yaml, os.path.getmtime(clowder_yaml)
+        except OSError:
+            return clowder_yaml, None
+
+    def _configure_parser(self):
+        """Return argument parser for commands and projects in clowder.yaml"""
+
+        command_description = 'Utility for managing multiple git repositories'
+        parser = argparse.ArgumentParser(description=command_description,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+        configure_argparse(parser, self.clowder, self.versions)
+        self._clowder_yaml_loaded = self._clowder_yaml_signature()
+        return parser
+
     def _exit_handler_formatter(self):
         """Exit handler to display trailing newline"""
 
         if self._display_trailing_newline:
             print()
 
+    def _is_offline(self):
+        """Check network connection, which isn't needed if every source is local"""
+
+        if self.clowder is not None and all([s.is_local() for s in self.clowder.sources]):
+            return False
+        return is_offline()
+
+    def _load_clowder_yaml(self):
+        """Load clowder.yaml, recording the error if it's invalid"""
+
+        self.clowder = None
+        self.versions = None
+        self._invalid_yaml = False
+        try:
+            self.clowder = ClowderController(self.root_directory)
+            self.versions = self.clowder.get_saved_version_names()
+        except (ClowderError, KeyError) as err:
+            self._invalid_yaml = True
+            self._error = err
+        except (KeyboardInterrupt, SystemExit):
+            sys.exit(1)
+
+    def _run_batch_command(self, command_args):
+        """Run command from batch file, returning its exit code"""
+
+        # Commands that changed clowder.yaml, such as link or repo pull, are picked up by the next command
+        if self._clowder_yaml_signature() != self._clowder_yaml_loaded:
+            self._load_clowder_yaml()
+            self.parser = self._configure_parser()
+
+        try:
+            self.args = self.parser.parse_args(command_args)
+            if self.args.clowder_command == 'batch':
+                cprint(' - Batch files can\'t run clowder batch\n', 'red')
+                return 1
+            options = batch_global_options(self.args)
+            if options:
+                print(fmt.batch_global_options_error(options) + '\n')
+                return 1
+            if self.args.clowder_command is None or not hasattr(self, self.args.clowder_command):
+                exit_unrecognized_command(self.parser)
+            logs.start(self.root_directory, ' '.join(['clowder'] + command_args))
+            with profiler.phase('command ' + self.args.clowder_command):
+                getattr(self, self.args.clowder_command)()
+        except SystemExit as err:
+            if err.code is None:
+                return 0
+            return err.code if isinstance(err.code, int) else 1
+        return 0
+
     def _validate_clowder_yaml(self):
         """Print invalid yaml message and exit if invalid"""
 
@@ -490,6 +810,28 @@ class Command(object):
             sys.exit(1)
 
 
+def batch_global_options(args):
+    """Return global options set in parsed batch file command, which only apply to the whole batch"""
+
+    defaults = vars(parse_global_options([]))
+    return ['--' + name.replace('_', '-') for name in sorted(defaults)
+            if getattr(args, name, defaults[name]) != defaults[name]]
+
+
+def read_batch_commands(batch_file):
+    """Return (line number, arguments) for commands in batch file, skipping blank lines and comments"""
+
+    commands = []
+    for line_number, line in enumerate(batch_file, 1):
+        command_args = shlex.split(line, comments=True)
+        if not command_args:
+            continue
+        if command_args[0] == 'clowder':
+            command_args = command_args[1:]
+        commands.append((line_number, command_args))
+    return commands
+
+
 def exit_unrecognized_command(parser):
     """Print unrecognized command message and exit"""
 
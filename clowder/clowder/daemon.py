@@ -0,0 +1,466 @@
+"""Background workspace daemon serving status over a Unix socket"""
+
+from __future__ import print_function
+
+import errno
+import json
+import os
+import re
+import select
+import socket
+import subprocess
+import sys
+import time
+
+import termcolor
+
+import clowder.util.formatting as fmt
+from clowder.clowder_controller import ClowderController
+from clowder.clowder_repo import ClowderRepo
+from clowder.error.clowder_error import ClowderError
+from clowder.git.project_repo import ProjectRepo
+from clowder.git.ref_reader import RefReader
+from clowder.util.watcher import Watcher
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+# Disable errors shown by pylint for catching too general exception
+# pylint: disable=W0703
+
+__ansi_escape__ = re.compile(r'\x1b\[[0-9;]*m')
+__clowder_key__ = '.clowder'
+__manifest_key__ = 'clowder.yaml'
+__request_timeout__ = 2.0
+
+
+class Daemon(object):
+    """Class keeping manifest loaded and project status current for clients on a Unix socket"""
+
+    def __init__(self, root_directory):
+        self.root_directory = root_directory
+        self.started = time.time()
+        self.clowder = None
+        self.clowder_repo = None
+        self.watcher = Watcher() if Watcher.available() else None
+        self._cache = {}
+        self._unwatched = set()
+        self._running = False
+        self._load()
+
+    def handle(self, request):
+        """Return response to request"""
+
+        command = request.get('command')
+        if command == 'ping':
+            return {'pid': os.getpid(), 'started': self.started, 'projects': len(self._projects()),
+                    'watches': self.watcher.count() if self.watcher is not None else None,
+                    'unwatched': sorted(self._unwatched)}
+        if command == 'status':
+            return {'output': self._status_output()}
+        if command == 'diff':
+            return self._diff_response(request.get('groups'), request.get('projects'))
+        if command == 'dirty':
+            return {'dirty': dict([(p.name, self._project_state(p)['dirty']) for p in self._projects()])}
+        if command == 'stop':
+            self._running = False
+            return {'stopped': True}
+        return {'error': 'Unknown command ' + str(command)}
+
+    def serve(self):
+        """Accept requests until stopped"""
+
+        path = socket_path(self.root_directory)
+        _remove_file(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)
+        try:
+            server.bind(path)
+        finally:
+            os.umask(umask)
+        server.listen(8)
+        _write_file(pid_path(self.root_directory), str(os.getpid()) + '\n')
+        self._running = True
+        try:
+            while self._running:
+                readers = [server] if self.watcher is None else [server, self.watcher]
+                readable = select.select(readers, [], [])[0]
+                if self.watcher is not None and self.watcher in readable:
+                    self._process_events()
+                if server in readable:
+                    self._accept(server)
+        finally:
+            server.close()
+            _remove_file(path)
+            _remove_file(pid_path(self.root_directory))
+            if self.watcher is not None:
+                self.watcher.close()
+
+    def _accept(self, server):
+        """Read request from client and write response"""
+
+        connection = server.accept()[0]
+        try:
+            connection.settimeout(__request_timeout__)
+            request = json.loads(_read_line(connection))
+            # Events that arrived since select returned must be applied before answering
+            if self.watcher is not None:
+                self._process_events()
+            try:
+                response = self.handle(request)
+            except Exception as err:
+                response = {'error': str(err)}
+            connection.sendall((json.dumps(response) + '\n').encode('utf-8'))
+        except (socket.error, ValueError) as err:
+            print(' - Failed to handle request: ' + str(err))
+        finally:
+            connection.close()
+
+    def _clowder_status(self):
+        """Return clowder repo status output"""
+
+        state = self._cache.get(__clowder_key__)
+        if state is None or __clowder_key__ in self._unwatched:
+            self._cache[__clowder_key__] = state = _capture(self.clowder_repo.print_status)
+        return state
+
+    def _diff_response(self, group_names, project_names):
+        """Return diff output for groups, or projects if given, or error for names not in clowder.yaml"""
+
+        lines = []
+        if project_names is not None:
+            projects = [p for p in self._projects() if p.name in project_names]
+            if len(set([p.name for p in projects])) != len(set(project_names)):
+                return {'error': 'Unknown project'}
+            for project in projects:
+                lines.append(self._project_state(project)['diff'])
+            return {'output': self._clowder_status() + '\n'.join(lines) + '\n'}
+
+        groups = [g for g in self.clowder.groups if group_names is None or g.name in group_names]
+        if group_names is not None and len(groups) != len(set(group_names)):
+            return {'error': 'Unknown group'}
+        for group in groups:
+            lines.append(fmt.group_name(group.name))
+            lines.extend([self._project_state(p)['diff'] for p in group.projects])
+        return {'output': self._clowder_status() + '\n'.join(lines) + '\n'}
+
+    def _load(self):
+        """Load clowder.yaml and watch clowder repo and projects"""
+
+        self.clowder_repo = ClowderRepo(self.root_directory)
+        self.clowder = ClowderController(self.root_directory)
+        self._cache = {}
+        self._unwatched = set([__clowder_key__, __manifest_key__] + [p.path for p in self._projects()])
+        if self.watcher is not None:
+            for key in list(self._unwatched):
+                self._watch(key)
+
+    def _process_events(self):
+        """Drop cached state for keys with changes, reloading clowder.yaml if it or clowder repo files changed"""
+
+        changed, lost = self.watcher.read()
+        if changed is Watcher.OVERFLOW:
+            self._cache = {}
+            return
+        if __manifest_key__ in changed:
+            try:
+                self.watcher.close()
+                self.watcher = Watcher()
+                self._load()
+            except (ClowderError, KeyError) as err:
+                print(' - Failed to reload clowder.yaml: ' + str(err))
+            return
+        for key in changed | lost:
+            self._cache.pop(key, None)
+        for key in lost:
+            self.watcher.remove(key)
+            self._unwatched.add(key)
+
+    def _project_state(self, project):
+        """Return cached status, diff output, and dirty state, computing them if stale"""
+
+        if project.path in self._unwatched and self.watcher is not None:
+            self._watch(project.path)
+        state = self._cache.get(project.path)
+        if state is not None and project.path not in self._unwatched:
+            return state
+
+        # Cache before computing, so changes made while computing invalidate the new state
+        self._cache[project.path] = state = {}
+        exists = ProjectRepo.existing_git_repository(project.full_path())
+        if exists:
+            state['name'] = ProjectRepo.format_project_string(project.full_path(), project.path)
+            state['ref'] = ProjectRepo.format_project_ref_string(project.full_path())
+            state['dirty'] = project.is_dirty()
+        else:
+            state['name'] = project.formatted_project_path()
+            state['missing'] = _capture(lambda: print(project.status())).rstrip('\n')
+            state['dirty'] = False
+        state['diff'] = (_status_line(state) + '\n' + _project_diff(project, exists)).rstrip('\n')
+        return state
+
+    def _projects(self):
+        """Return all projects in clowder.yaml"""
+
+        return [p for g in self.clowder.groups for p in g.projects]
+
+    def _status_output(self):
+        """Return status output for all groups"""
+
+        states = dict([(p.path, self._project_state(p)) for p in self._projects()])
+        # Padding depends on which projects are dirty, the same as in direct mode
+        padding = len(max([s['name'] for s in states.values()], key=len))
+        lines = []
+        for group in self.clowder.groups:
+            lines.append(fmt.group_name(group.name))
+            lines.extend([_status_line(states[p.path], padding=padding) for p in group.projects])
+        return self._clowder_status() + '\n'.join(lines) + '\n'
+
+    def _watch(self, key):
+        """Watch directories for key"""
+
+        clowder_path = os.path.join(self.root_directory, '.clowder')
+        if key == __manifest_key__:
+            watched = self.watcher.add(key, clowder_path, recursive=True, exclude=('.git', 'logs')) and \
+                self.watcher.add(key, self.root_directory, names=(__manifest_key__,))
+        else:
+            path = clowder_path if key == __clowder_key__ else os.path.join(self.root_directory, key)
+            reader = RefReader(path)
+            git_dir = reader.git_dir()
+            if git_dir is None or not os.path.isdir(git_dir):
+                return
+            # Linked worktrees keep HEAD and index in their own git directory, refs in the common one
+            common_dir = reader.common_dir() or git_dir
+            watched = self.watcher.add(key, git_dir) and \
+                self.watcher.add(key, os.path.join(common_dir, 'refs'), recursive=True)
+            if common_dir != git_dir:
+                watched = watched and self.watcher.add(key, common_dir, names=('packed-refs',))
+            if key != __clowder_key__:
+                watched = watched and self.watcher.add(key, path, recursive=True, exclude=('.git',))
+        if watched:
+            self._unwatched.discard(key)
+        else:
+            self.watcher.remove(key)
+
+
+def log_path(root_directory):
+    """Return path to daemon log file"""
+
+    return os.path.join(_daemon_dir(root_directory), 'daemon.log')
+
+
+def pid_path(root_directory):
+    """Return path to daemon pid file"""
+
+    return os.path.join(_daemon_dir(root_directory), 'daemon.pid')
+
+
+def request(root_directory, message):
+    """Send request to workspace daemon, returning response or None if the daemon isn't running"""
+
+    path = socket_path(root_directory)
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(__request_timeout__)
+    try:
+        client.connect(path)
+        client.sendall((json.dumps(message) + '\n').encode('utf-8'))
+        response = json.loads(_read_line(client))
+    except (socket.error, socket.timeout, ValueError):
+        return None
+    finally:
+        client.close()
+    if 'error' in response:
+        return None
+    return response
+
+
+def run_command(root_directory, argv):
+    """Print status or diff from workspace daemon, returning False if the command needs direct mode"""
+
+    message = _command_request(argv)
+    if message is None:
+        return False
+    response = request(root_directory, message)
+    if response is None:
+        return False
+
+    output = response['output']
+    if not sys.stdout.isatty() or os.environ.get('NO_COLOR') or os.environ.get('ANSI_COLORS_DISABLED'):
+        output = __ansi_escape__.sub('', output)
+    print()
+    sys.stdout.write(output)
+    print()
+    return True
+
+
+def socket_path(root_directory):
+    """Return path to daemon socket"""
+
+    return os.path.join(_daemon_dir(root_directory), 'daemon.sock')
+
+
+def start(root_directory, foreground=False):
+    """Start daemon for workspace, returning pid once it is accepting requests, or None if it failed"""
+
+    if not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'fork'):
+        return None
+    daemon_dir = _daemon_dir(root_directory)
+    if not os.path.isdir(daemon_dir):
+        os.makedirs(daemon_dir)
+    if foreground:
+        _configure_environment()
+        Daemon(root_directory).serve()
+        return os.getpid()
+
+    pid = os.fork()
+    if pid == 0:
+        _detach(log_path(root_directory))
+        try:
+            _configure_environment()
+            Daemon(root_directory).serve()
+        except Exception as err:
+            print(' - Daemon failed: ' + str(err))
+        finally:
+            os._exit(0)  # pylint: disable=W0212
+
+    os.waitpid(pid, 0)
+    for _ in range(100):
+        response = request(root_directory, {'command': 'ping'})
+        if response is not None:
+            return response['pid']
+        time.sleep(0.05)
+    return None
+
+
+def stop(root_directory):
+    """Stop daemon for workspace, returning False if it wasn't running"""
+
+    return request(root_directory, {'command': 'stop'}) is not None
+
+
+def _capture(function):
+    """Return what function prints"""
+
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        function()
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+
+def _command_request(argv):
+    """Return daemon request for status or diff command line, or None if it must run directly"""
+
+    if not argv:
+        return None
+    if argv == ['status']:
+        return {'command': 'status'}
+    if argv[0] != 'diff':
+        return None
+    message = {'command': 'diff', 'groups': None, 'projects': None}
+    key = None
+    for arg in argv[1:]:
+        if arg in ('--groups', '-g'):
+            key = 'groups'
+        elif arg in ('--projects', '-p'):
+            key = 'projects'
+        elif key is None or arg.startswith('-'):
+            return None
+        else:
+            message[key] = (message[key] or []) + [arg]
+    if message['groups'] is not None and message['projects'] is not None:
+        return None
+    return message
+
+
+def _configure_environment():
+    """Set up git and color environment for computing status in the daemon"""
+
+    # Keep git status from refreshing the index, which would report changes for every status computed
+    os.environ['GIT_OPTIONAL_LOCKS'] = '0'
+    # Render colored output regardless of where the daemon writes, clients strip it if they can't show it
+    os.environ['FORCE_COLOR'] = '1'
+    os.environ.pop('NO_COLOR', None)
+    os.environ.pop('ANSI_COLORS_DISABLED', None)
+    can_colorize = getattr(termcolor, 'can_colorize', None)
+    if hasattr(can_colorize, 'cache_clear'):
+        can_colorize.cache_clear()
+
+
+def _daemon_dir(root_directory):
+    """Return directory for daemon files, inside the clowder repo's git directory so it doesn't show as changes"""
+
+    git_dir = RefReader(os.path.join(root_directory, '.clowder')).git_dir()
+    return os.path.join(git_dir or os.path.join(root_directory, '.clowder', '.git'), 'clowder', 'daemon')
+
+
+def _detach(log_file):
+    """Detach from terminal in second forked child, sending output to log file"""
+
+    os.setsid()
+    if os.fork() != 0:
+        os._exit(0)  # pylint: disable=W0212
+    log = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    null = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null, 0)
+    os.dup2(log, 1)
+    os.dup2(log, 2)
+
+
+def _project_diff(project, exists):
+    """Return diff output for project as printed by clowder diff"""
+
+    if not os.path.isdir(project.full_path()):
+        return termcolor.colored(" - Project is missing\n", 'red') + '\n'
+    if not exists:
+        return ''
+    command = ['git', '-c', 'color.ui=always', 'status', '-vv']
+    try:
+        output = subprocess.check_output(command, cwd=project.full_path(), stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError as err:
+        output = err.output
+    return fmt.command('git status -vv') + '\n' + output.decode('utf-8', 'replace')
+
+
+def _read_line(connection):
+    """Read newline terminated message from socket"""
+
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data.decode('utf-8')
+
+
+def _remove_file(path):
+    """Remove file if it exists"""
+
+    try:
+        os.remove(path)
+    except OSError as err:
+        if err.errno != errno.ENOENT:
+            raise
+
+
+def _status_line(state, padding=None):
+    """Return project status line from cached state"""
+
+    if 'missing' in state:
+        return state['missing']
+    name = state['name'].ljust(padding) if padding else state['name']
+    return name + ' ' + state['ref']
+
+
+def _write_file(path, contents):
+    """Write contents to file"""
+
+    with open(path, 'w') as raw_file:
+        raw_file.write(contents)
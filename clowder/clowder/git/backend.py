@@ -0,0 +1,265 @@
+"""Backends answering read-only repo queries"""
+
+import os
+import subprocess
+
+from git import Repo, GitError
+
+from clowder.error.clowder_error import ClowderError
+from clowder.error.clowder_git_error import ClowderGitError
+
+__backend_env__ = 'CLOWDER_GIT_BACKEND'
+__default_backend__ = 'git'
+
+
+class GitBackend(object):
+    """Default backend reading refs and config natively, and running git for queries that need the object database"""
+
+    name = 'git'
+
+    def __init__(self, repo_path, refs):
+        self.repo_path = repo_path
+        self.refs = refs
+        self._repo = None
+
+    def ahead_behind(self, local_sha, upstream_sha):
+        """Return number of commits only in local and only in upstream"""
+
+        try:
+            output = self._git_repo().git.rev_list('--count', '--left-right', local_sha + '...' + upstream_sha)
+            ahead, behind = str(output).split()
+            return int(ahead), int(behind)
+        except (GitError, ValueError) as err:
+            raise ClowderGitError(msg=str(err))
+
+    def current_branch(self):
+        """Return checked out branch name, or None if HEAD is detached"""
+
+        return self.refs.current_branch()
+
+    def is_ancestor(self, ancestor, rev):
+        """Check if commit is an ancestor of rev"""
+
+        try:
+            self._git_repo().git.merge_base('--is-ancestor', ancestor, rev)
+            return True
+        except GitError:
+            return False
+
+    def is_detached(self):
+        """Check if HEAD is detached"""
+
+        return self.refs.is_detached()
+
+    def is_dirty(self):
+        """Check for staged or unstaged changes to tracked files"""
+
+        try:
+            return self._git_repo().is_dirty()
+        except GitError as err:
+            raise ClowderGitError(msg=str(err))
+
+    def remote_url(self, remote):
+        """Return url of remote with insteadOf rewrites applied"""
+
+        url = self.refs.remote_url(remote)
+        if url is not None:
+            return url
+        try:
+            return self._git_repo().git.remote('get-url', remote)
+        except GitError as err:
+            raise ClowderGitError(msg=str(err))
+
+    def resolve_ref(self, ref):
+        """Return sha ref points to, or None if it doesn't exist"""
+
+        return self.refs.resolve_ref(ref)
+
+    def sha(self):
+        """Return sha of HEAD commit"""
+
+        sha = self.refs.sha()
+        if sha is None:
+            sha = self._git_repo().head.commit.hexsha
+        return sha
+
+    def short_sha(self, sha):
+        """Return shortest unique abbreviation of sha"""
+
+        # Abbreviating needs the object database to keep the prefix unique
+        return self._git_repo().git.rev_parse(sha, short=True)
+
+    def untracked_files(self):
+        """Check for untracked or deleted files"""
+
+        # git status uses the untracked cache when core.untrackedCache is enabled
+        command = ['git', 'status', '--porcelain', '--untracked-files=normal', '--ignore-submodules=all']
+        try:
+            output = subprocess.check_output(command, cwd=self.repo_path).decode('utf-8')
+        except subprocess.CalledProcessError as err:
+            raise ClowderGitError(msg=str(err))
+        return any([line[:2] in ('??', ' D', 'D ') for line in output.splitlines()])
+
+    def _git_repo(self):
+        """Return GitPython Repo, created on first use so the backend can be made before the repo is cloned"""
+
+        if self._repo is None:
+            self._repo = Repo(self.repo_path)
+        return self._repo
+
+
+class Pygit2Backend(GitBackend):
+    """Backend answering queries in process with libgit2, without starting git"""
+
+    name = 'pygit2'
+
+    def __init__(self, repo_path, refs):
+        super(Pygit2Backend, self).__init__(repo_path, refs)
+        self._repository = None
+
+    def ahead_behind(self, local_sha, upstream_sha):
+        """Return number of commits only in local and only in upstream"""
+
+        try:
+            ahead, behind = self._pygit2_repo().ahead_behind(local_sha, upstream_sha)
+        except (KeyError, ValueError, _pygit2().GitError) as err:
+            raise ClowderGitError(msg=str(err))
+        return ahead, behind
+
+    def current_branch(self):
+        """Return checked out branch name, or None if HEAD is detached"""
+
+        head = self._pygit2_repo().references.get('HEAD')
+        if head is None or isinstance(head.target, _pygit2().Oid):
+            return None
+        target = head.target
+        if not target.startswith('refs/heads/'):
+            return None
+        return target[len('refs/heads/'):]
+
+    def is_ancestor(self, ancestor, rev):
+        """Check if commit is an ancestor of rev"""
+
+        repository = self._pygit2_repo()
+        try:
+            ancestor_id = repository.revparse_single(ancestor).peel(_pygit2().Commit).id
+            rev_id = repository.revparse_single(rev).peel(_pygit2().Commit).id
+        except (KeyError, ValueError, _pygit2().GitError):
+            return False
+        return ancestor_id == rev_id or repository.descendant_of(rev_id, ancestor_id)
+
+    def is_detached(self):
+        """Check if HEAD is detached"""
+
+        return self._pygit2_repo().head_is_detached
+
+    def is_dirty(self):
+        """Check for staged or unstaged changes to tracked files"""
+
+        pygit2 = _pygit2()
+        # Untracked files are checked separately, and older pygit2 lists them regardless
+        clean = pygit2.GIT_STATUS_CURRENT | pygit2.GIT_STATUS_IGNORED | pygit2.GIT_STATUS_WT_NEW
+        return any([flags & ~clean for flags in self._status(untracked_files='no').values()])
+
+    def remote_url(self, remote):
+        """Return url of remote with insteadOf rewrites applied"""
+
+        try:
+            return self._pygit2_repo().remotes[remote].url
+        except (KeyError, ValueError, _pygit2().GitError) as err:
+            raise ClowderGitError(msg=str(err))
+
+    def resolve_ref(self, ref):
+        """Return sha ref points to, or None if it doesn't exist"""
+
+        reference = self._pygit2_repo().references.get(ref)
+        if reference is None:
+            return None
+        try:
+            return str(reference.resolve().target)
+        except (KeyError, _pygit2().GitError):
+            return None
+
+    def sha(self):
+        """Return sha of HEAD commit"""
+
+        return str(self._pygit2_repo().head.target)
+
+    def short_sha(self, sha):
+        """Return shortest unique abbreviation of sha"""
+
+        return self._pygit2_repo()[sha].short_id
+
+    def untracked_files(self):
+        """Check for untracked or deleted files"""
+
+        pygit2 = _pygit2()
+        changed = pygit2.GIT_STATUS_WT_NEW | pygit2.GIT_STATUS_WT_DELETED
+        for flags in self._status(untracked_files='normal').values():
+            if flags & changed or flags == pygit2.GIT_STATUS_INDEX_DELETED:
+                return True
+        return False
+
+    def _pygit2_repo(self):
+        """Return pygit2 Repository, opened on first use"""
+
+        if self._repository is None:
+            self._repository = _pygit2().Repository(self.repo_path)
+        return self._repository
+
+    def _status(self, untracked_files):
+        """Return status flags by path"""
+
+        repository = self._pygit2_repo()
+        try:
+            try:
+                return repository.status(untracked_files=untracked_files)
+            except TypeError:
+                # pygit2 before 1.14 always lists untracked files
+                return repository.status()
+        except _pygit2().GitError as err:
+            raise ClowderGitError(msg=str(err))
+
+
+__backends__ = {'git': GitBackend, 'pygit2': Pygit2Backend}
+
+
+def available(name):
+    """Check if backend can be used"""
+
+    if name == 'pygit2':
+        try:
+            _pygit2()
+        except ImportError:
+            return False
+    return name in __backends__
+
+
+def backend_name():
+    """Return name of backend set with --git-backend or CLOWDER_GIT_BACKEND"""
+
+    return os.environ.get(__backend_env__) or __default_backend__
+
+
+def create(repo_path, refs):
+    """Return backend for repo"""
+
+    return __backends__[backend_name()](repo_path, refs)
+
+
+def set_backend(name):
+    """Use backend for repos created after this and in processes started after this"""
+
+    if not available(name):
+        message = 'Git backend ' + name + " isn't available"
+        if name == 'pygit2':
+            message += ', install it with pip install pygit2'
+        raise ClowderError(message)
+    os.environ[__backend_env__] = name
+
+
+def _pygit2():
+    """Return pygit2 module, imported on first use so it's only loaded when the backend is used"""
+
+    import pygit2
+    return pygit2
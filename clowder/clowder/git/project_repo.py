@@ -7,6 +7,8 @@ import sys
 from git import GitError
 from termcolor import colored, cprint
 
+import clowder.git.status_cache as status_cache
+import clowder.git.timestamp_index as timestamp_index
 import clowder.util.formatting as fmt
 from clowder.error.clowder_git_error import ClowderGitError
 from clowder.git.repo import execute_command, GitRepo
@@ -22,13 +24,25 @@ class ProjectRepo(GitRepo):
     def __init__(self, repo_path, remote, default_ref, parallel=False, print_output=True):
         GitRepo.__init__(self, repo_path, remote, default_ref, parallel=parallel, print_output=print_output)
 
+    @staticmethod
+    def cached_ref_status(repo_path):
+        """Return ref status, reading it from the status cache when refs haven't changed"""
+
+        status = status_cache.load_status(repo_path)
+        if status is None:
+            repo = ProjectRepo(repo_path, __project_repo_default_remote__, __project_repo_default_ref__)
+            refs = repo.ref_status_files()
+            ref_signature = status_cache.signature(repo_path, refs)
+            status = repo.ref_status()
+            status_cache.save_status(repo_path, status, refs, ref_signature)
+        return status
+
     def create_clowder_repo(self, url, branch, depth=0):
         """Clone clowder git repo from url at path"""
 
         if self.existing_git_repository(self.repo_path):
             return
-        self._init_repo()
-        self._create_remote(self.remote, url, remove_dir=True)
+        self._init_repo_with_remote(url, depth=depth)
         self._checkout_new_repo_branch(branch, depth)
 
     def configure_remotes(self, upstream_remote_name, upstream_remote_url, fork_remote_name, fork_remote_url):
@@ -36,26 +50,20 @@ class ProjectRepo(GitRepo):
 
         if not self.existing_git_repository(self.repo_path):
             return
-        try:
-            remotes = self.repo.remotes
-        except GitError:
-            return
-        except (KeyboardInterrupt, SystemExit):
-            self._exit()
-        else:
-            for remote in remotes:
-                if upstream_remote_url == self._remote_get_url(remote.name):
-                    if remote.name != upstream_remote_name:
-                        self._rename_remote(remote.name, upstream_remote_name)
-                        continue
-                if fork_remote_url == self._remote_get_url(remote.name):
-                    if remote.name != fork_remote_name:
-                        self._rename_remote(remote.name, fork_remote_name)
-            remote_names = [r.name for r in self.repo.remotes]
-            if upstream_remote_name in remote_names:
-                self._compare_remote_url(upstream_remote_name, upstream_remote_url)
-            if fork_remote_name in remote_names:
-                self._compare_remote_url(fork_remote_name, fork_remote_url)
+        remote_urls = [(r, self._remote_get_url(r)) for r in self.refs.remote_names()]
+        for remote, url in remote_urls:
+            if upstream_remote_url == url:
+                if remote != upstream_remote_name:
+                    self._rename_remote(remote, upstream_remote_name)
+                    continue
+            if fork_remote_url == url:
+                if remote != fork_remote_name:
+                    self._rename_remote(remote, fork_remote_name)
+        remote_names = self.refs.remote_names()
+        if upstream_remote_name in remote_names:
+            self._compare_remote_url(upstream_remote_name, upstream_remote_url)
+        if fork_remote_name in remote_names:
+            self._compare_remote_url(fork_remote_name, fork_remote_url)
 
     @staticmethod
     def exists(repo_path):
@@ -68,23 +76,21 @@ class ProjectRepo(GitRepo):
     def format_project_ref_string(repo_path):
         """Return formatted repo ref name"""
 
-        repo = ProjectRepo(repo_path, __project_repo_default_remote__, __project_repo_default_ref__)
-        local_commits = repo.new_commits()
-        upstream_commits = repo.new_commits(upstream=True)
+        status = ProjectRepo.cached_ref_status(repo_path)
+        if status['detached']:
+            return colored('(HEAD @ ' + status['ref'] + ')', 'magenta')
+
+        local_commits = status['local_commits']
+        upstream_commits = status['upstream_commits']
         no_local_commits = local_commits == 0 or local_commits == '0'
         no_upstream_commits = upstream_commits == 0 or upstream_commits == '0'
         if no_local_commits and no_upstream_commits:
-            status = ''
+            status_output = ''
         else:
             local_commits_output = colored('+' + str(local_commits), 'yellow')
             upstream_commits_output = colored('-' + str(upstream_commits), 'red')
-            status = '[' + local_commits_output + '/' + upstream_commits_output + ']'
-
-        if repo.is_detached():
-            current_ref = repo.sha(short=True)
-            return colored('(HEAD @ ' + current_ref + ')', 'magenta')
-        current_branch = repo.current_branch()
-        return colored('(' + current_branch + ')', 'magenta') + status
+            status_output = '[' + local_commits_output + '/' + upstream_commits_output + ']'
+        return colored('(' + status['ref'] + ')', 'magenta') + status_output
 
     @staticmethod
     def format_project_string(repo_path, name):
@@ -121,18 +127,17 @@ class ProjectRepo(GitRepo):
         branch_output = fmt.ref_string(branch)
         branch_ref = 'refs/heads/' + branch
         if self.existing_local_branch(branch):
+            if self._is_branch_in_other_worktree(branch):
+                self._herd_detached(self.remote, branch, depth=depth)
+                return
             if self._is_branch_checked_out(branch):
                 self._print(' - Branch ' + branch_output + ' already checked out')
             else:
                 self._checkout_branch_local(branch)
-            self.fetch(self.remote, depth=depth, ref=branch_ref)
-            if self.existing_remote_branch(branch, self.remote):
-                self._herd_remote_branch(self.remote, branch, depth=depth, rebase=rebase)
+            if self._herd_remote_branch(self.remote, branch, depth=depth, rebase=rebase):
                 return
             if fork_remote:
-                self.fetch(fork_remote, depth=depth, ref=branch_ref)
-                if self.existing_remote_branch(branch, fork_remote):
-                    self._herd_remote_branch(fork_remote, branch, depth=depth, rebase=rebase)
+                self._herd_remote_branch(fork_remote, branch, depth=depth, rebase=rebase)
             return
         self.fetch(self.remote, depth=depth, ref=branch_ref)
         if self.existing_remote_branch(branch, self.remote):
@@ -156,8 +161,7 @@ class ProjectRepo(GitRepo):
         """Herd tag"""
 
         if not self.existing_git_repository(self.repo_path):
-            self._init_repo()
-            self._create_remote(self.remote, url, remove_dir=True)
+            self._init_repo_with_remote(url, depth=depth)
             return_code = self._checkout_new_repo_tag(tag, self.remote, depth)
             if return_code == 0:
                 return
@@ -186,53 +190,45 @@ class ProjectRepo(GitRepo):
         if return_code != 0:
             raise ClowderGitError(msg=colored(' - Failed to fetch', 'red'))
 
-    def prune_branch_local(self, branch, force):
-        """Prune branch in repository"""
+    def prune_branches_local(self, branches, force):
+        """Delete local branches with one git branch call, checking out default ref if needed"""
 
-        branch_output = fmt.ref_string(branch)
-        if branch not in self.repo.heads:
-            self._print(' - Local branch ' + branch_output + " doesn't exist")
-            return
-        prune_branch = self.repo.heads[branch]
-        if self.repo.head.ref == prune_branch:
+        branches_output = fmt.ref_list(branches)
+        if self.current_branch() in branches:
             ref_output = fmt.ref_string(self.truncate_ref(self.default_ref))
             try:
                 self._print(' - Checkout ref ' + ref_output)
                 self.repo.git.checkout(self.truncate_ref(self.default_ref))
             except GitError as err:
-                message = colored(' - Failed to checkout ref', 'red') + ref_output
+                message = colored(' - Failed to checkout ref ', 'red') + ref_output
                 self._print(message)
                 self._print(fmt.error(err))
                 self._exit(message)
             except (KeyboardInterrupt, SystemExit):
                 self._exit()
         try:
-            self._print(' - Delete local branch ' + branch_output)
-            self.repo.delete_head(branch, force=force)
-            return
+            self._print(' - Delete local branches ' + branches_output)
+            self.repo.git.branch('-D' if force else '-d', *branches)
         except GitError as err:
-            message = colored(' - Failed to delete local branch ', 'red') + branch_output
+            message = colored(' - Failed to delete local branches ', 'red') + branches_output
             self._print(message)
             self._print(fmt.error(err))
-            self._exit(message)
+            self._exit(message + '\n' + fmt.error(err))
         except (KeyboardInterrupt, SystemExit):
             self._exit()
 
-    def prune_branch_remote(self, branch, remote):
-        """Prune remote branch in repository"""
+    def prune_branches_remote(self, branches, remote):
+        """Delete remote branches with one atomic push"""
 
-        branch_output = fmt.ref_string(branch)
-        if not self.existing_remote_branch(branch, remote):
-            self._print(' - Remote branch ' + branch_output + " doesn't exist")
-            return
+        branches_output = fmt.ref_list(branches)
         try:
-            self._print(' - Delete remote branch ' + branch_output)
-            self.repo.git.push(remote, '--delete', branch)
+            self._print(' - Delete remote branches ' + branches_output)
+            self.repo.git.push('--atomic', remote, '--delete', *branches)
         except GitError as err:
-            message = colored(' - Failed to delete remote branch ', 'red') + branch_output
+            message = colored(' - Failed to delete remote branches ', 'red') + branches_output
             self._print(message)
             self._print(fmt.error(err))
-            self._exit(message)
+            self._exit(message + '\n' + fmt.error(err))
         except (KeyboardInterrupt, SystemExit):
             self._exit()
 
@@ -272,11 +268,21 @@ class ProjectRepo(GitRepo):
     def reset_timestamp(self, timestamp, author, ref):
         """Reset branch to upstream or checkout tag/sha as detached HEAD"""
 
+        seconds = timestamp_index.parse_iso_timestamp(timestamp)
+        entries = None
+        if seconds is not None and self.update_timestamp_index(ref):
+            entries = timestamp_index.load_index(self.repo_path, ref)[2]
         rev = None
-        if author:
-            rev = self._find_rev_by_timestamp_author(timestamp, author, ref)
-        if not rev:
-            rev = self._find_rev_by_timestamp(timestamp, ref)
+        if entries:
+            if author:
+                rev = timestamp_index.find_sha(entries, seconds, author=author)
+            if not rev:
+                rev = timestamp_index.find_sha(entries, seconds)
+        else:
+            if author:
+                rev = self._find_rev_by_timestamp_author(timestamp, author, ref)
+            if not rev:
+                rev = self._find_rev_by_timestamp(timestamp, ref)
         if not rev:
             message = colored(' - Failed to find rev', 'red')
             self._print(message)
@@ -310,22 +316,36 @@ class ProjectRepo(GitRepo):
         if tracking and not is_offline():
             self._create_branch_remote_tracking(branch, remote, depth)
 
-    def sync(self, fork_remote, rebase=False):
-        """Sync fork with upstream remote"""
+    def sync(self, url, fork_remote, fork_url, rebase=False):
+        """Sync fork with upstream remote, fetching both in one call and pushing only if the fork is behind"""
 
         self._print(' - Sync fork with upstream remote')
         if self.ref_type(self.default_ref) != 'branch':
             message = colored(' - Can only sync branches', 'red')
             self._print(message)
             self._exit(message)
+
+        branch = self.truncate_ref(self.default_ref)
+        for remote, remote_url in ((self.remote, url), (fork_remote, fork_url)):
+            return_code = self._create_remote(remote, remote_url)
+            if return_code != 0:
+                raise ClowderGitError(msg=colored(' - Failed to create remote', 'red'))
+        self._fetch_multiple([self.remote, fork_remote])
+
+        if not self.existing_remote_branch(branch, self.remote):
+            message = colored(' - No existing remote branch ', 'red') + fmt.remote_string(self.remote) + ' ' + \
+                fmt.ref_string(branch)
+            self._print(message)
+            self._exit(message)
+        self._sync_local_branch(branch, rebase)
+
         fork_remote_output = fmt.remote_string(fork_remote)
-        branch_output = fmt.ref_string(self.truncate_ref(self.default_ref))
-        if rebase:
-            self._rebase_remote_branch(self.remote, self.truncate_ref(self.default_ref))
-        else:
-            self._pull(self.remote, self.truncate_ref(self.default_ref))
+        branch_output = fmt.ref_string(branch)
+        if self.backend.resolve_ref('refs/remotes/' + fork_remote + '/' + branch) == self.backend.sha():
+            self._print(' - ' + fork_remote_output + ' ' + branch_output + ' already up to date')
+            return
         self._print(' - Push to ' + fork_remote_output + ' ' + branch_output)
-        command = ['git', 'push', fork_remote, self.truncate_ref(self.default_ref)]
+        command = ['git', 'push', fork_remote, branch]
         return_code = execute_command(command, self.repo_path, print_output=self.print_output)
         if return_code != 0:
             message = colored(' - Failed to push to ', 'red') + fork_remote_output + ' ' + branch_output
@@ -336,12 +356,45 @@ class ProjectRepo(GitRepo):
     def _compare_remote_url(self, remote, url):
         """Compare actual remote url to given url"""
 
-        if url != self._remote_get_url(remote):
-            actual_url = self._remote_get_url(remote)
+        actual_url = self._remote_get_url(remote)
+        if url != actual_url:
             message = fmt.remote_already_exists_error(remote, url, actual_url)
             self._print(message)
             self._exit(message)
 
+    def _fetch_branch(self, remote, branch, depth=0):
+        """Fetch remote branch to update existing local branch from"""
+
+        if depth == 0:
+            return self.fetch(remote, ref='refs/heads/' + branch)
+
+        # Fetching with --depth would cut off the local branch's history, so shallow repos fetch only the commits
+        # needed to connect to it, like git pull does
+        remote_output = fmt.remote_string(remote)
+        branch_output = fmt.ref_string(branch)
+        self._print(' - Fetch from ' + remote_output + ' ' + branch_output)
+        command = ['git fetch', remote, branch, '--prune --tags']
+        return_code = self._execute_transfer(command)
+        if return_code != 0:
+            message = colored(' - Failed to fetch from ', 'red') + remote_output + ' ' + branch_output
+            self._print(message)
+            self._print(fmt.command_failed_error(command))
+            self._exit(message)
+        return return_code
+
+    def _fetch_multiple(self, remotes):
+        """Fetch from several remotes concurrently with one git fetch"""
+
+        remotes_output = ', '.join([fmt.remote_string(r) for r in remotes])
+        self._print(' - Fetch from ' + remotes_output)
+        command = ['git fetch --multiple --prune --tags', '--jobs', str(len(remotes))] + remotes
+        return_code = self._execute_transfer(command)
+        if return_code != 0:
+            message = colored(' - Failed to fetch from ', 'red') + remotes_output
+            self._print(message)
+            self._print(fmt.command_failed_error(command))
+            self._exit(message)
+
     def _herd(self, remote, ref, depth=0, fetch=True, rebase=False):
         """Herd ref"""
 
@@ -355,19 +408,14 @@ class ProjectRepo(GitRepo):
                     self._print(message)
                     self._exit(message)
                 return
+            elif self._is_branch_in_other_worktree(branch):
+                self._herd_detached(remote, branch, depth=depth)
+                return
             elif self._is_branch_checked_out(branch):
                 self._print(' - Branch ' + branch_output + ' already checked out')
             else:
                 self._checkout_branch_local(branch)
-            if not self.existing_remote_branch(branch, remote):
-                return
-            if not self._is_tracking_branch(branch):
-                self._set_tracking_branch_commit(branch, remote, depth)
-                return
-            if rebase:
-                self._rebase_remote_branch(remote, branch)
-                return
-            self._pull(remote, branch)
+            self._herd_remote_branch(remote, branch, depth=depth, rebase=rebase, fetch=fetch)
         elif self.ref_type(ref) == 'tag':
             self.fetch(remote, depth=depth, ref=ref)
             self._checkout_tag(self.truncate_ref(ref))
@@ -378,8 +426,7 @@ class ProjectRepo(GitRepo):
     def _herd_initial(self, url, depth=0):
         """Herd ref initial"""
 
-        self._init_repo()
-        self._create_remote(self.remote, url, remove_dir=True)
+        self._init_repo_with_remote(url, depth=depth)
         if self.ref_type(self.default_ref) == 'branch':
             self._checkout_new_repo_branch(self.truncate_ref(self.default_ref), depth)
         elif self.ref_type(self.default_ref) == 'tag':
@@ -390,8 +437,7 @@ class ProjectRepo(GitRepo):
     def _herd_branch_initial(self, url, branch, depth=0):
         """Herd branch initial"""
 
-        self._init_repo()
-        self._create_remote(self.remote, url, remove_dir=True)
+        self._init_repo_with_remote(url, depth=depth)
         self.fetch(self.remote, depth=depth, ref=branch)
         if not self.existing_remote_branch(branch, self.remote):
             remote_output = fmt.remote_string(self.remote)
@@ -400,25 +446,34 @@ class ProjectRepo(GitRepo):
             return
         self._create_branch_local_tracking(branch, self.remote, depth=depth, fetch=False, remove_dir=True)
 
-    def _herd_remote_branch(self, remote, branch, depth=0, rebase=False):
-        """Herd remote branch"""
+    def _herd_detached(self, remote, branch, depth=0):
+        """Herd branch checked out in another worktree by checking out its latest commit as detached HEAD"""
 
+        self._print(' - Branch ' + fmt.ref_string(branch) + ' is checked out in another worktree')
+        self.fetch(remote, depth=depth, ref='refs/heads/' + branch)
+        if self.existing_remote_branch(branch, remote):
+            self._checkout_sha(self.backend.resolve_ref('refs/remotes/' + remote + '/' + branch))
+        else:
+            self._checkout_sha(self.backend.resolve_ref('refs/heads/' + branch))
+
+    def _herd_remote_branch(self, remote, branch, depth=0, rebase=False, fetch=True):
+        """Fetch remote branch once and update checked out branch from it, returning False if it doesn't exist"""
+
+        if fetch:
+            self._fetch_branch(remote, branch, depth=depth)
+        if not self.existing_remote_branch(branch, remote):
+            return False
         if not self._is_tracking_branch(branch):
-            self._set_tracking_branch_commit(branch, remote, depth)
-            return
-        if rebase:
-            self._rebase_remote_branch(remote, branch)
-            return
-        self._pull(remote, branch)
+            self._set_tracking_branch_commit(branch, remote)
+            return True
+        self._update_branch(remote, branch, rebase=rebase)
+        return True
 
-    def _set_tracking_branch_commit(self, branch, remote, depth):
+    def _set_tracking_branch_commit(self, branch, remote):
         """Set tracking relationship between local and remote branch if on same commit"""
 
         branch_output = fmt.ref_string(branch)
         origin = self._remote(remote)
-        return_code = self.fetch(remote, depth=depth, ref=branch)
-        if return_code != 0:
-            raise ClowderGitError(msg=colored(' - Failed to fech', 'red'))
         if not self.existing_local_branch(branch):
             message = colored(' - No local branch ', 'red') + branch_output + '\n'
             self._print(message)
@@ -438,3 +493,20 @@ class ProjectRepo(GitRepo):
         return_code = self._set_tracking_branch(remote, branch)
         if return_code != 0:
             self._exit(colored(' - Failed to set tracking branch', 'red'))
+
+    def _sync_local_branch(self, branch, rebase):
+        """Check out branch and bring it up to date with fetched upstream branch without pulling again"""
+
+        branch_output = fmt.ref_string(branch)
+        if not self.existing_local_branch(branch):
+            return_code = self._create_branch_local_tracking(branch, self.remote, depth=0, fetch=False)
+            if return_code != 0:
+                message = colored(' - Failed to create tracking branch ', 'red') + branch_output
+                self._print(message)
+                self._exit(message)
+            return
+        if self._is_branch_checked_out(branch):
+            self._print(' - Branch ' + branch_output + ' already checked out')
+        else:
+            self._checkout_branch_local(branch)
+        self._update_branch(self.remote, branch, rebase=rebase)
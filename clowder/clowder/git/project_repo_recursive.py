@@ -2,6 +2,9 @@
 
 from __future__ import print_function
 
+import multiprocessing
+import subprocess
+
 from git import GitError
 from termcolor import colored
 
@@ -16,16 +19,13 @@ class ProjectRepoRecursive(ProjectRepo):
     def __init__(self, repo_path, remote, default_ref, parallel=False, print_output=True):
         ProjectRepo.__init__(self, repo_path, remote, default_ref, parallel=parallel, print_output=print_output)
 
-    def clean(self, args=None):
+    def clean(self, args=''):
         """Discard changes for repo and submodules"""
 
         ProjectRepo.clean(self, args=args)
 
-        self._print(' - Clean submodules recursively')
-        self._submodules_clean()
-
-        self._print(' - Reset submodules recursively')
-        self._submodules_reset()
+        self._print(' - Clean and reset submodules recursively')
+        self._submodules_clean_reset()
 
         self._print(' - Update submodules recursively')
         self._submodules_update()
@@ -56,17 +56,27 @@ class ProjectRepoRecursive(ProjectRepo):
     def is_dirty_submodule(self, path):
         """Check whether submodule repo is dirty"""
 
-        return not self.repo.is_dirty(path)
+        return path in self._dirty_submodules()
+
+    def submodule_jobs(self):
+        """Return number of submodules to fetch and update at the same time, from submodule.fetchJobs if set"""
+
+        jobs = self.refs.config_value('submodule', 'fetchjobs')
+        try:
+            if jobs is not None and int(jobs) > 0:
+                return int(jobs)
+        except ValueError:
+            pass
+        return multiprocessing.cpu_count()
 
     def submodule_update_recursive(self, depth=0):
         """Update submodules recursively and initialize if not present"""
 
         print(' - Recursively update and init submodules')
 
-        if depth == 0:
-            command = ['git', 'submodule', 'update', '--init', '--recursive']
-        else:
-            command = ['git', 'submodule', 'update', '--init', '--recursive', '--depth', depth]
+        command = ['git', 'submodule', 'update', '--init', '--recursive', '--jobs', str(self.submodule_jobs())]
+        if depth != 0:
+            command += ['--depth', str(depth)]
 
         return_code = execute_command(command, self.repo_path)
         if return_code != 0:
@@ -74,10 +84,10 @@ class ProjectRepoRecursive(ProjectRepo):
             self._print(message)
             self._exit(message)
 
-    def sync(self, fork_remote, rebase=False):
+    def sync(self, url, fork_remote, fork_url, rebase=False):
         """Sync fork with upstream remote"""
 
-        ProjectRepo.sync(self, fork_remote, rebase=rebase)
+        ProjectRepo.sync(self, url, fork_remote, fork_url, rebase=rebase)
         self.submodule_update_recursive()
 
     def validate_repo(self):
@@ -86,13 +96,39 @@ class ProjectRepoRecursive(ProjectRepo):
         if not ProjectRepo.validate_repo(self):
             return False
 
-        return not any([self.is_dirty_submodule(s.path) for s in self.repo.submodules])
+        return not self._dirty_submodules()
+
+    def _dirty_submodules(self):
+        """Return paths of submodules with new commits, changes, or untracked files, using one status call"""
+
+        command = ['git', 'status', '--porcelain=v2', '--ignore-submodules=none']
+        try:
+            output = subprocess.check_output(command, cwd=self.repo_path).decode('utf-8')
+        except subprocess.CalledProcessError as err:
+            message = colored(' - Failed to check submodule status', 'red')
+            self._print(message)
+            self._print(fmt.error(err))
+            self._exit(message)
+        except (KeyboardInterrupt, SystemExit):
+            self._exit()
+
+        # Number of fields before the path for changed, renamed, and unmerged entries
+        path_field = {'1': 8, '2': 9, 'u': 10}
+        dirty = set()
+        for line in output.splitlines():
+            fields = line.split(' ')
+            # Only changed entries are listed, and submodules have S<commit><modified><untracked> in the third field
+            if fields[0] not in path_field or not fields[2].startswith('S'):
+                continue
+            path = line.split(' ', path_field[fields[0]])[-1]
+            dirty.add(path.split('\t')[0])
+        return dirty
 
-    def _submodules_clean(self):
-        """Clean all submodules"""
+    def _submodules_clean_reset(self):
+        """Clean and reset all submodules in one traversal"""
 
-        self._submodule_command('foreach', '--recursive', 'git', 'clean', '-ffdx',
-                                error_msg=' - Failed to clean submodules')
+        self._submodule_command('foreach', '--recursive', 'git clean -ffdx && git reset --hard',
+                                error_msg=' - Failed to clean and reset submodules')
 
     def _submodule_command(self, *args, **kwargs):
         """Base submodule command"""
@@ -107,14 +143,8 @@ class ProjectRepoRecursive(ProjectRepo):
         except (KeyboardInterrupt, SystemExit):
             self._exit()
 
-    def _submodules_reset(self):
-        """Reset all submodules"""
-
-        self._submodule_command('foreach', '--recursive', 'git', 'reset', '--hard',
-                                error_msg=' - Failed to reset submodules')
-
     def _submodules_update(self):
         """Update all submodules"""
 
-        self._submodule_command('update', '--checkout', '--recursive', '--force',
+        self._submodule_command('update', '--checkout', '--recursive', '--force', '--jobs', str(self.submodule_jobs()),
                                 error_msg=' - Failed to update submodules')
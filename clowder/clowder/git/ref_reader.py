@@ -0,0 +1,364 @@
+"""Read git refs and config without running git"""
+
+import mmap
+import os
+
+__packed_refs_header__ = b'# pack-refs with:'
+
+
+class RefReader(object):
+    """Class reading HEAD, loose refs, packed-refs, and config from a git directory"""
+
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self._git_dir = None
+        self._common_dir = None
+        self._config = None
+        self._config_stat = None
+
+    def current_branch(self):
+        """Return checked out branch name, or None if HEAD is detached"""
+
+        head = self.symbolic_ref('HEAD')
+        if head is None or not head.startswith('refs/heads/'):
+            return None
+        return head[len('refs/heads/'):]
+
+    def git_dir(self):
+        """Return git directory for repo, following .git files used by worktrees and submodules"""
+
+        if self._git_dir is not None:
+            return self._git_dir
+
+        dot_git = os.path.join(self.repo_path, '.git')
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+        elif os.path.isfile(dot_git):
+            with open(dot_git) as raw_file:
+                contents = raw_file.read().strip()
+            if not contents.startswith('gitdir:'):
+                return None
+            git_dir = os.path.normpath(os.path.join(self.repo_path, contents[len('gitdir:'):].strip()))
+        else:
+            return None
+
+        common_dir = git_dir
+        commondir_file = os.path.join(git_dir, 'commondir')
+        if os.path.isfile(commondir_file):
+            with open(commondir_file) as raw_file:
+                common_dir = os.path.normpath(os.path.join(git_dir, raw_file.read().strip()))
+
+        self._git_dir = git_dir
+        self._common_dir = common_dir
+        return git_dir
+
+    def common_dir(self):
+        """Return directory shared by all worktrees containing refs, objects, and config"""
+
+        if self.git_dir() is None:
+            return None
+        return self._common_dir
+
+    def config_value(self, section, key, subsection=None):
+        """Return last value of config key, or None if not set"""
+
+        values = self._read_config().get(_config_name(section, subsection, key))
+        if not values:
+            return None
+        return values[-1]
+
+    def is_detached(self):
+        """Check if HEAD is detached"""
+
+        return self.git_dir() is not None and self.symbolic_ref('HEAD') is None
+
+    def ref_exists(self, ref):
+        """Check if ref exists"""
+
+        return self.resolve_ref(ref) is not None
+
+    def remote_names(self):
+        """Return names of configured remotes"""
+
+        names = []
+        for name in self._read_config():
+            section, _, remainder = name.partition('.')
+            if section != 'remote' or '.' not in remainder:
+                continue
+            remote = remainder.rsplit('.', 1)[0]
+            if remote not in names:
+                names.append(remote)
+        return names
+
+    def remote_url(self, remote):
+        """Return url of remote after applying url.<base>.insteadOf rewrites, or None if not configured"""
+
+        url = self.config_value('remote', 'url', subsection=remote)
+        if url is None:
+            return None
+
+        config = self._read_config()
+        longest_prefix = ''
+        base = None
+        for name, values in config.items():
+            if not name.startswith('url.') or not name.endswith('.insteadof'):
+                continue
+            for prefix in values:
+                if url.startswith(prefix) and len(prefix) > len(longest_prefix):
+                    longest_prefix = prefix
+                    base = name[len('url.'):-len('.insteadof')]
+        if base is None:
+            return url
+        return base + url[len(longest_prefix):]
+
+    def resolve_ref(self, ref):
+        """Return sha ref points to, or None if it doesn't exist"""
+
+        git_dir = self.git_dir()
+        if git_dir is None:
+            return None
+
+        for _ in range(5):
+            contents = self._read_loose_ref(ref)
+            if contents is None:
+                return self._read_packed_ref(ref)
+            if not contents.startswith('ref:'):
+                return contents
+            ref = contents[len('ref:'):].strip()
+        return None
+
+    def sha(self):
+        """Return sha of HEAD commit, or None if it can't be resolved"""
+
+        return self.resolve_ref('HEAD')
+
+    def symbolic_ref(self, ref):
+        """Return name of ref a symbolic ref points to, or None if it isn't symbolic"""
+
+        contents = self._read_loose_ref(ref)
+        if contents is None or not contents.startswith('ref:'):
+            return None
+        return contents[len('ref:'):].strip()
+
+    def tracking_branch(self, branch):
+        """Return remote tracking ref configured for local branch, or None if not tracking"""
+
+        remote = self.config_value('branch', 'remote', subsection=branch)
+        merge = self.config_value('branch', 'merge', subsection=branch)
+        if remote is None or merge is None:
+            return None
+        if remote == '.':
+            return merge
+        if merge.startswith('refs/heads/'):
+            merge = merge[len('refs/heads/'):]
+        return 'refs/remotes/' + remote + '/' + merge
+
+    def worktree_branches(self):
+        """Return branches checked out in other worktrees sharing this repo's refs"""
+
+        git_dir = self.git_dir()
+        if git_dir is None:
+            return set()
+
+        common_dir = self._common_dir
+        worktrees_dir = os.path.join(common_dir, 'worktrees')
+        git_dirs = [common_dir]
+        if os.path.isdir(worktrees_dir):
+            git_dirs += [os.path.join(worktrees_dir, d) for d in os.listdir(worktrees_dir)]
+
+        branches = set()
+        for other_git_dir in git_dirs:
+            if os.path.normpath(other_git_dir) == os.path.normpath(git_dir):
+                continue
+            try:
+                with open(os.path.join(other_git_dir, 'HEAD')) as raw_file:
+                    head = raw_file.read().strip()
+            except IOError:
+                continue
+            if head.startswith('ref: refs/heads/'):
+                branches.add(head[len('ref: refs/heads/'):])
+        return branches
+
+    def _read_config(self):
+        """Return parsed config, re-reading it if the file changed"""
+
+        common_dir = self.common_dir()
+        if common_dir is None:
+            return {}
+
+        config_file = os.path.join(common_dir, 'config')
+        try:
+            stat = os.stat(config_file)
+        except OSError:
+            return {}
+
+        config_stat = (stat.st_mtime, stat.st_size, stat.st_ino)
+        if self._config is None or config_stat != self._config_stat:
+            with open(config_file) as raw_file:
+                self._config = parse_config(raw_file.read())
+            self._config_stat = config_stat
+        return self._config
+
+    def _read_loose_ref(self, ref):
+        """Return stripped contents of loose ref file, or None if missing"""
+
+        if ref == 'HEAD' or not ref.startswith('refs/'):
+            ref_dir = self.git_dir()
+        else:
+            ref_dir = self.common_dir()
+        if ref_dir is None:
+            return None
+
+        path = os.path.join(ref_dir, *ref.split('/'))
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path) as raw_file:
+                return raw_file.read().strip()
+        except IOError:
+            return None
+
+    def _read_packed_ref(self, ref):
+        """Return sha for ref from packed-refs, or None if not present"""
+
+        common_dir = self.common_dir()
+        if common_dir is None:
+            return None
+
+        packed_refs = os.path.join(common_dir, 'packed-refs')
+        try:
+            with open(packed_refs, 'rb') as raw_file:
+                if os.fstat(raw_file.fileno()).st_size == 0:
+                    return None
+                contents = mmap.mmap(raw_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return None
+
+        try:
+            return find_packed_ref(contents, ref.encode('utf-8'))
+        finally:
+            contents.close()
+
+
+def find_packed_ref(contents, ref):
+    """Return sha for ref in packed-refs contents, using binary search if the file is sorted"""
+
+    header_end = 0
+    sorted_refs = False
+    if contents[:len(__packed_refs_header__)] == __packed_refs_header__:
+        header_end = contents.find(b'\n') + 1
+        traits = contents[len(__packed_refs_header__):header_end].split()
+        sorted_refs = b'sorted' in traits
+
+    if not sorted_refs:
+        for line in contents[header_end:].splitlines():
+            sha, _, name = line.partition(b' ')
+            if name == ref:
+                return sha.decode('utf-8')
+        return None
+
+    low = header_end
+    high = len(contents)
+    while low < high:
+        mid = low + (high - low) // 2
+        line_start = max(contents.rfind(b'\n', low, mid) + 1, low)
+        if contents[line_start:line_start + 1] == b'^':
+            if line_start == low:
+                low = _line_end(contents, line_start, high) + 1
+                continue
+            # Peeled tag line belongs to the ref on the previous line
+            line_start = max(contents.rfind(b'\n', low, line_start - 1) + 1, low)
+        line_end = _line_end(contents, line_start, high)
+        record_end = line_end
+        if line_end + 1 < high and contents[line_end + 1:line_end + 2] == b'^':
+            record_end = _line_end(contents, line_end + 1, high)
+        sha, _, name = contents[line_start:line_end].partition(b' ')
+        if name == ref:
+            return sha.decode('utf-8')
+        if name < ref:
+            low = record_end + 1
+        else:
+            high = line_start
+    return None
+
+
+def parse_config(contents):
+    """Return dictionary mapping lowercase section.subsection.key names to lists of values"""
+
+    config = {}
+    section = None
+    subsection = None
+    lines = iter(contents.splitlines())
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] in '#;':
+            continue
+
+        if line.startswith('['):
+            header = line[1:line.index(']')] if ']' in line else line[1:]
+            if '"' in header:
+                section, _, remainder = header.partition('"')
+                section = section.strip().lower()
+                subsection = remainder.rsplit('"', 1)[0].replace('\\"', '"').replace('\\\\', '\\')
+            elif '.' in header:
+                section, _, subsection = header.partition('.')
+                section = section.strip().lower()
+                subsection = subsection.strip().lower()
+            else:
+                section = header.strip().lower()
+                subsection = None
+            remainder = line[line.index(']') + 1:].strip() if ']' in line else ''
+            if not remainder or remainder[0] in '#;':
+                continue
+            line = remainder
+
+        if section is None:
+            continue
+
+        while line.endswith('\\') and not line.endswith('\\\\'):
+            line = line[:-1] + next(lines, '').strip()
+
+        key, equals, value = line.partition('=')
+        key = key.strip().lower()
+        value = _parse_config_value(value) if equals else 'true'
+        config.setdefault(_config_name(section, subsection, key), []).append(value)
+    return config
+
+
+def _config_name(section, subsection, key):
+    """Return lookup name for config entry"""
+
+    if subsection is None:
+        return section.lower() + '.' + key.lower()
+    return section.lower() + '.' + subsection + '.' + key.lower()
+
+
+def _line_end(contents, start, end):
+    """Return offset of newline ending line at start, or end if there is none"""
+
+    line_end = contents.find(b'\n', start, end)
+    return end if line_end == -1 else line_end
+
+
+def _parse_config_value(value):
+    """Return config value with quotes, escapes, and trailing comments removed"""
+
+    result = []
+    in_quotes = False
+    escapes = {'n': '\n', 't': '\t', 'b': '\b', '"': '"', '\\': '\\'}
+    index = 0
+    value = value.strip()
+    while index < len(value):
+        char = value[index]
+        if char == '\\' and index + 1 < len(value):
+            result.append(escapes.get(value[index + 1], value[index + 1]))
+            index += 2
+            continue
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char in '#;' and not in_quotes:
+            break
+        else:
+            result.append(char)
+        index += 1
+    return ''.join(result).strip()
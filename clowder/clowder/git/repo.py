@@ -2,20 +2,33 @@
 
 from __future__ import print_function
 
+import fnmatch
+import glob
 import os
-import subprocess
 import sys
 
 from git import Repo, GitError
 from termcolor import colored, cprint
 
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+import clowder.git.backend as backend
+import clowder.git.timestamp_index as timestamp_index
 import clowder.util.formatting as fmt
+import clowder.util.logs as logs
 from clowder.error.clowder_git_error import ClowderGitError
-from clowder.util.execute import execute_command
-from clowder.util.file_system import remove_directory
+from clowder.git.ref_reader import RefReader
+from clowder.util.execute import execute_command, execute_progress_command
+from clowder.util.file_system import directory_size, remove_directory
+from clowder.util.progress import progress_reporter
 
 __repo_default_ref__ = 'refs/heads/master'
 __repo_default_remote__ = 'origin'
+__repo_prefetch_namespace__ = 'refs/prefetch/remotes/'
+__maintenance_batch_size_max__ = 2 * 1024 * 1024 * 1024
 
 
 class GitRepo(object):
@@ -27,6 +40,8 @@ class GitRepo(object):
         self.remote = remote
         self.print_output = print_output
         self.parallel = parallel
+        self.refs = RefReader(repo_path)
+        self.backend = backend.create(repo_path, self.refs)
         self.repo = self._repo() if GitRepo.existing_git_repository(repo_path) else None
 
     def add(self, files):
@@ -91,29 +106,44 @@ class GitRepo(object):
     def current_branch(self):
         """Return currently checked out branch of project"""
 
-        return self.repo.head.ref.name
+        return self.backend.current_branch()
 
-    def existing_remote_branch(self, branch, remote):
-        """Check if remote branch exists"""
+    def enable_untracked_cache(self):
+        """Enable git untracked cache so dirty checks don't rescan the whole work tree"""
 
+        if self.refs.config_value('core', 'untrackedCache') is not None:
+            return
         try:
-            origin = self.repo.remotes[remote]
-            return branch in origin.refs
-        except (GitError, IndexError):
-            return False
+            self.repo.git.config('core.untrackedCache', 'true')
+        except (GitError, IOError, ValueError):
+            return
         except (KeyboardInterrupt, SystemExit):
             self._exit()
 
+    def existing_remote_branch(self, branch, remote):
+        """Check if remote branch exists"""
+
+        if remote not in self.refs.remote_names():
+            return False
+        return self.backend.resolve_ref('refs/remotes/' + remote + '/' + branch) is not None
+
     def existing_local_branch(self, branch):
         """Check if local branch exists"""
 
-        return branch in self.repo.heads
+        return self.backend.resolve_ref('refs/heads/' + branch) is not None
 
     @staticmethod
     def existing_git_repository(path):
-        """Check if a git repository exists"""
+        """Check if a git repository or linked worktree exists"""
 
-        return os.path.isdir(os.path.join(path, '.git'))
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return True
+        if not os.path.isfile(dot_git):
+            return False
+        # A linked worktree's .git file points to a git directory with a commondir file, a submodule's doesn't
+        git_dir = RefReader(path).git_dir()
+        return git_dir is not None and os.path.isfile(os.path.join(git_dir, 'commondir'))
 
     @staticmethod
     def existing_git_submodule(path):
@@ -141,7 +171,7 @@ class GitRepo(object):
             error = message + remote_output + ' ' + ref_output
             command = ['git fetch', remote, GitRepo.truncate_ref(ref), '--depth', str(depth), '--prune --tags']
 
-        return_code = execute_command(command, self.repo_path, print_output=self.print_output)
+        return_code = self._execute_transfer(command)
         if return_code != 0:
             if remove_dir:
                 remove_directory(self.repo_path)
@@ -167,7 +197,7 @@ class GitRepo(object):
 
         if not os.path.isdir(self.repo_path):
             return False
-        return self.repo.head.is_detached
+        return self.backend.is_detached()
 
     def is_dirty(self):
         """Check whether repo is dirty"""
@@ -177,35 +207,103 @@ class GitRepo(object):
 
         return self._is_dirty() or self._is_rebase_in_progress() or self._untracked_files()
 
+    @staticmethod
+    def local_path(url):
+        """Return path for file:// url or local path, or None if url is remote"""
+
+        if url.startswith('file://'):
+            return url[len('file://'):]
+        if '://' in url or ':' in url.split('/')[0]:
+            return None
+        return url
+
+    def maintenance(self):
+        """Run incremental maintenance, returning objects size before and after, and failed command if any"""
+
+        size_before = self._objects_size()
+        commands = [['git repack -d -l -q'],
+                    ['git prune --expire=2.weeks.ago'],
+                    ['git multi-pack-index write --no-progress'],
+                    ['git multi-pack-index expire --no-progress'],
+                    ['git multi-pack-index repack --no-progress'],
+                    ['git commit-graph write --reachable --split --no-progress']]
+
+        for command in commands:
+            if command[0].startswith('git multi-pack-index repack'):
+                # Sized after the steps above, so the pack of previously loose objects is combined too
+                batch_size = self._multi_pack_index_batch_size()
+                if not batch_size:
+                    continue
+                command = command + ['--batch-size=' + str(batch_size)]
+            return_code = execute_command(command, self.repo_path, print_output=False)
+            if return_code != 0:
+                return size_before, self._objects_size(), ' '.join(command)
+        return size_before, self._objects_size(), None
+
+    def maintenance_schedule(self, enable=True):
+        """Register repo for or unregister it from git's background maintenance"""
+
+        command = 'git maintenance register' if enable else 'git maintenance unregister'
+        return_code = execute_command(command, self.repo_path, print_output=False)
+        if return_code != 0:
+            message = colored(' - Failed to update maintenance schedule\n', 'red') + fmt.command_failed_error(command)
+            self._print(message)
+            self._exit(message, return_code=return_code)
+
+    def matching_branches(self, patterns, remote=None):
+        """Return local branches, or remote tracking branches for remote, matching names or glob patterns"""
+
+        prefix = 'refs/heads/' if remote is None else 'refs/remotes/' + remote + '/'
+        try:
+            output = self.repo.git.for_each_ref('--format=%(refname)', prefix)
+        except GitError:
+            return []
+        except (KeyboardInterrupt, SystemExit):
+            self._exit()
+
+        names = [r[len(prefix):] for r in output.splitlines() if r.startswith(prefix)]
+        return [n for n in names if n != 'HEAD' and any([fnmatch.fnmatchcase(n, p) for p in patterns])]
+
     def new_commits(self, upstream=False):
         """Returns the number of new commits"""
 
+        local_commits, upstream_commits = self.new_commit_counts()
+        return upstream_commits if upstream else local_commits
+
+    def new_commit_counts(self):
+        """Returns the number of new local and upstream commits"""
+
+        branch = self.backend.current_branch()
+        if branch is None:
+            return 0, 0
+        tracking_branch = self.refs.tracking_branch(branch)
+        if tracking_branch is None:
+            return 0, 0
+
+        local_sha = self.backend.resolve_ref('refs/heads/' + branch)
+        upstream_sha = self.backend.resolve_ref(tracking_branch)
+        if local_sha is None or upstream_sha is None:
+            return 0, 0
         try:
-            local_branch = self.repo.active_branch
-        except (GitError, TypeError):
-            return 0
+            return self.backend.ahead_behind(local_sha, upstream_sha)
+        except ClowderGitError:
+            return 0, 0
         except (KeyboardInterrupt, SystemExit):
             self._exit()
-        else:
-            if local_branch is None:
-                return 0
 
-            tracking_branch = local_branch.tracking_branch()
-            if tracking_branch is None:
-                return 0
+    def prefetch(self, remote, depth=0):
+        """Fetch remote branches into refs/prefetch, returning failed command if any"""
 
-            try:
-                commits = local_branch.commit.hexsha + '...' + tracking_branch.commit.hexsha
-                rev_list_count = self.repo.git.rev_list('--count', '--left-right', commits)
-                if upstream:
-                    count = str(rev_list_count).split()[1]
-                else:
-                    count = str(rev_list_count).split()[0]
-                return count
-            except (GitError, ValueError):
-                return 0
-            except (KeyboardInterrupt, SystemExit):
-                self._exit()
+        if remote not in self.refs.remote_names():
+            return None
+        refspec = "'+refs/heads/*:" + __repo_prefetch_namespace__ + remote + "/*'"
+        command = ['git fetch', remote, '--quiet --prune --no-tags --no-write-fetch-head --refmap=', refspec]
+        if depth != 0:
+            command += ['--depth', str(depth)]
+        return_code = execute_command(command, self.repo_path, print_output=False)
+        if return_code != 0:
+            return ' '.join(command)
+        return None
 
     def print_branches(self, local=False, remote=False):
         """Print branches"""
@@ -275,12 +373,36 @@ class GitRepo(object):
             return 'sha'
         return 'unknown'
 
+    def ref_status(self):
+        """Return current ref name and number of new local and upstream commits"""
+
+        if self.is_detached():
+            return {'detached': True, 'ref': self.sha(short=True), 'local_commits': 0, 'upstream_commits': 0}
+
+        local_commits, upstream_commits = self.new_commit_counts()
+        return {'detached': False,
+                'ref': self.current_branch(),
+                'local_commits': local_commits,
+                'upstream_commits': upstream_commits}
+
+    def ref_status_files(self):
+        """Return ref files the ref status depends on, relative to the .git directory"""
+
+        branch = self.refs.current_branch()
+        if branch is None:
+            return []
+        tracking_branch = self.refs.tracking_branch(branch)
+        if tracking_branch is None:
+            return ['refs/heads/' + branch]
+        return ['refs/heads/' + branch, tracking_branch]
+
     def sha(self, short=False):
         """Return sha for currently checked out commit"""
 
+        sha = self.backend.sha()
         if short:
-            return self.repo.git.rev_parse(self.repo.head.commit.hexsha, short=True)
-        return self.repo.head.commit.hexsha
+            return self.backend.short_sha(sha)
+        return sha
 
     def sha_branch_remote(self, remote, branch):
         """Return sha for remote branch"""
@@ -333,6 +455,31 @@ class GitRepo(object):
             length = 0
         return ref[length:]
 
+    def update_timestamp_index(self, ref):
+        """Add commits reachable from ref since it was last indexed to its timestamp index, returning success"""
+
+        tip = self.backend.resolve_ref(ref)
+        if tip is None:
+            return False
+
+        # Only the header is read, so an index that's already up to date costs one line regardless of history size
+        shallow = timestamp_index.shallow_signature(self.repo_path)
+        index_tip, index_shallow = timestamp_index.load_header(self.repo_path, ref)
+        if index_tip == tip and index_shallow == shallow:
+            return True
+
+        if index_tip is not None and index_shallow == shallow and self._is_ancestor(index_tip, tip):
+            new_entries = self._timestamp_entries(index_tip + '..' + tip)
+            if new_entries is None:
+                return False
+            if timestamp_index.append_entries(self.repo_path, ref, tip, shallow, sorted(new_entries)):
+                return True
+
+        entries = self._timestamp_entries(tip)
+        if entries is None:
+            return False
+        return timestamp_index.save_index(self.repo_path, ref, tip, shallow, sorted(entries))
+
     def validate_repo(self):
         """Validate repo state"""
 
@@ -352,6 +499,24 @@ class GitRepo(object):
             print(' - Dirty repo. Please stash, commit, or discard your changes')
             repo.status_verbose()
 
+    def worktree_add(self, path, ref, branch=None):
+        """Add linked worktree at path on branch, or detached at ref, returning failed command if any"""
+
+        start = quote(self._worktree_start(ref))
+        if branch is None:
+            command = ['git worktree add --quiet --detach', quote(path), start]
+        elif self.existing_local_branch(branch):
+            command = ['git worktree add --quiet', quote(path), quote(branch)]
+        elif self.existing_remote_branch(branch, self.remote):
+            command = ['git worktree add --quiet --track -b', quote(branch), quote(path),
+                       quote(self.remote + '/' + branch)]
+        else:
+            command = ['git worktree add --quiet -b', quote(branch), quote(path), start]
+        return_code = execute_command(command, self.repo_path, print_output=False)
+        if return_code != 0:
+            return ' '.join(command)
+        return None
+
     def _abort_rebase(self):
         """Abort rebase"""
 
@@ -520,6 +685,35 @@ class GitRepo(object):
         except (KeyboardInterrupt, SystemExit):
             self._exit()
 
+    def _clone_local(self, url):
+        """Clone local repository with hardlinked objects, leaving HEAD unborn like a new repository"""
+
+        path = GitRepo.local_path(url)
+        if path is None or not os.path.isdir(path) or GitRepo.existing_git_repository(self.repo_path):
+            return False
+        if os.path.isdir(self.repo_path) and os.listdir(self.repo_path):
+            return False
+
+        try:
+            self._print(' - Clone local repo ' + fmt.path(path))
+            # git ignores --local for file:// urls, so clone from the path and restore the url afterwards
+            self.repo = Repo.clone_from(path, self.repo_path, local=True, no_checkout=True, origin=self.remote)
+            if url != path:
+                self.repo.git.remote('set-url', self.remote, url)
+            head_ref = self.repo.git.symbolic_ref('HEAD')
+            self.repo.git.update_ref('-d', head_ref)
+            self.repo.git.config('--remove-section', 'branch.' + head_ref[len('refs/heads/'):])
+            return True
+        except GitError as err:
+            self._print(colored(' - Failed to clone local repo', 'red'))
+            self._print(fmt.error(err))
+            remove_directory(self.repo_path)
+            self.repo = None
+            return False
+        except (KeyboardInterrupt, SystemExit):
+            remove_directory(self.repo_path)
+            self._exit()
+
     def _create_branch_local(self, branch):
         """Create local branch"""
 
@@ -607,8 +801,7 @@ class GitRepo(object):
     def _create_remote(self, remote, url, remove_dir=False):
         """Create new remote"""
 
-        remote_names = [r.name for r in self.repo.remotes]
-        if remote in remote_names:
+        if remote in self.refs.remote_names():
             return 0
 
         remote_output = fmt.remote_string(remote)
@@ -628,6 +821,14 @@ class GitRepo(object):
                 remove_directory(self.repo_path)
             self._exit()
 
+    def _execute_transfer(self, command):
+        """Run git fetch or pull, reporting transfer progress to the parent process when running in a worker"""
+
+        report_progress = progress_reporter(self.repo_path) if not self.print_output else None
+        if report_progress is None:
+            return execute_command(command, self.repo_path, print_output=self.print_output)
+        return execute_progress_command(command[:1] + ['--progress'] + command[1:], self.repo_path, report_progress)
+
     def _existing_remote_tag(self, tag, remote, depth=0):
         """Check if remote tag exists"""
 
@@ -639,7 +840,8 @@ class GitRepo(object):
         """Exit based on serial or parallel job"""
 
         if self.parallel:
-            raise ClowderGitError(msg=fmt.parallel_exception_error(self.repo_path, message))
+            log_tail = fmt.log_tail(logs.tail(self.repo_path))
+            raise ClowderGitError(msg=fmt.parallel_exception_error(self.repo_path, message, log_tail))
         sys.exit(return_code)
 
     def _find_rev_by_timestamp(self, timestamp, ref):
@@ -693,6 +895,22 @@ class GitRepo(object):
             remove_directory(self.repo_path)
             self._exit()
 
+    def _init_repo_with_remote(self, url, depth=0):
+        """Initialize repository with remote, cloning with hardlinked objects when url is a local repository"""
+
+        if depth == 0 and self._clone_local(url):
+            return
+        self._init_repo()
+        self._create_remote(self.remote, url, remove_dir=True)
+
+    def _is_ancestor(self, ancestor, rev):
+        """Check if commit is an ancestor of rev"""
+
+        try:
+            return self.backend.is_ancestor(ancestor, rev)
+        except (KeyboardInterrupt, SystemExit):
+            self._exit()
+
     def _is_branch_checked_out(self, branch):
         """Check if branch is checked out"""
 
@@ -706,16 +924,30 @@ class GitRepo(object):
         except (KeyboardInterrupt, SystemExit):
             self._exit()
 
+    def _is_branch_in_other_worktree(self, branch):
+        """Check if branch is checked out in another worktree, where git won't let it be checked out again"""
+
+        return branch in self.refs.worktree_branches()
+
     def _is_dirty(self):
         """Check if repo is dirty"""
 
-        return self.repo.is_dirty()
+        try:
+            return self.backend.is_dirty()
+        except ClowderGitError as err:
+            message = colored(' - Failed to check for changes', 'red')
+            self._print(message)
+            self._print(fmt.error(err))
+            self._exit(message)
+        except (KeyboardInterrupt, SystemExit):
+            self._exit()
 
     def _is_rebase_in_progress(self):
         """Detect whether rebase is in progress"""
 
-        rebase_apply = os.path.join(self.repo_path, '.git', 'rebase-apply')
-        rebase_merge = os.path.join(self.repo_path, '.git', 'rebase-merge')
+        git_dir = self.refs.git_dir() or os.path.join(self.repo_path, '.git')
+        rebase_apply = os.path.join(git_dir, 'rebase-apply')
+        rebase_merge = os.path.join(git_dir, 'rebase-merge')
         is_rebase_apply = os.path.isdir(rebase_apply)
         is_rebase_merge = os.path.isdir(rebase_merge)
         return is_rebase_apply or is_rebase_merge
@@ -723,61 +955,31 @@ class GitRepo(object):
     def _is_tracking_branch(self, branch):
         """Check if branch is a tracking branch"""
 
-        branch_output = fmt.ref_string(branch)
-        try:
-            local_branch = self.repo.heads[branch]
-            tracking_branch = local_branch.tracking_branch()
-            return True if tracking_branch else False
-        except GitError as err:
-            message = colored(' - No existing branch ', 'red') + branch_output
+        if not self.existing_local_branch(branch):
+            message = colored(' - No existing branch ', 'red') + fmt.ref_string(branch)
             self._print(message)
-            self._print(fmt.error(err))
             self._exit(message)
-        except (KeyboardInterrupt, SystemExit):
-            self._exit()
-
-    def _print(self, val):
-        """Print output if print_output is True"""
-
-        if self.print_output:
-            print(val)
+        return self.refs.tracking_branch(branch) is not None
 
-    def _pull(self, remote, branch):
-        """Pull from remote branch"""
+    def _multi_pack_index_batch_size(self):
+        """Return batch size that combines all but the largest pack, or 0 if there's nothing to repack"""
 
-        if self.repo.head.is_detached:
-            self._print(' - HEAD is detached')
-            return
-
-        branch_output = fmt.ref_string(branch)
-        remote_output = fmt.remote_string(remote)
-        self._print(' - Pull from ' + remote_output + ' ' + branch_output)
-        command = ['git pull', remote, branch]
-
-        return_code = execute_command(command, self.repo_path, print_output=self.print_output)
-        if return_code != 0:
-            message = colored(' - Failed to pull from ', 'red') + remote_output + ' ' + branch_output
-            self._print(message)
-            self._exit(message)
+        pack_dir = os.path.join(self.refs.common_dir(), 'objects', 'pack')
+        sizes = sorted([os.path.getsize(p) for p in glob.glob(os.path.join(pack_dir, '*.pack'))], reverse=True)
+        if len(sizes) < 2:
+            return 0
+        return min(sizes[1] + 1, __maintenance_batch_size_max__)
 
-    def _rebase_remote_branch(self, remote, branch):
-        """Rebase from remote branch"""
+    def _objects_size(self):
+        """Return size in bytes of object database"""
 
-        if self.repo.head.is_detached:
-            self._print(' - HEAD is detached')
-            return
+        return directory_size(os.path.join(self.refs.common_dir(), 'objects'))
 
-        branch_output = fmt.ref_string(branch)
-        remote_output = fmt.remote_string(remote)
-        self._print(' - Rebase onto ' + remote_output + ' ' + branch_output)
-        command = ['git pull --rebase', remote, branch]
+    def _print(self, val):
+        """Print output if print_output is True"""
 
-        return_code = execute_command(command, self.repo_path, print_output=self.print_output)
-        if return_code != 0:
-            message = colored(' - Failed to rebase onto ', 'red') + remote_output + ' ' + branch_output
-            self._print(message)
-            self._print(fmt.command_failed_error(command))
-            self._exit(message)
+        if self.print_output:
+            print(val)
 
     def _remote(self, remote, remove_dir=False):
         """Get remote"""
@@ -798,7 +1000,7 @@ class GitRepo(object):
     def _remote_get_url(self, remote):
         """Get url of remote"""
 
-        return self.repo.git.remote('get-url', remote)
+        return self.backend.remote_url(remote)
 
     def _rename_remote(self, remote_from, remote_to):
         """Rename remote"""
@@ -883,17 +1085,67 @@ class GitRepo(object):
                 remove_directory(self.repo_path)
             self._exit()
 
+    def _timestamp_entries(self, revs):
+        """Return (commit time, sha, author) entries for commits in revs, or None if they can't be read"""
+
+        try:
+            output = self.repo.git.log('--no-show-signature', '--format=%ct%x09%H%x09%an <%ae>', revs)
+            return [timestamp_index.parse_entry(line) for line in output.splitlines() if line]
+        except (GitError, ValueError):
+            return None
+        except (KeyboardInterrupt, SystemExit):
+            self._exit()
+
     def _untracked_files(self):
-        """Execute command and display continuous output"""
+        """Check for untracked or deleted files"""
 
-        command = "git ls-files -o -d --exclude-standard | sed q | wc -l| tr -d '[:space:]'"
         try:
-            output = subprocess.check_output(command, shell=True, cwd=self.repo_path)
-            return output.decode('utf-8') == '1'
-        except GitError as err:
+            return self.backend.untracked_files()
+        except ClowderGitError as err:
             message = colored(' - Failed to check untracked files', 'red')
             self._print(message)
             self._print(fmt.error(err))
             self._exit(message)
         except (KeyboardInterrupt, SystemExit):
             self._exit()
+
+    def _update_branch(self, remote, branch, rebase=False):
+        """Fast-forward or rebase checked out branch onto remote branch that was already fetched"""
+
+        if self.refs.is_detached():
+            self._print(' - HEAD is detached')
+            return
+
+        branch_output = fmt.ref_string(branch)
+        if self.backend.sha() == self.backend.resolve_ref('refs/remotes/' + remote + '/' + branch):
+            self._print(' - Branch ' + branch_output + ' already up to date')
+            return
+
+        # Only local refs are read, so nothing is fetched again the way git pull would
+        upstream_branch = remote + '/' + branch
+        upstream_output = fmt.remote_string(remote) + ' ' + branch_output
+        if rebase:
+            self._print(' - Rebase onto ' + upstream_output)
+            command = ['git rebase', upstream_branch]
+            message = colored(' - Failed to rebase onto ', 'red') + upstream_output
+        else:
+            self._print(' - Fast-forward to ' + upstream_output)
+            command = ['git merge --ff-only', upstream_branch]
+            message = colored(' - Failed to fast-forward to ', 'red') + upstream_output
+        return_code = execute_command(command, self.repo_path, print_output=self.print_output)
+        if return_code != 0:
+            self._print(message)
+            self._print(fmt.command_failed_error(command))
+            self._exit(message)
+
+    def _worktree_start(self, ref):
+        """Return commit to start worktree for ref from, preferring the remote tracking branch"""
+
+        if self.ref_type(ref) != 'branch':
+            return ref
+        branch = self.truncate_ref(ref)
+        if self.existing_remote_branch(branch, self.remote):
+            return 'refs/remotes/' + self.remote + '/' + branch
+        if self.existing_local_branch(branch):
+            return ref
+        return 'HEAD'
@@ -0,0 +1,91 @@
+"""Cross-invocation cache of project ref status"""
+
+import errno
+import json
+import os
+
+from clowder.git.ref_reader import RefReader
+
+# Disable errors shown by pylint for catching too general exception
+# pylint: disable=W0703
+
+__status_cache_version__ = 1
+
+
+def load_status(repo_path):
+    """Return cached ref status if git metadata is unchanged since it was saved, otherwise None"""
+
+    cache_file = _cache_file(repo_path)
+    if cache_file is None or not os.path.isfile(cache_file):
+        return None
+
+    try:
+        with open(cache_file) as raw_file:
+            cached = json.load(raw_file)
+    except (IOError, ValueError):
+        return None
+
+    if cached.get('version') != __status_cache_version__:
+        return None
+    if cached.get('signature') != signature(repo_path, cached.get('refs', [])):
+        return None
+    return cached.get('status')
+
+
+def save_status(repo_path, status, refs, ref_signature):
+    """Save ref status along with the signature computed before the status was read"""
+
+    cache_file = _cache_file(repo_path)
+    if cache_file is None:
+        return
+
+    cached = {'version': __status_cache_version__,
+              'refs': refs,
+              'signature': ref_signature,
+              'status': status}
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+        temp_file = cache_file + '.' + str(os.getpid())
+        with open(temp_file, 'w') as raw_file:
+            json.dump(cached, raw_file)
+        os.rename(temp_file, cache_file)
+    except Exception as err:
+        # The cache is only an optimization, failing to write it is not an error
+        del err
+
+
+def _cache_file(repo_path):
+    """Return path to status cache file in the worktree's git directory, or None if repo has no git directory"""
+
+    git_dir = RefReader(repo_path).git_dir()
+    if git_dir is None:
+        return None
+    return os.path.join(git_dir, 'clowder', 'status.json')
+
+
+def signature(repo_path, refs):
+    """Return stat signature for HEAD, config, packed-refs, shallow, and loose ref files"""
+
+    reader = RefReader(repo_path)
+    git_dir = reader.git_dir() or os.path.join(repo_path, '.git')
+    # Linked worktrees have their own HEAD, everything else is in the directory shared by all worktrees
+    common_dir = reader.common_dir() or git_dir
+    paths = ['config', 'packed-refs', 'shallow'] + list(refs)
+    return [_stat(os.path.join(git_dir, 'HEAD'))] + [_stat(os.path.join(common_dir, *p.split('/'))) for p in paths]
+
+
+def _stat(path):
+    """Return stat signature of file, or None if missing"""
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+    return [mtime, stat.st_size, stat.st_ino]
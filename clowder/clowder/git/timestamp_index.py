@@ -0,0 +1,181 @@
+"""Sorted index of commit times for fast timestamp lookups"""
+
+import bisect
+import calendar
+import errno
+import io
+import os
+import re
+
+from clowder.git.ref_reader import RefReader
+
+# Disable errors shown by pylint for catching too general exception
+# pylint: disable=W0703
+
+__timestamp_index_version__ = '1'
+__iso_timestamp_regex__ = re.compile(r'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})'
+                                     r'\s*(Z|[+-]\d{2}:?\d{2})?$')
+
+
+def find_sha(entries, timestamp, author=None):
+    """Return sha of latest commit at or before timestamp, optionally by matching author, or None"""
+
+    index = bisect.bisect_left(entries, (timestamp + 1,))
+    if author is None:
+        return entries[index - 1][1] if index > 0 else None
+
+    try:
+        author_regex = re.compile(author)
+    except re.error:
+        author_regex = re.compile(re.escape(author))
+    for commit_time, sha, commit_author in reversed(entries[:index]):
+        del commit_time
+        if author_regex.search(commit_author):
+            return sha
+    return None
+
+
+def append_entries(repo_path, ref, tip, shallow, new_entries):
+    """Append entries for commits added since the index was saved and record the new tip, returning success"""
+
+    index_file = _index_file(repo_path, ref)
+    if index_file is None:
+        return False
+
+    header = _header(tip, shallow)
+    try:
+        with open(index_file, 'r+b') as raw_file:
+            # The header is rewritten in place, so it has to keep its length. It's written after the entries, so an
+            # interrupted append still names the old tip and the entries are appended again next time
+            if len(raw_file.readline()) != len(header):
+                return False
+            raw_file.seek(0, os.SEEK_END)
+            raw_file.write(_entry_lines(new_entries))
+            raw_file.flush()
+            raw_file.seek(0)
+            raw_file.write(header)
+    except Exception as err:
+        del err
+        return False
+    return True
+
+
+def load_header(repo_path, ref):
+    """Return indexed tip sha and shallow signature for ref without reading its entries"""
+
+    index_file = _index_file(repo_path, ref)
+    if index_file is None or not os.path.isfile(index_file):
+        return None, None
+
+    try:
+        with open(index_file) as raw_file:
+            header = raw_file.readline().split()
+    except IOError:
+        return None, None
+    if len(header) != 4 or header[0] != '#' or header[1] != __timestamp_index_version__:
+        return None, None
+    return header[2], header[3]
+
+
+def load_index(repo_path, ref):
+    """Return indexed tip sha, shallow signature, and sorted (commit time, sha, author) entries for ref"""
+
+    index_file = _index_file(repo_path, ref)
+    if index_file is None or not os.path.isfile(index_file):
+        return None, None, []
+
+    try:
+        with io.open(index_file, encoding='utf-8') as raw_file:
+            header = raw_file.readline().split()
+            if len(header) != 4 or header[0] != '#' or header[1] != __timestamp_index_version__:
+                return None, None, []
+            entries = [parse_entry(line) for line in raw_file]
+    except (IOError, ValueError, IndexError):
+        return None, None, []
+    # Appended entries can be older than earlier ones, and sorting mostly sorted entries is linear
+    entries.sort()
+    return header[2], header[3], entries
+
+
+def parse_entry(line):
+    """Return (commit time, sha, author) tuple from index or log line"""
+
+    commit_time, sha, author = line.rstrip('\n').split('\t', 2)
+    return int(commit_time), sha, author
+
+
+def parse_iso_timestamp(timestamp):
+    """Return seconds since epoch for ISO 8601 timestamp as printed by git, or None if it can't be parsed"""
+
+    match = __iso_timestamp_regex__.match(timestamp.strip())
+    if match is None:
+        return None
+
+    year, month, day, hour, minute, second = [int(g) for g in match.groups()[:6]]
+    seconds = calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+    offset = match.group(7)
+    if offset is None or offset == 'Z':
+        return seconds
+    offset = offset.replace(':', '')
+    offset_seconds = int(offset[1:3]) * 3600 + int(offset[3:5]) * 60
+    return seconds - offset_seconds if offset[0] == '+' else seconds + offset_seconds
+
+
+def save_index(repo_path, ref, tip, shallow, entries):
+    """Save sorted entries for ref along with the tip sha they were read from, returning success"""
+
+    index_file = _index_file(repo_path, ref)
+    if index_file is None:
+        return False
+
+    try:
+        index_dir = os.path.dirname(index_file)
+        if not os.path.isdir(index_dir):
+            try:
+                os.makedirs(index_dir)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+        temp_file = index_file + '.' + str(os.getpid())
+        with open(temp_file, 'wb') as raw_file:
+            raw_file.write(_header(tip, shallow))
+            raw_file.write(_entry_lines(entries))
+        os.rename(temp_file, index_file)
+    except Exception as err:
+        # The index is only an optimization, failing to write it is not an error
+        del err
+        return False
+    return True
+
+
+def shallow_signature(repo_path):
+    """Return signature of shallow file, which changes when a shallow clone is deepened"""
+
+    common_dir = RefReader(repo_path).common_dir() or os.path.join(repo_path, '.git')
+    try:
+        stat = os.stat(os.path.join(common_dir, 'shallow'))
+    except OSError:
+        return 'none'
+    return str(stat.st_size) + '-' + str(int(stat.st_mtime))
+
+
+def _entry_lines(entries):
+    """Return index lines for entries"""
+
+    lines = [str(commit_time) + '\t' + sha + '\t' + author + '\n' for commit_time, sha, author in entries]
+    return ''.join(lines).encode('utf-8')
+
+
+def _header(tip, shallow):
+    """Return index header line"""
+
+    return (' '.join(['#', __timestamp_index_version__, tip, shallow]) + '\n').encode('utf-8')
+
+
+def _index_file(repo_path, ref):
+    """Return path to timestamp index for ref, or None if repo has no git directory"""
+
+    common_dir = RefReader(repo_path).common_dir()
+    if common_dir is None or not ref.startswith('refs/'):
+        return None
+    return os.path.join(common_dir, 'clowder', 'timestamps', *ref.split('/'))
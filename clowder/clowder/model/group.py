@@ -26,11 +26,6 @@ class Group(object):
         self.projects = [Project(root_directory, p, group, defaults, sources) for p in group['projects']]
         self.projects.sort(key=lambda p: p.path)
 
-    def existing_branch(self, branch, is_remote):
-        """Checks whether at least one branch exists"""
-
-        return any([p.existing_branch(branch, is_remote=is_remote) for p in self.projects])
-
     def existing_projects(self):
         """Validate existence status of all projects"""
 
@@ -4,6 +4,7 @@ from __future__ import print_function
 
 import os
 import sys
+import time
 
 from termcolor import colored
 
@@ -104,16 +105,6 @@ class Project(object):
         path = os.path.join(self.full_path())
         return os.path.isdir(path)
 
-    def existing_branch(self, branch, is_remote):
-        """Check if branch exists"""
-
-        repo = ProjectRepo(self.full_path(), self._remote, self._ref)
-        if not is_remote:
-            return repo.existing_local_branch(branch)
-
-        rem = self._remote if self.fork is None else self.fork.remote_name
-        return repo.existing_remote_branch(branch, rem)
-
     def fetch_all(self):
         """Fetch upstream changes if project exists on disk"""
 
@@ -136,6 +127,19 @@ class Project(object):
         repo_path = os.path.join(self._root_directory, self.path)
         return ProjectRepo.format_project_string(repo_path, self.path)
 
+    def forall_env(self):
+        """Return environment variables for forall commands"""
+
+        forall_env = {'CLOWDER_PATH': self._root_directory,
+                      'PROJECT_PATH': self.full_path(),
+                      'PROJECT_NAME': self.name,
+                      'PROJECT_REMOTE': self._remote,
+                      'PROJECT_REF': self._ref}
+
+        if self.fork:
+            forall_env['FORK_REMOTE'] = self.fork.remote_name
+        return forall_env
+
     def full_path(self):
         """Return full path to project"""
 
@@ -184,13 +188,13 @@ class Project(object):
 
         if branch:
             self._herd_branch(repo, branch, herd_depth, rebase)
-            return
-
-        if tag:
+        elif tag:
             self._herd_tag(repo, tag, herd_depth, rebase)
-            return
+        else:
+            self._herd_ref(repo, herd_depth, rebase)
 
-        self._herd_ref(repo, herd_depth, rebase)
+        repo.enable_untracked_cache()
+        repo.update_timestamp_index(self._ref)
 
     def is_dirty(self):
         """Check if project is dirty"""
@@ -204,6 +208,47 @@ class Project(object):
         repo = ProjectRepo(self.full_path(), self._remote, self._ref)
         return repo.validate_repo()
 
+    def maintenance(self):
+        """Run incremental git maintenance, returning time taken and objects size before and after"""
+
+        if not ProjectRepo.existing_git_repository(self.full_path()):
+            return None
+
+        repo = ProjectRepo(self.full_path(), self._remote, self._ref, parallel=True, print_output=False)
+        start = time.time()
+        size_before, size_after, failed_command = repo.maintenance()
+        return {'duration': time.time() - start,
+                'size_before': size_before,
+                'size_after': size_after,
+                'failed_command': failed_command}
+
+    def maintenance_schedule(self, enable=True):
+        """Register project for or unregister it from git's background maintenance"""
+
+        if not ProjectRepo.existing_git_repository(self.full_path()):
+            return
+
+        repo = ProjectRepo(self.full_path(), self._remote, self._ref)
+        repo.maintenance_schedule(enable=enable)
+
+    def prefetch(self):
+        """Fetch project and fork remotes into refs/prefetch, returning time taken and remotes fetched"""
+
+        if not ProjectRepo.existing_git_repository(self.full_path()):
+            return None
+
+        repo = ProjectRepo(self.full_path(), self._remote, self._ref, parallel=True, print_output=False)
+        remotes = [self._remote] if self.fork is None else [self.fork.remote_name, self._remote]
+        start = time.time()
+        failed_command = None
+        for remote in remotes:
+            failed_command = repo.prefetch(remote, depth=self._depth if remote == self._remote else 0)
+            if failed_command is not None:
+                break
+        return {'duration': time.time() - start,
+                'remotes': remotes,
+                'failed_command': failed_command}
+
     def print_exists(self):
         """Print existence validation message for project"""
 
@@ -218,19 +263,33 @@ class Project(object):
             print(self.status())
             ProjectRepo.validation(self.full_path())
 
-    def prune(self, branch, force=False, local=False, remote=False):
-        """Prune branch"""
+    def prune(self, local_branches, remote_branches, force=False, parallel=False):
+        """Prune local and remote branches"""
 
         if not ProjectRepo.existing_git_repository(self.full_path()):
             return
 
-        if local and remote:
-            self._prune_local(branch, force)
-            self._prune_remote(branch)
-        elif local:
-            self._prune_local(branch, force)
-        elif remote:
-            self._prune_remote(branch)
+        self._print_output = not parallel
+        if local_branches:
+            repo = ProjectRepo(self.full_path(), self._remote, self._ref,
+                               parallel=parallel, print_output=self._print_output)
+            repo.prune_branches_local(local_branches, force)
+        if remote_branches:
+            remote = self._remote if self.fork is None else self.fork.remote_name
+            repo = ProjectRepo(self.full_path(), remote, self._ref, parallel=parallel, print_output=self._print_output)
+            repo.prune_branches_remote(remote_branches, remote)
+
+    def prune_candidates(self, patterns, local=False, remote=False):
+        """Return local and remote branches matching names or glob patterns"""
+
+        if not ProjectRepo.existing_git_repository(self.full_path()):
+            return [], []
+
+        repo = ProjectRepo(self.full_path(), self._remote, self._ref)
+        local_branches = repo.matching_branches(patterns) if local else []
+        remote_name = self._remote if self.fork is None else self.fork.remote_name
+        remote_branches = repo.matching_branches(patterns, remote=remote_name) if remote else []
+        return local_branches, remote_branches
 
     def reset(self, timestamp=None, parallel=False):
         """Reset project branches to upstream or checkout tag/sha as detached HEAD"""
@@ -252,16 +311,7 @@ class Project(object):
         self._print_output = not parallel
         self._print(fmt.command(command))
 
-        forall_env = {'CLOWDER_PATH': self._root_directory,
-                      'PROJECT_PATH': self.full_path(),
-                      'PROJECT_NAME': self.name,
-                      'PROJECT_REMOTE': self._remote,
-                      'PROJECT_REF': self._ref}
-
-        if self.fork:
-            forall_env['FORK_REMOTE'] = self.fork.remote_name
-
-        return_code = execute_forall_command(command.split(), self.full_path(), forall_env, self._print_output)
+        return_code = execute_forall_command(command.split(), self.full_path(), self.forall_env(), self._print_output)
         if not ignore_errors:
             err = fmt.command_failed_error(command)
             if return_code != 0:
@@ -312,6 +362,20 @@ class Project(object):
                           parallel=parallel, print_output=self._print_output)
         self._sync(repo, rebase)
 
+    def worktree_add(self, primary_directory, branch=None):
+        """Add project as worktree of its clone in primary workspace, returning time taken and ref checked out"""
+
+        primary_path = os.path.join(primary_directory, self.path)
+        if not ProjectRepo.existing_git_repository(primary_path):
+            return None
+
+        repo = ProjectRepo(primary_path, self._remote, self._ref, parallel=True, print_output=False)
+        start = time.time()
+        failed_command = repo.worktree_add(self.full_path(), self._ref, branch=branch)
+        return {'duration': time.time() - start,
+                'ref': branch if branch is not None else ProjectRepo.truncate_ref(self._ref),
+                'failed_command': failed_command}
+
     @staticmethod
     def _exit(message, parallel=False, return_code=1):
         """Exit based on serial or parallel job"""
@@ -374,21 +438,6 @@ class Project(object):
         if self._print_output:
             print(val)
 
-    def _prune_local(self, branch, force):
-        """Prune local branch"""
-
-        repo = ProjectRepo(self.full_path(), self._remote, self._ref)
-        if repo.existing_local_branch(branch):
-            repo.prune_branch_local(branch, force)
-
-    def _prune_remote(self, branch):
-        """Prune remote branch"""
-
-        remote = self._remote if self.fork is None else self.fork.remote_name
-        repo = ProjectRepo(self.full_path(), remote, self._ref)
-        if repo.existing_remote_branch(branch, remote):
-            repo.prune_branch_remote(branch, remote)
-
     @staticmethod
     def _repo(path, remote, ref, recursive, **kwargs):
         """Clone project or update latest from upstream"""
@@ -422,13 +471,10 @@ class Project(object):
         """Sync fork project with upstream"""
 
         self._print(self.fork.status())
+        if not ProjectRepo.existing_git_repository(self.full_path()):
+            self._print(fmt.fork_string(self.name))
+            repo.herd(self._url, rebase=rebase)
         repo.configure_remotes(self._remote, self._url, self.fork.remote_name, self.fork.url)
 
-        self._print(fmt.fork_string(self.name))
-        repo.herd(self._url, self._remote, rebase=rebase)
-
-        self._print(fmt.fork_string(self.fork.name))
-        repo.herd_remote(self.fork.url, self.fork.remote_name)
-
         self._print(self.fork.status())
-        repo.sync(self.fork.remote_name, rebase=rebase)
+        repo.sync(self._url, self.fork.remote_name, self.fork.url, rebase=rebase)
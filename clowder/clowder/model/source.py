@@ -1,5 +1,7 @@
 """Representation of clowder.yaml source"""
 
+import os
+
 
 class Source(object):
     """clowder.yaml source class"""
@@ -12,12 +14,26 @@ class Source(object):
         """Return full remote url prefix for project"""
 
         source_url_prefix = None
-        if self.url.startswith('https://'):
-            source_url_prefix = self.url + "/"
-        elif self.url.startswith('ssh://'):
+        if self.url.startswith('ssh://'):
             source_url_prefix = self.url[6:] + ":"
+        elif '://' in self.url:
+            source_url_prefix = self.url.rstrip('/') + "/"
+        elif self.is_local():
+            source_url_prefix = os.path.abspath(os.path.expanduser(self.url)).rstrip('/') + "/"
         return source_url_prefix
 
+    def is_local(self):
+        """Check if source is a local directory given as file:// url or absolute path"""
+
+        return self.url.startswith('file://') or self.url.startswith('/') or self.url.startswith('~')
+
+    def ssh_host(self):
+        """Return ssh host for ssh sources, otherwise None"""
+
+        if self.url.startswith('ssh://'):
+            return self.url[6:]
+        return None
+
     def get_yaml(self):
         """Return python object representation for saving yaml"""
 
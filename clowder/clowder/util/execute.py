@@ -2,15 +2,22 @@
 
 import atexit
 import os
+import re
 import subprocess
+import time
 from multiprocessing.pool import ThreadPool
 
 from termcolor import cprint
 
+import clowder.util.logs as logs
+import clowder.util.trace as trace
+
 
 # Disable errors shown by pylint for catching too general exception
 # pylint: disable=W0703
 
+__progress_update__ = re.compile(r'\d+% \(\d+/\d+\)')
+
 
 def subprocess_exit_handler(process):
     """terminate subprocess"""
@@ -21,21 +28,30 @@ def subprocess_exit_handler(process):
         del err
 
 
-def execute_subprocess_command(command, path, shell=True, env=None, stdout=None, stderr=None):
-    """Execute subprocess command"""
+def execute_subprocess_command(command, path, shell=True, env=None, stdout=None, stderr=None, log=None):
+    """Execute subprocess command, reading piped output in bounded chunks and writing it to log if given"""
 
     if isinstance(command, list):
         cmd = ' '.join(command)
     else:
         cmd = command
+    if log is not None:
+        log.write(('$ ' + cmd + '\n').encode('utf-8'))
+    start_time = time.time()
     try:
         process = subprocess.Popen(cmd, shell=shell, env=env, cwd=path,
                                    stdout=stdout, stderr=stderr)
         atexit.register(subprocess_exit_handler, process)
-        process.communicate()
+        if stdout == subprocess.PIPE:
+            output_bytes = logs.pump(process.stdout, log)
+            process.wait()
+        else:
+            process.wait()
+            output_bytes = None
     except (KeyboardInterrupt, SystemExit):
         raise
     else:
+        trace.record('subprocess', cmd, path, start_time, time.time(), process.returncode, output_bytes)
         return process.returncode
 
 
@@ -46,17 +62,18 @@ def execute_command(command, path, shell=True, env=None, print_output=True):
     if env:
         cmd_env.update(env)
 
+    # Output that isn't printed goes to the project's log instead of being buffered in memory
     if print_output:
-        pipe = None
+        pipe, combined, log = None, None, None
     else:
-        pipe = subprocess.PIPE
+        pipe, combined, log = subprocess.PIPE, subprocess.STDOUT, logs.project_log(path)
 
     pool = ThreadPool()
 
     try:
         result = pool.apply(execute_subprocess_command,
                             args=(command, path),
-                            kwds={'shell': shell, 'env': cmd_env, 'stdout': pipe, 'stderr': pipe})
+                            kwds={'shell': shell, 'env': cmd_env, 'stdout': pipe, 'stderr': combined, 'log': log})
         pool.close()
         pool.join()
         return result
@@ -79,7 +96,57 @@ def execute_command(command, path, shell=True, env=None, print_output=True):
         return 1
 
 
+def execute_progress_command(command, path, report_progress, env=None):
+    """Execute git command with --progress, passing each progress line written to stderr to callback"""
+
+    cmd_env = os.environ.copy()
+    if env:
+        cmd_env.update(env)
+    cmd = ' '.join(command) if isinstance(command, list) else command
+
+    log = logs.project_log(path)
+    if log is not None:
+        log.write(('$ ' + cmd + '\n').encode('utf-8'))
+    start_time = time.time()
+    output_bytes = 0
+    return_code = 1
+    with open(os.devnull, 'w') as devnull:
+        try:
+            process = subprocess.Popen(cmd, shell=True, env=cmd_env, cwd=path,
+                                       stdout=devnull, stderr=subprocess.PIPE)
+        except OSError:
+            return 1
+        atexit.register(subprocess_exit_handler, process)
+        buffered = b''
+        try:
+            for chunk in iter(lambda: os.read(process.stderr.fileno(), 4096), b''):
+                output_bytes += len(chunk)
+                lines = (buffered + chunk).replace(b'\r', b'\n').split(b'\n')
+                buffered = lines.pop()
+                for line in lines:
+                    if line:
+                        report_progress(line.decode('utf-8', 'replace'))
+                if log is not None:
+                    log.write(_log_lines(lines))
+            if log is not None and buffered:
+                log.write(_log_lines([buffered]))
+            process.stderr.close()
+            return_code = process.wait()
+            return return_code
+        finally:
+            report_progress(None)
+            trace.record('subprocess', cmd, path, start_time, time.time(), return_code, output_bytes)
+
+
 def execute_forall_command(command, path, forall_env, print_output):
     """Execute forall command with additional environment variables and display continuous output"""
 
     return execute_command(command, path, env=forall_env, print_output=print_output)
+
+
+def _log_lines(lines):
+    """Return progress output lines to log, leaving out intermediate progress updates"""
+
+    kept = [l for l in lines if l and (not __progress_update__.search(l.decode('utf-8', 'replace')) or
+                                       l.endswith(b'done.'))]
+    return b''.join([l + b'\n' for l in kept])
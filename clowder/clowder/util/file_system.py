@@ -2,6 +2,7 @@
 
 from __future__ import print_function
 
+import os
 import shutil
 import sys
 
@@ -10,6 +11,19 @@ from termcolor import colored
 import clowder.util.formatting as fmt
 
 
+def directory_size(path):
+    """Return total size in bytes of files under path"""
+
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
 def remove_directory(path):
     """Remove directory at path"""
 
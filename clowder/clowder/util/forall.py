@@ -0,0 +1,325 @@
+"""Concurrent forall command execution"""
+
+from __future__ import print_function
+
+import importlib
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.pool import ThreadPool
+
+from termcolor import colored, cprint
+
+import clowder.util.formatting as fmt
+import clowder.util.logs as logs
+import clowder.util.trace as trace
+
+# Disable errors shown by pylint for catching too general exception
+# pylint: disable=W0703
+
+__forall_functions__ = {}
+
+
+class ForallContext(object):
+    """Class describing project passed to forall python functions"""
+
+    def __init__(self, name, path, env):
+        self.name = name
+        self.path = path
+        self.full_path = env['PROJECT_PATH']
+        self.clowder_path = env['CLOWDER_PATH']
+        self.remote = env['PROJECT_REMOTE']
+        self.ref = env['PROJECT_REF']
+        self.fork_remote = env.get('FORK_REMOTE')
+        self.env = dict(env)
+
+
+class ForallTask(object):
+    """Class holding command to run in a project directory and its result"""
+
+    def __init__(self, name, path, full_path, command, env):
+        self.name = name
+        self.path = path
+        self.full_path = full_path
+        self.command = command
+        self.env = env
+        self.missing = False
+        self.return_code = None
+        self.result = None
+        self.duration = 0.0
+        self.output = []
+        self.log = None
+
+    def failed(self):
+        """Check if command exited with non-zero return code"""
+
+        return not self.missing and self.return_code != 0
+
+    def output_lines(self):
+        """Return output lines, read back from the project log if output was written to one"""
+
+        if self.log is None:
+            return self.output
+        return self.output + self.log.read().splitlines()
+
+    def record(self):
+        """Return dictionary describing result"""
+
+        return {'name': self.name,
+                'path': self.path,
+                'missing': self.missing,
+                'return_code': self.return_code,
+                'result': self.result,
+                'duration': round(self.duration, 3),
+                'output': '\n'.join(self.output_lines())}
+
+
+class ForallRunner(object):
+    """Class running forall tasks with bounded concurrency"""
+
+    def __init__(self, jobs, output='prefix'):
+        self.jobs = max(1, jobs)
+        self.output = output
+        self._lock = threading.Lock()
+        self._processes = []
+        self._width = 0
+
+    def run(self, tasks):
+        """Run tasks, returning them with return codes, durations, and output filled in"""
+
+        if not tasks:
+            return tasks
+
+        self._width = max([len(t.path) for t in tasks])
+        pool = ThreadPool(min(self.jobs, len(tasks)))
+        try:
+            result = pool.map_async(self._run_task, tasks)
+            # Waiting with a timeout keeps the main thread responsive to KeyboardInterrupt
+            while not result.ready():
+                result.wait(0.1)
+            result.get()
+        except (KeyboardInterrupt, SystemExit):
+            self._terminate()
+            pool.terminate()
+            raise
+        pool.close()
+        pool.join()
+        return tasks
+
+    def run_python(self, tasks):
+        """Call forall python function for tasks in-process, or in worker processes if running more than one job"""
+
+        if not tasks:
+            return tasks
+
+        self._width = max([len(t.path) for t in tasks])
+        if self.jobs == 1:
+            for task in tasks:
+                run_python_task(task)
+                self._print_result(task)
+            return tasks
+
+        pool = mp.Pool(min(self.jobs, len(tasks)))
+        try:
+            for index, task in pool.imap_unordered(_run_python_task_index, enumerate(tasks)):
+                tasks[index] = task
+                self._print_result(task)
+        except (KeyboardInterrupt, SystemExit):
+            pool.terminate()
+            raise
+        pool.close()
+        pool.join()
+        return tasks
+
+    def _print_group(self, task):
+        """Print output of finished task as a block"""
+
+        print(fmt.forall_project_header(task.path, task.return_code, task.duration))
+        for line in task.output_lines():
+            print(line)
+        print()
+        sys.stdout.flush()
+
+    def _print_line(self, task, line):
+        """Print output line tagged with project path"""
+
+        with self._lock:
+            print(fmt.forall_prefix(task.path, self._width) + line)
+            sys.stdout.flush()
+
+    def _print_result(self, task):
+        """Print return value or error of forall python function"""
+
+        if self.output == 'json':
+            return
+        if task.missing:
+            self._print_missing(task)
+            return
+
+        lines = task.output_lines() if task.failed() else [str(task.result)]
+        if self.output == 'group':
+            with self._lock:
+                print(fmt.forall_project_header(task.path, task.return_code, task.duration))
+                for line in lines:
+                    print(line)
+                print()
+            return
+        for line in lines:
+            self._print_line(task, line)
+
+    def _print_missing(self, task):
+        """Print missing project message"""
+
+        if self.output == 'prefix':
+            self._print_line(task, colored('Project is missing', 'red'))
+        elif self.output == 'group':
+            with self._lock:
+                print(fmt.forall_project_header(task.path, None, 0.0))
+                print(colored('Project is missing', 'red') + '\n')
+
+    def _run_task(self, task):
+        """Run task command, streaming or collecting output"""
+
+        if not os.path.isdir(task.full_path):
+            task.missing = True
+            self._print_missing(task)
+            return
+
+        env = os.environ.copy()
+        env.update(task.env)
+        task.log = logs.project_log(task.full_path)
+        start = time.time()
+        try:
+            process = subprocess.Popen(task.command, shell=True, cwd=task.full_path, env=env,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError as err:
+            task.return_code = 1
+            task.output.append(str(err))
+        else:
+            with self._lock:
+                self._processes.append(process)
+            output_bytes = 0
+            for raw_line in iter(process.stdout.readline, b''):
+                output_bytes += len(raw_line)
+                line = raw_line.decode('utf-8', 'replace').rstrip('\r\n')
+                if task.log is not None:
+                    task.log.write(raw_line)
+                if self.output == 'prefix':
+                    self._print_line(task, line)
+                elif task.log is None:
+                    task.output.append(line)
+            process.stdout.close()
+            task.return_code = process.wait()
+            trace.record('subprocess', task.command, task.full_path, start, time.time(), task.return_code,
+                         output_bytes)
+        task.duration = time.time() - start
+
+        if self.output == 'group':
+            with self._lock:
+                self._print_group(task)
+
+    def _terminate(self):
+        """Terminate running commands"""
+
+        with self._lock:
+            for process in self._processes:
+                if process.poll() is None:
+                    try:
+                        process.terminate()
+                    except OSError:
+                        pass
+
+
+def load_function(spec, root_directory):
+    """Import and return function given as module:function, searching the clowder root directory first"""
+
+    if spec in __forall_functions__:
+        return __forall_functions__[spec]
+
+    module_name, _, function_name = spec.partition(':')
+    if not module_name or not function_name:
+        raise ValueError('Expected module:function, got ' + spec)
+    if root_directory not in sys.path:
+        sys.path.insert(0, root_directory)
+
+    function = getattr(importlib.import_module(module_name), function_name)
+    if not callable(function):
+        raise ValueError(spec + ' is not callable')
+    __forall_functions__[spec] = function
+    return function
+
+
+def run_python_task(task):
+    """Call forall python function in project directory, filling in result or traceback"""
+
+    if not os.path.isdir(task.full_path):
+        task.missing = True
+        return task
+
+    cwd = os.getcwd()
+    start = time.time()
+    try:
+        function = load_function(task.command, task.env['CLOWDER_PATH'])
+        os.chdir(task.full_path)
+        task.result = _json_value(function(ForallContext(task.name, task.path, task.env)))
+        task.return_code = 0
+    except KeyboardInterrupt:
+        raise
+    except SystemExit as err:
+        task.return_code = err.code if isinstance(err.code, int) else 1
+    except Exception:
+        task.return_code = 1
+        task.output = traceback.format_exc().splitlines()
+    finally:
+        os.chdir(cwd)
+    task.duration = time.time() - start
+    return task
+
+
+def _json_value(value):
+    """Return value if it can be written as json, otherwise its repr"""
+
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return repr(value)
+    return value
+
+
+def _run_python_task_index(indexed_task):
+    """Call forall python function for (index, task) pair in pool worker"""
+
+    index, task = indexed_task
+    return index, run_python_task(task)
+
+
+def print_json(command, tasks):
+    """Print results as a json document"""
+
+    results = {'command': command, 'projects': [t.record() for t in tasks]}
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+def print_summary(tasks, duration):
+    """Print summary table of failed and missing projects"""
+
+    failed = [t for t in tasks if t.failed()]
+    missing = [t for t in tasks if t.missing]
+    succeeded = len(tasks) - len(failed) - len(missing)
+
+    print()
+    print(fmt.forall_summary(succeeded, len(failed), len(missing), duration))
+    if not failed and not missing:
+        return
+
+    width = max([len(t.path) for t in failed + missing])
+    for task in failed:
+        cprint('   ' + task.path.ljust(width) + '  exit ' + str(task.return_code).ljust(4) +
+               '{0:8.1f}s'.format(task.duration), 'red')
+    for task in missing:
+        cprint('   ' + task.path.ljust(width) + '  missing', 'yellow')
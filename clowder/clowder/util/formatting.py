@@ -7,6 +7,45 @@ import yaml
 from termcolor import colored, cprint
 
 
+def batch_command(line_number, args):
+    """Return formatted command from batch file"""
+
+    return colored(str(line_number) + ':', 'cyan') + ' ' + command(['clowder'] + args)
+
+
+def batch_file_error(pth, err):
+    """Format error message for batch file that can't be read"""
+
+    output_1 = colored(' - Error: Failed to read batch file ', 'red')
+    return output_1 + path(pth) + '\n' + error(err)
+
+
+def batch_global_options_error(options):
+    """Format error message for global options in batch file command"""
+
+    output_1 = colored(' - Error: Global options apply to the whole batch, pass ', 'red')
+    output_2 = colored(' to clowder batch instead', 'red')
+    return output_1 + colored(' '.join(options), attrs=['bold']) + output_2
+
+
+def batch_result(result):
+    """Return formatted result of command from batch file"""
+
+    output = colored(str(result['line']) + ':', 'cyan') + ' {0:.1f}s '.format(result['duration'])
+    if result['return_code'] != 0:
+        return output + colored('exit ' + str(result['return_code']), 'red') + ' clowder ' + ' '.join(result['args'])
+    return output + colored('ok', 'green') + ' clowder ' + ' '.join(result['args'])
+
+
+def batch_summary(count, total, duration):
+    """Return formatted batch summary"""
+
+    output = ' - Ran ' + str(count) + ' of ' + str(total) + ' commands in {0:.1f}s'.format(duration)
+    if count < total:
+        output += ', stopped after first failure'
+    return output
+
+
 def clowder_command(cmd):
     """Return formatted clowder command name"""
 
@@ -68,6 +107,31 @@ def file_exists_error(pth):
     return output_1 + output_2
 
 
+def forall_prefix(pth, width):
+    """Return formatted prefix tagging forall output line with project path"""
+
+    return colored(pth.ljust(width), 'cyan') + ' | '
+
+
+def forall_project_header(pth, return_code, duration):
+    """Return formatted header for block of forall output"""
+
+    if return_code is None:
+        return path(pth)
+    result = colored('ok', 'green') if return_code == 0 else colored('exit ' + str(return_code), 'red')
+    return path(pth) + ' (' + result + ', ' + '{0:.1f}s'.format(duration) + ')'
+
+
+def forall_summary(succeeded, failed, missing, duration):
+    """Return formatted summary counts for forall run"""
+
+    output = ' - ' + colored(str(succeeded) + ' succeeded', 'green')
+    output += ', ' + colored(str(failed) + ' failed', 'red' if failed else None)
+    if missing:
+        output += ', ' + colored(str(missing) + ' missing', 'yellow')
+    return output + ' in ' + '{0:.1f}s'.format(duration)
+
+
 def fork_string(name):
     """Return formatted fork name"""
 
@@ -125,6 +189,39 @@ def invalid_yaml_error():
     return '\n' + clowder_output + ' appears to be invalid'
 
 
+def log_tail(tail):
+    """Return formatted last lines of project log, or empty string if nothing was logged"""
+
+    if tail is None:
+        return ''
+    log_file, lines = tail
+    output = '\n' + colored(' - Last lines of ', 'red') + path(log_file)
+    return output + ''.join(['\n   ' + line for line in lines])
+
+
+def maintenance_result(pth, result):
+    """Return formatted maintenance result for project"""
+
+    if result is None:
+        return path(pth) + ' ' + colored('Project is missing', 'red')
+
+    output = path(pth) + ' {0:.1f}s '.format(result['duration'])
+    output += size(result['size_before']) + ' -> ' + size(result['size_after'])
+    output += ' (' + size_change(result['size_after'] - result['size_before']) + ')'
+    if result['failed_command'] is not None:
+        output += '\n' + command_failed_error(result['failed_command'])
+    return output
+
+
+def maintenance_summary(count, reclaimed, duration):
+    """Return formatted maintenance summary"""
+
+    output = ' - Maintained ' + str(count) + ' projects in {0:.1f}s, '.format(duration)
+    if reclaimed >= 0:
+        return output + 'reclaimed ' + size(reclaimed)
+    return output + 'objects grew by ' + size(-reclaimed)
+
+
 def missing_entry_error(entry, name, yml):
     """Return formatted error string for missing entry in dictionary"""
 
@@ -228,6 +325,69 @@ def path(pth):
     return colored(pth, 'cyan')
 
 
+def prefetch_result(pth, result):
+    """Return formatted prefetch result for project"""
+
+    if result is None:
+        return path(pth) + ' ' + colored('Project is missing', 'red')
+
+    output = path(pth) + ' {0:.1f}s '.format(result['duration'])
+    output += ', '.join([remote_string(r) for r in result['remotes']])
+    if result['failed_command'] is not None:
+        output += '\n' + command_failed_error(result['failed_command'])
+    return output
+
+
+def prefetch_summary(count, duration):
+    """Return formatted prefetch summary"""
+
+    return ' - Prefetched ' + str(count) + ' projects in {0:.1f}s'.format(duration)
+
+
+def progress_line(completed, count, elapsed, num_bytes, transfers):
+    """Return single line progress summary with active transfers"""
+
+    output = 'Progress: ' + str(completed) + '/' + str(count) + ' projects, ' + size(num_bytes) + \
+        ' received, ' + '{0:.0f}s'.format(elapsed) + ' elapsed'
+    if transfers:
+        output += ', active: ' + ', '.join([t.path + ' (' + _transfer_status(t) + ')' for t in transfers])
+    return output
+
+
+def progress_more(count):
+    """Return line noting active transfers that didn't fit in the terminal"""
+
+    return '  ... ' + str(count) + ' more'
+
+
+def progress_transfer(path, width, transfer):
+    """Return live transfer status line for project"""
+
+    output = '  ' + path.ljust(width) + '  ' + transfer.phase.ljust(9) + ' ' + _transfer_status(transfer, phase=False)
+    if transfer.bytes:
+        output += '  ' + size(transfer.bytes)
+    if transfer.rate:
+        output += '  ' + size(transfer.rate) + '/s'
+    return output.rstrip()
+
+
+def profile_phases(phases, duration, color=True):
+    """Return phase breakdown table for profile"""
+
+    title = 'Phase breakdown, ' + '{0:.2f}s'.format(duration) + ' total'
+    output = [colored(title, attrs=['bold']) if color else title]
+    if not phases:
+        return '\n'.join(output)
+
+    width = max([len(p[0]) for p in phases])
+    output.append('  ' + 'phase'.ljust(width) + '       total  count         max   share')
+    for name, total, count, longest in phases:
+        share = 100 * total / duration if duration else 0.0
+        output.append('  ' + name.ljust(width) + '{0:11.3f}s{1:7d}{2:11.3f}s{3:7.1f}%'.format(total, count,
+                                                                                             longest, share))
+    return '\n'.join(output)
+
+
 def recursive_import_error(depth):
     """Format error message for too many recursive imports"""
 
@@ -236,6 +396,12 @@ def recursive_import_error(depth):
     return output_1 + 'Max imports: ' + output_2
 
 
+def ref_list(refs):
+    """Return formatted comma separated ref names"""
+
+    return ', '.join([ref_string(r) for r in refs])
+
+
 def ref_string(ref):
     """Return formatted ref name"""
 
@@ -316,6 +482,26 @@ def save_version_exists_error(version_name, yml):
     return output_1 + output_2 + output_3 + output_4
 
 
+def size(num_bytes):
+    """Return human readable byte count"""
+
+    value = float(num_bytes)
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(value) < 1024 or unit == 'GB':
+            return '{0:.1f} {1}'.format(value, unit)
+        value /= 1024
+
+
+def size_change(num_bytes):
+    """Return formatted signed byte count"""
+
+    if num_bytes > 0:
+        return colored('+' + size(num_bytes), 'yellow')
+    if num_bytes < 0:
+        return colored('-' + size(-num_bytes), 'green')
+    return size(0)
+
+
 def skip_project_message():
     """Return skip project message"""
 
@@ -330,12 +516,47 @@ def symlink_target(pth):
     return pth
 
 
+def truncate(output, width):
+    """Return output shortened to fit width"""
+
+    if len(output) <= width:
+        return output
+    return output[:max(0, width - 3)] + '...'
+
+
 def version(version_name):
     """Return formatted string for clowder.yaml version"""
 
     return colored(version_name, attrs=['bold'])
 
 
+def worktree_exists_error(pth):
+    """Format error message for existing worktree workspace directory"""
+
+    output_1 = colored(' - Error: Workspace directory already exists\n', 'red')
+    output_2 = path(pth)
+    return output_1 + output_2
+
+
+def worktree_result(pth, result):
+    """Return formatted worktree add result for project"""
+
+    if result is None:
+        return path(pth) + ' ' + colored('Not cloned in this workspace, clowder herd will clone it', 'yellow')
+
+    output = path(pth) + ' {0:.1f}s '.format(result['duration']) + ref_string(result['ref'])
+    if result['failed_command'] is not None:
+        output += '\n' + command_failed_error(result['failed_command'])
+    return output
+
+
+def worktree_summary(count, duration, pth):
+    """Return formatted worktree add summary"""
+
+    output = ' - Added ' + str(count) + ' project worktrees in {0:.1f}s'.format(duration)
+    return output + '\n - Workspace ' + path(pth)
+
+
 def yaml_file(yml):
     """Return formatted string for clowder.yaml file"""
 
@@ -352,3 +573,17 @@ def yaml_string(yaml_output):
         sys.exit(1)
     except (KeyboardInterrupt, SystemExit):
         sys.exit(1)
+
+
+def _transfer_status(transfer, phase=True):
+    """Return transfer phase, percent, and object counts"""
+
+    output = [transfer.phase] if phase else []
+    if transfer.percent is not None:
+        output.append('{0:3d}%'.format(transfer.percent))
+    if transfer.objects is not None:
+        if transfer.total_objects is not None:
+            output.append(str(transfer.objects) + '/' + str(transfer.total_objects) + ' objects')
+        else:
+            output.append(str(transfer.objects) + ' objects')
+    return ' '.join(output)
@@ -0,0 +1,301 @@
+"""Per-project log files for output of commands run without printing it"""
+
+from __future__ import print_function
+
+import collections
+import errno
+import json
+import os
+import shutil
+import threading
+import time
+
+from termcolor import colored
+
+import clowder.util.formatting as fmt
+from clowder.git.ref_reader import RefReader
+
+__chunk_size__ = 64 * 1024
+__kept_runs__ = 20
+__log_backups__ = 2
+__log_max_bytes__ = 8 * 1024 * 1024
+__logs_dir__ = 'logs'
+__run_file__ = 'run.json'
+__tail_lines__ = 20
+
+__lock__ = threading.Lock()
+__logs__ = {}
+__run__ = None
+__run_count__ = 0
+
+
+class ProjectLog(object):
+    """Class writing output to a rotating log file and keeping its last lines in memory"""
+
+    def __init__(self, log_file, max_bytes=__log_max_bytes__, backups=__log_backups__, tail_lines=__tail_lines__):
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._tail = collections.deque(maxlen=tail_lines)
+        self._partial = b''
+        self._size = os.path.getsize(log_file) if os.path.isfile(log_file) else 0
+
+    def files(self):
+        """Return existing log files, oldest first"""
+
+        names = [self.log_file + '.' + str(i) for i in range(self.backups, 0, -1)] + [self.log_file]
+        return [f for f in names if os.path.isfile(f)]
+
+    def read(self):
+        """Return text of log files, oldest first"""
+
+        contents = []
+        for log_file in self.files():
+            with open(log_file, 'rb') as raw_file:
+                contents.append(raw_file.read())
+        return b''.join(contents).decode('utf-8', 'replace')
+
+    def tail(self):
+        """Return last lines written"""
+
+        with self._lock:
+            lines = list(self._tail)
+            if self._partial:
+                lines.append(self._partial.decode('utf-8', 'replace'))
+        return lines[-self._tail.maxlen:]
+
+    def write(self, data):
+        """Append bytes to log, rotating it when it grows past max_bytes"""
+
+        if not data:
+            return
+        with self._lock:
+            if self._size + len(data) > self.max_bytes and self._size > 0:
+                self._rotate()
+            with open(self.log_file, 'ab') as raw_file:
+                raw_file.write(data)
+            self._size += len(data)
+            lines = (self._partial + data).replace(b'\r', b'\n').split(b'\n')
+            self._partial = lines.pop()[-__chunk_size__:]
+            self._tail.extend([l.decode('utf-8', 'replace') for l in lines[-self._tail.maxlen:] if l])
+
+    def _rotate(self):
+        """Shift log files, dropping the oldest"""
+
+        for index in range(self.backups, 0, -1):
+            source = self.log_file + '.' + str(index - 1) if index > 1 else self.log_file
+            if os.path.isfile(source):
+                os.rename(source, self.log_file + '.' + str(index))
+        if os.path.isfile(self.log_file):
+            os.remove(self.log_file)
+        self._size = 0
+
+
+class Run(object):
+    """Class describing log directory for one clowder command"""
+
+    def __init__(self, root_directory, run_id, command):
+        self.root_directory = root_directory
+        self.run_id = run_id
+        self.command = command
+        self.path = os.path.join(logs_directory(root_directory), run_id)
+        self._created = False
+
+    def create(self):
+        """Create run directory with description of command, removing the oldest runs"""
+
+        if self._created:
+            return
+        _make_directories(self.path)
+        # Worker processes inherit the run, so the first process to log describes it
+        run_file = os.path.join(self.path, __run_file__)
+        if not os.path.isfile(run_file):
+            with open(run_file, 'w') as raw_file:
+                json.dump({'command': self.command, 'started': time.time()}, raw_file)
+        _exclude_from_clowder_repo(self.root_directory)
+        for run_id in run_ids(self.root_directory)[:-__kept_runs__]:
+            shutil.rmtree(os.path.join(logs_directory(self.root_directory), run_id), ignore_errors=True)
+        self._created = True
+
+    def log_file(self, repo_path):
+        """Return log file path for repo"""
+
+        relative_path = os.path.relpath(os.path.abspath(repo_path), self.root_directory)
+        if relative_path.startswith(os.pardir):
+            relative_path = os.path.basename(os.path.abspath(repo_path))
+        return os.path.join(self.path, relative_path + '.log')
+
+
+def current_run():
+    """Return run output is logged to, or None if logging wasn't started"""
+
+    return __run__
+
+
+def load_run(root_directory, run_id):
+    """Return command description saved for run, or None if it doesn't exist"""
+
+    run_file = os.path.join(logs_directory(root_directory), run_id, __run_file__)
+    if not os.path.isfile(run_file):
+        return None
+    with open(run_file) as raw_file:
+        return json.load(raw_file)
+
+
+def logs_directory(root_directory):
+    """Return directory holding log runs"""
+
+    return os.path.join(root_directory, '.clowder', __logs_dir__)
+
+
+def print_run(root_directory, run_id, project_paths=None, tail_lines=None):
+    """Print logs of projects in run, or only projects at project_paths, with only the last tail_lines if given"""
+
+    run = load_run(root_directory, run_id)
+    print(colored(run_id, attrs=['bold']) + ' ' + fmt.command(run['command']) + '\n')
+    projects = [p for p in run_log_files(root_directory, run_id) if project_paths is None or p[0] in project_paths]
+    if not projects:
+        print(' - No output was logged for these projects')
+        return
+    for project_path, log_files in projects:
+        print(fmt.path(project_path))
+        lines = collections.deque(maxlen=tail_lines)
+        for log_file in log_files:
+            with open(log_file, 'rb') as raw_file:
+                for line in raw_file:
+                    lines.append(line.decode('utf-8', 'replace').rstrip('\r\n'))
+                    if tail_lines is None:
+                        print(lines.pop())
+        for line in lines:
+            print(line)
+        print()
+
+
+def print_runs(root_directory):
+    """Print logged runs, newest first"""
+
+    ids = run_ids(root_directory)
+    if not ids:
+        print(' - No logs in ' + fmt.path(logs_directory(root_directory)))
+        return
+    width = max([len(i) for i in ids])
+    for run_id in reversed(ids):
+        run = load_run(root_directory, run_id)
+        count = len(run_log_files(root_directory, run_id))
+        print(run_id.ljust(width) + '  ' + str(count).rjust(4) + ' projects  ' + fmt.command(run['command']))
+
+
+def project_log(repo_path):
+    """Return log for repo in current run, or None if logging wasn't started"""
+
+    if __run__ is None:
+        return None
+    log_file = __run__.log_file(repo_path)
+    with __lock__:
+        log = __logs__.get(log_file)
+        if log is None:
+            __run__.create()
+            _make_directories(os.path.dirname(log_file))
+            log = __logs__[log_file] = ProjectLog(log_file)
+    return log
+
+
+def pump(stream, log):
+    """Copy output from stream to log, or discard it if log is None, until it closes, returning number of bytes"""
+
+    output_bytes = 0
+    for chunk in iter(lambda: os.read(stream.fileno(), __chunk_size__), b''):
+        output_bytes += len(chunk)
+        if log is not None:
+            log.write(chunk)
+    stream.close()
+    return output_bytes
+
+
+def run_ids(root_directory):
+    """Return ids of logged runs, oldest first"""
+
+    directory = logs_directory(root_directory)
+    if not os.path.isdir(directory):
+        return []
+    return sorted([d for d in os.listdir(directory) if os.path.isfile(os.path.join(directory, d, __run_file__))])
+
+
+def run_log_files(root_directory, run_id):
+    """Return (project path, log files oldest first) for projects logged in run"""
+
+    run_path = os.path.join(logs_directory(root_directory), run_id)
+    projects = []
+    for directory, _, files in os.walk(run_path):
+        for name in sorted(files):
+            if not name.endswith('.log'):
+                continue
+            log = ProjectLog(os.path.join(directory, name))
+            project_path = os.path.relpath(log.log_file, run_path)[:-len('.log')]
+            projects.append((project_path, log.files()))
+    return sorted(projects)
+
+
+def set_run(run):
+    """Log output to run started by another process"""
+
+    global __run__  # pylint: disable=W0603
+    if __run__ is not None and run is not None and __run__.path == run.path:
+        return
+    with __lock__:
+        __logs__.clear()
+    __run__ = run
+
+
+def start(root_directory, command):
+    """Log output of commands run without printing to .clowder/logs/<run id>, created on first use"""
+
+    global __run_count__  # pylint: disable=W0603
+    # Commands run one after another by the same process each get their own run
+    run_id = time.strftime('%Y%m%d-%H%M%S') + '-' + str(os.getpid())
+    if __run_count__:
+        run_id += '-{0:03d}'.format(__run_count__)
+    __run_count__ += 1
+    set_run(Run(root_directory, run_id, command))
+
+
+def tail(repo_path):
+    """Return (log file, last lines) written for repo in current run, or None if nothing was logged"""
+
+    if __run__ is None:
+        return None
+    log = __logs__.get(__run__.log_file(repo_path))
+    if log is None:
+        return None
+    lines = log.tail()
+    return (log.log_file, lines) if lines else None
+
+
+def _exclude_from_clowder_repo(root_directory):
+    """Add logs directory to clowder repo's info/exclude so it doesn't show as untracked"""
+
+    common_dir = RefReader(os.path.join(root_directory, '.clowder')).common_dir()
+    if common_dir is None or not os.path.isdir(common_dir):
+        return
+    exclude_file = os.path.join(common_dir, 'info', 'exclude')
+    entry = '/' + __logs_dir__ + '/'
+    contents = ''
+    if os.path.isfile(exclude_file):
+        with open(exclude_file) as raw_file:
+            contents = raw_file.read()
+        if entry in contents.splitlines():
+            return
+    _make_directories(os.path.dirname(exclude_file))
+    with open(exclude_file, 'a') as raw_file:
+        raw_file.write(('\n' if contents and not contents.endswith('\n') else '') + entry + '\n')
+
+
+def _make_directories(path):
+    """Create directory and parents, allowing another process to create them at the same time"""
+
+    try:
+        os.makedirs(path)
+    except OSError as err:
+        if err.errno != errno.EEXIST:
+            raise
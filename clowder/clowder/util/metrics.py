@@ -0,0 +1,296 @@
+"""OpenMetrics text file exporter"""
+
+from __future__ import print_function
+
+import atexit
+import multiprocessing as mp
+import os
+import time
+
+from termcolor import cprint
+
+import clowder.util.formatting as fmt
+from clowder.git.ref_reader import RefReader
+from clowder.util.file_system import directory_size
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+# Disable errors shown by pylint for catching too general exception
+# pylint: disable=W0703
+
+__duration_buckets__ = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+__metrics__ = None
+__metrics_queue__ = None
+
+
+class Metrics(object):
+    """Class collecting project results and pool usage for a command"""
+
+    def __init__(self, metrics_file, command):
+        self.metrics_file = metrics_file
+        self.command = command
+        self.start_time = time.time()
+        self.pid = os.getpid()
+        self.projects = []
+        self.pools = []
+        self.queue = mp.Queue()
+
+    def drain(self):
+        """Collect project results sent by worker processes"""
+
+        try:
+            while True:
+                self.projects.append(self.queue.get_nowait())
+        except (Empty, IOError, OSError, EOFError):
+            pass
+
+
+class ProjectMeasurement(object):
+    """Class measuring duration, fetched bytes, and ref changes of a project operation"""
+
+    def __init__(self, name, path, command):
+        self.name = name
+        self.path = path
+        self.command = command
+        self._start = None
+        self._refs = None
+        self._size = None
+
+    def __enter__(self):
+        self._refs = _ref_snapshot(self.path)
+        self._size = _objects_size(self.path)
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.time() - self._start
+        status = 'ok' if exc_type is None else 'failed'
+        fetched_bytes = max(0, _objects_size(self.path) - self._size)
+        noop = status == 'ok' and fetched_bytes == 0 and _ref_snapshot(self.path) == self._refs
+        record_project({'project': self.name, 'command': self.command, 'status': status,
+                        'duration': duration, 'bytes': fetched_bytes, 'noop': noop})
+        return False
+
+
+class NullMeasurement(object):
+    """Class standing in for ProjectMeasurement when metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+__null_measurement__ = NullMeasurement()
+
+
+def drain():
+    """Collect project results sent by worker processes so far, so their queue never fills up"""
+
+    if __metrics__ is not None:
+        __metrics__.drain()
+
+
+def enabled():
+    """Check if metrics are being collected"""
+
+    return __metrics__ is not None
+
+
+def project(project_model, command):
+    """Return context manager measuring project operation, or one that does nothing if metrics are disabled"""
+
+    if __metrics__ is None and __metrics_queue__ is None:
+        return __null_measurement__
+    return ProjectMeasurement(project_model.name, project_model.full_path(), command)
+
+
+def queue():
+    """Return queue worker processes send project results on, or None if metrics are disabled"""
+
+    return __metrics__.queue if __metrics__ is not None else None
+
+
+def record_pool(workers, wall_time, busy_time=None):
+    """Record worker count, wall time, and time spent running projects, which defaults to worker process time"""
+
+    if __metrics__ is not None:
+        __metrics__.pools.append((workers, wall_time, busy_time))
+
+
+def record_project(result):
+    """Record project result, sending it to the parent process if called from a worker"""
+
+    if __metrics__ is not None and __metrics__.pid == os.getpid():
+        __metrics__.projects.append(result)
+    elif __metrics_queue__ is not None:
+        result['worker'] = True
+        __metrics_queue__.put(result)
+
+
+def record_skipped(project_model, command):
+    """Record project skipped with --skip"""
+
+    if __metrics__ is not None:
+        record_project({'project': project_model.name, 'command': command, 'status': 'skipped',
+                        'duration': 0.0, 'bytes': 0, 'noop': False})
+
+
+def render(metrics, end_time=None):
+    """Return OpenMetrics text for collected metrics"""
+
+    end_time = time.time() if end_time is None else end_time
+    command = _label_value(metrics.command)
+    projects = [p for p in metrics.projects if p['status'] != 'skipped']
+    lines = []
+
+    _family(lines, 'clowder_command_duration_seconds', 'gauge', 'Wall time of clowder command')
+    lines.append('clowder_command_duration_seconds{command="' + command + '"} ' +
+                 _number(end_time - metrics.start_time))
+    _family(lines, 'clowder_command_timestamp_seconds', 'gauge', 'Time clowder command finished')
+    lines.append('clowder_command_timestamp_seconds{command="' + command + '"} ' + _number(end_time))
+
+    _family(lines, 'clowder_projects', 'gauge', 'Projects by result')
+    for status in ['ok', 'failed', 'skipped']:
+        count = len([p for p in metrics.projects if p['status'] == status])
+        lines.append('clowder_projects{command="' + command + '",status="' + status + '"} ' + str(count))
+    _family(lines, 'clowder_projects_noop', 'gauge', 'Projects where nothing was fetched and no refs changed')
+    lines.append('clowder_projects_noop{command="' + command + '"} ' +
+                 str(len([p for p in projects if p['noop']])))
+
+    _family(lines, 'clowder_project_duration_seconds', 'histogram', 'Duration of project operations')
+    for status in ['ok', 'failed']:
+        durations = [p['duration'] for p in projects if p['status'] == status]
+        labels = 'command="' + command + '",status="' + status + '"'
+        for bucket in __duration_buckets__:
+            lines.append('clowder_project_duration_seconds_bucket{' + labels + ',le="' + _number(bucket) + '"} ' +
+                         str(len([d for d in durations if d <= bucket])))
+        lines.append('clowder_project_duration_seconds_bucket{' + labels + ',le="+Inf"} ' + str(len(durations)))
+        lines.append('clowder_project_duration_seconds_count{' + labels + '} ' + str(len(durations)))
+        lines.append('clowder_project_duration_seconds_sum{' + labels + '} ' + _number(sum(durations)))
+
+    _family(lines, 'clowder_project_last_duration_seconds', 'gauge', 'Duration of operation for each project')
+    for result in projects:
+        lines.append('clowder_project_last_duration_seconds{' + _project_labels(command, result) + '} ' +
+                     _number(result['duration']))
+    _family(lines, 'clowder_project_fetched_bytes', 'gauge', 'Growth of object database for each project')
+    for result in projects:
+        lines.append('clowder_project_fetched_bytes{' + _project_labels(command, result) + '} ' +
+                     str(result['bytes']))
+    _family(lines, 'clowder_fetched_bytes', 'gauge', 'Growth of object databases of all projects')
+    lines.append('clowder_fetched_bytes{command="' + command + '"} ' + str(sum([p['bytes'] for p in projects])))
+
+    if metrics.pools:
+        workers = max([p[0] for p in metrics.pools])
+        capacity = sum([p[0] * p[1] for p in metrics.pools])
+        worker_time = sum([p['duration'] for p in projects if p.get('worker')])
+        busy_time = sum([worker_time if p[2] is None else p[2] for p in metrics.pools])
+        _family(lines, 'clowder_pool_workers', 'gauge', 'Parallel workers')
+        lines.append('clowder_pool_workers{command="' + command + '"} ' + str(workers))
+        _family(lines, 'clowder_pool_utilization_ratio', 'gauge', 'Fraction of worker time spent running projects')
+        lines.append('clowder_pool_utilization_ratio{command="' + command + '"} ' +
+                     _number(min(1.0, busy_time / capacity) if capacity else 0.0))
+
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def set_metrics_queue(metrics_queue):
+    """Set queue used by worker processes to send project results"""
+
+    global __metrics_queue__  # pylint: disable=W0603
+    __metrics_queue__ = metrics_queue
+
+
+def start(metrics_file, command):
+    """Collect metrics for command, writing them to metrics_file when clowder exits"""
+
+    global __metrics__  # pylint: disable=W0603
+    __metrics__ = Metrics(os.path.abspath(metrics_file), command)
+    atexit.register(_write_at_exit)
+
+
+def write(metrics):
+    """Write metrics file atomically so collectors never read a partial file"""
+
+    metrics.drain()
+    temp_file = metrics.metrics_file + '.' + str(os.getpid())
+    with open(temp_file, 'w') as raw_file:
+        raw_file.write(render(metrics))
+    os.rename(temp_file, metrics.metrics_file)
+
+
+def _family(lines, name, metric_type, description):
+    """Append metric family metadata"""
+
+    lines.append('# TYPE ' + name + ' ' + metric_type)
+    lines.append('# HELP ' + name + ' ' + description)
+
+
+def _label_value(value):
+    """Return escaped label value"""
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    """Return number formatted for OpenMetrics"""
+
+    return repr(float(value))
+
+
+def _objects_size(path):
+    """Return size of project object database, or 0 if it doesn't exist"""
+
+    common_dir = RefReader(path).common_dir()
+    if common_dir is None:
+        return 0
+    return directory_size(os.path.join(common_dir, 'objects'))
+
+
+def _project_labels(command, result):
+    """Return labels for project result"""
+
+    return 'command="' + command + '",project="' + _label_value(result['project']) + \
+        '",status="' + result['status'] + '"'
+
+
+def _ref_snapshot(path):
+    """Return HEAD and the contents of loose and packed refs"""
+
+    refs = RefReader(path)
+    common_dir = refs.common_dir()
+    if common_dir is None:
+        return None
+
+    snapshot = [refs.symbolic_ref('HEAD'), refs.sha()]
+    try:
+        with open(os.path.join(common_dir, 'packed-refs')) as raw_file:
+            snapshot.append(raw_file.read())
+    except IOError:
+        snapshot.append(None)
+    for root, dirs, files in os.walk(os.path.join(common_dir, 'refs')):
+        dirs.sort()
+        for name in sorted(files):
+            try:
+                with open(os.path.join(root, name)) as raw_file:
+                    snapshot.append((os.path.join(root, name), raw_file.read()))
+            except IOError:
+                pass
+    return snapshot
+
+
+def _write_at_exit():
+    """Write metrics file from the process that started collecting"""
+
+    if __metrics__ is None or __metrics__.pid != os.getpid():
+        return
+    try:
+        write(__metrics__)
+    except Exception as err:
+        cprint(' - Failed to write metrics file ' + __metrics__.metrics_file, 'red')
+        print(fmt.error(err))
@@ -0,0 +1,134 @@
+"""Profiling and phase timers"""
+
+from __future__ import print_function
+
+import atexit
+import cProfile
+import os
+import pstats
+import time
+from collections import OrderedDict
+
+from termcolor import cprint
+
+import clowder.util.formatting as fmt
+
+__phases__ = None
+__profiler__ = None
+
+
+class Phase(object):
+    """Class timing a named phase, adding its duration to the phase breakdown"""
+
+    def __init__(self, name):
+        self.name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record_phase(self.name, time.time() - self._start)
+        return False
+
+
+class NullPhase(object):
+    """Class standing in for Phase when profiling is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+__null_phase__ = NullPhase()
+
+
+def enabled():
+    """Check if profiling is enabled"""
+
+    return __phases__ is not None
+
+
+def phase(name):
+    """Return context manager timing named phase, or one that does nothing if profiling is disabled"""
+
+    if __phases__ is None:
+        return __null_phase__
+    return Phase(name)
+
+
+def phase_breakdown():
+    """Return list of (name, total seconds, count, max seconds) for recorded phases in order first started"""
+
+    if __phases__ is None:
+        return []
+    return [(name, total, count, longest) for name, (total, count, longest) in __phases__.items()]
+
+
+def record_phase(name, duration):
+    """Add duration to named phase"""
+
+    if __phases__ is None:
+        return
+    total, count, longest = __phases__.get(name, (0.0, 0, 0.0))
+    __phases__[name] = (total + duration, count + 1, max(longest, duration))
+
+
+def start(output_file, memory=False):
+    """Start cProfile, and tracemalloc if memory is set, writing a report to output_file at exit"""
+
+    global __phases__, __profiler__  # pylint: disable=W0603
+    if __phases__ is not None:
+        return
+
+    __phases__ = OrderedDict()
+    start_time = time.time()
+    if memory:
+        try:
+            import tracemalloc
+            tracemalloc.start(25)
+        except ImportError:
+            cprint(' - Memory profiling requires python 3', 'yellow')
+            memory = False
+    __profiler__ = cProfile.Profile()
+    __profiler__.enable()
+    atexit.register(_report, os.path.abspath(output_file), memory, start_time, os.getpid())
+
+
+def _report(output_file, memory, start_time, pid):
+    """Stop profiling, write report, and print phase breakdown"""
+
+    if os.getpid() != pid:
+        return
+
+    __profiler__.disable()
+    duration = time.time() - start_time
+    phases = phase_breakdown()
+
+    with open(output_file, 'w') as raw_file:
+        raw_file.write('clowder profile\n\n')
+        raw_file.write(fmt.profile_phases(phases, duration, color=False) + '\n\n')
+        stats = pstats.Stats(__profiler__, stream=raw_file)
+        stats.sort_stats('cumulative').print_stats(50)
+        stats.sort_stats('tottime').print_stats(25)
+        if memory:
+            _write_memory_report(raw_file)
+
+    print(fmt.profile_phases(phases, duration))
+    print(' - Profile written to ' + fmt.path(output_file))
+
+
+def _write_memory_report(raw_file):
+    """Write peak traced memory and top allocation sites"""
+
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    raw_file.write('Memory: ' + fmt.size(current) + ' allocated at exit, ' + fmt.size(peak) + ' peak\n\n')
+    for stat in snapshot.statistics('lineno')[:25]:
+        raw_file.write(str(stat) + '\n')
@@ -1,38 +1,306 @@
 """Progress bar"""
 
+from __future__ import print_function
+
+import multiprocessing as mp
+import os
+import re
+import sys
+import threading
+import time
+
 from tqdm import tqdm
 
+import clowder.util.formatting as fmt
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+__git_progress_regex__ = re.compile(r'^(?:remote: )?([A-Za-z ]+?):\s+(\d+)% \((\d+)/(\d+)\)'
+                                    r'(?:, ([\d.]+) (bytes|[KMG]iB)(?: \| ([\d.]+) (bytes|[KMG]iB)/s)?)?')
+__git_count_regex__ = re.compile(r'^(?:remote: )?([A-Za-z ]+?):\s+(\d+)(?:, done)?\.?$')
+__git_progress_phases__ = {'Enumerating objects': 'negotiate',
+                           'Counting objects': 'negotiate',
+                           'Compressing objects': 'negotiate',
+                           'Finding sources': 'negotiate',
+                           'Receiving objects': 'receive',
+                           'Unpacking objects': 'receive',
+                           'Resolving deltas': 'resolve',
+                           'Checking connectivity': 'resolve',
+                           'Checking out files': 'checkout',
+                           'Updating files': 'checkout'}
+__git_size_units__ = {'bytes': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3}
+__progress_queue__ = None
+
+
+class ProjectTransfer(object):
+    """Class holding latest transfer progress reported for a project"""
+
+    def __init__(self, path):
+        self.path = path
+        self.phase = 'negotiate'
+        self.percent = None
+        self.objects = None
+        self.total_objects = None
+        self.bytes = 0
+        self.rate = None
+
+    def update(self, event):
+        """Update from (phase, percent, objects, total objects, bytes, rate) event"""
+
+        phase, percent, objects, total_objects, num_bytes, rate = event
+        self.phase = phase
+        self.percent = percent
+        self.objects = objects
+        self.total_objects = total_objects
+        if num_bytes is not None:
+            self.bytes = num_bytes
+        if rate is not None or phase != 'receive':
+            self.rate = rate
+
 
 class Progress(object):
-    """Class wrapping progress bar"""
+    """Class wrapping progress bar and live transfer status of running projects"""
 
-    def __init__(self):
-        self._bar = None
+    def __init__(self, stream=None):
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._queue = None
+        self._count = 0
+        self._completed = 0
+        self._start_time = None
+        self._active = {}
+        self._finished_bytes = 0
+        self._lines = 0
+        self._last_print = 0
+        self._running = False
 
     def close(self):
         """Close progress bar"""
 
-        if self._bar:
-            self._bar.close()
+        if self._running:
+            self._render(final=True)
+            self._running = False
 
     def complete(self):
         """Complete progress bar"""
 
-        if self._bar:
-            if self._bar.n < self._bar.total:
-                self._bar.n = self._bar.total
+        if self._running:
+            with self._lock:
+                self._completed = self._count
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds for transfer progress from workers, then redraw"""
+
+        events = []
+        if self._queue is None:
+            time.sleep(timeout)
+        else:
+            try:
+                events.append(self._queue.get(True, timeout))
+                while True:
+                    events.append(self._queue.get_nowait())
+            except Empty:
+                pass
+        for path, event in events:
+            self._apply(path, event)
+
+        if self._running:
+            self._render()
+
+    def queue(self):
+        """Return queue worker processes report transfer progress on, creating it on first use"""
+
+        if self._queue is None:
+            self._queue = mp.Queue()
+        return self._queue
 
     def start(self, count):
         """Start progress bar"""
 
-        if self._bar:
-            self._bar.close()
+        if self._running:
+            self.close()
 
-        bar_format = '{desc}: {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} projects'
-        self._bar = tqdm(total=count, unit='projects', bar_format=bar_format)
+        with self._lock:
+            self._count = count
+            self._completed = 0
+            self._start_time = time.time()
+            self._active = {}
+            self._finished_bytes = 0
+            self._lines = 0
+            self._last_print = 0
+            self._running = True
+        self._render()
 
     def update(self):
         """Update progress bar"""
 
-        if self._bar:
-            self._bar.update()
+        if self._running:
+            with self._lock:
+                self._completed += 1
+
+    def _apply(self, path, event):
+        """Apply progress event from worker"""
+
+        with self._lock:
+            if event is None:
+                transfer = self._active.pop(path, None)
+                if transfer is not None:
+                    self._finished_bytes += transfer.bytes
+                return
+            self._active.setdefault(path, ProjectTransfer(path)).update(event)
+
+    def _is_tty(self):
+        """Check if progress is written to a terminal"""
+
+        stream = self._output()
+        return hasattr(stream, 'isatty') and stream.isatty()
+
+    def _output(self):
+        """Return stream progress is written to"""
+
+        return self._stream if self._stream is not None else sys.stderr
+
+    def _render(self, final=False):
+        """Redraw multi-line status on a terminal, or print a single status line every few seconds otherwise"""
+
+        with self._lock:
+            elapsed = time.time() - self._start_time
+            completed = self._completed
+            transfers = sorted(self._active.values(), key=lambda t: t.path)
+            total_bytes = self._finished_bytes + sum([t.bytes for t in transfers])
+
+        stream = self._output()
+        if not self._is_tty():
+            now = time.time()
+            if not final and now - self._last_print < 10:
+                return
+            self._last_print = now
+            stream.write(fmt.progress_line(completed, self._count, elapsed, total_bytes, transfers) + '\n')
+            stream.flush()
+            return
+
+        lines = [format_meter(completed, self._count, elapsed) + '  ' + fmt.size(total_bytes)]
+        if not final:
+            lines += self._transfer_lines(transfers)
+        width = _terminal_width() - 1
+        output = ''
+        if self._lines > 1:
+            output += '\x1b[' + str(self._lines - 1) + 'A'
+        output += '\r' + '\n'.join(['\x1b[K' + fmt.truncate(line, width) for line in lines])
+        if self._lines > len(lines):
+            output += '\x1b[J'
+        if final:
+            output += '\n'
+        self._lines = len(lines)
+        stream.write(output)
+        stream.flush()
+
+    @staticmethod
+    def _transfer_lines(transfers):
+        """Return status lines for active transfers that fit in the terminal"""
+
+        if not transfers:
+            return []
+        max_lines = max(1, _terminal_height() - 2)
+        path_width = max([len(_display_path(t.path)) for t in transfers])
+        shown = transfers if len(transfers) <= max_lines else transfers[:max_lines - 1]
+        lines = [fmt.progress_transfer(_display_path(t.path), path_width, t) for t in shown]
+        if len(shown) < len(transfers):
+            lines.append(fmt.progress_more(len(transfers) - len(shown)))
+        return lines
+
+
+def parse_git_progress(line):
+    """Return (phase, percent, objects, total objects, bytes, rate) from git progress line, or None"""
+
+    line = line.strip()
+    match = __git_progress_regex__.match(line)
+    if match is not None:
+        phase = __git_progress_phases__.get(match.group(1))
+        if phase is None:
+            return None
+        num_bytes = _parse_size(match.group(5), match.group(6))
+        rate = _parse_size(match.group(7), match.group(8))
+        return (phase, int(match.group(2)), int(match.group(3)), int(match.group(4)), num_bytes, rate)
+
+    match = __git_count_regex__.match(line)
+    if match is not None:
+        phase = __git_progress_phases__.get(match.group(1))
+        if phase is None:
+            return None
+        return (phase, None, int(match.group(2)), None, None, None)
+    return None
+
+
+def progress_reporter(path):
+    """Return callback sending parsed git progress lines for path to parent process, or None if not in a worker"""
+
+    queue = __progress_queue__
+    if queue is None:
+        return None
+
+    last_event = [None]
+
+    def report(line):
+        """Send progress line to parent if it changed the reported state"""
+
+        if line is None:
+            queue.put((path, None))
+            return
+        event = parse_git_progress(line)
+        if event is None or event == last_event[0]:
+            return
+        last_event[0] = event
+        queue.put((path, event))
+
+    return report
+
+
+def set_progress_queue(queue):
+    """Set queue used by worker processes to report transfer progress"""
+
+    global __progress_queue__  # pylint: disable=W0603
+    __progress_queue__ = queue
+
+
+def format_meter(completed, count, elapsed):
+    """Return project count bar with elapsed time and estimated time remaining"""
+
+    bar_format = '{percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} projects [{elapsed}<{remaining}]'
+    return tqdm.format_meter(completed, max(count, 1), elapsed, ncols=72, bar_format=bar_format)
+
+
+def _display_path(path):
+    """Return path relative to current directory if it's inside it"""
+
+    relative_path = os.path.relpath(path)
+    return path if relative_path.startswith('..') else relative_path
+
+
+def _parse_size(value, unit):
+    """Return number of bytes for git size and unit, or None if not given"""
+
+    if value is None:
+        return None
+    return int(float(value) * __git_size_units__[unit])
+
+
+def _terminal_height():
+    """Return terminal height"""
+
+    try:
+        return os.get_terminal_size(sys.stderr.fileno()).lines or 24
+    except (AttributeError, OSError, ValueError):
+        return 24
+
+
+def _terminal_width():
+    """Return terminal width"""
+
+    try:
+        return os.get_terminal_size(sys.stderr.fileno()).columns or 80
+    except (AttributeError, OSError, ValueError):
+        return 80
@@ -0,0 +1,103 @@
+"""SSH connection multiplexing"""
+
+from __future__ import print_function
+
+import atexit
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+
+from termcolor import colored
+
+import clowder.util.formatting as fmt
+
+
+# Disable errors shown by pylint for catching too general exception
+# pylint: disable=W0703
+
+
+class SSHMultiplexer(object):
+    """Class managing one shared ssh ControlMaster connection per source host"""
+
+    def __init__(self):
+        self.hosts = []
+        self._pid = os.getpid()
+        self._control_dir = None
+        self._previous_ssh_command = None
+        self._previous_sigterm_handler = None
+
+    def start(self, sources):
+        """Start master connections for ssh sources and point git at them"""
+
+        hosts = sorted(set([s.ssh_host() for s in sources if s.ssh_host() is not None]))
+        if not hosts:
+            return
+
+        self._pid = os.getpid()
+        # Keep the directory short, unix socket paths are limited to around 100 characters
+        self._control_dir = tempfile.mkdtemp(prefix='clowder-ssh-')
+        atexit.register(self.stop)
+        self._previous_sigterm_handler = signal.signal(signal.SIGTERM, self._signal_handler)
+
+        for host in hosts:
+            print(' - Open shared ssh connection to ' + fmt.remote_string(host))
+            command = ['ssh', '-M', '-N', '-f'] + self._control_options() + ['-o', 'ControlPersist=yes', host]
+            try:
+                return_code = subprocess.call(command)
+            except (OSError, subprocess.CalledProcessError):
+                return_code = 1
+            if return_code != 0:
+                print(colored(' - Failed to open shared ssh connection to ', 'red') + fmt.remote_string(host))
+                continue
+            self.hosts.append(host)
+
+        self._previous_ssh_command = os.environ.get('GIT_SSH_COMMAND')
+        os.environ['GIT_SSH_COMMAND'] = ' '.join(['ssh'] + self._control_options(master='no'))
+
+    def stop(self):
+        """Close master connections and remove control sockets"""
+
+        if self._control_dir is None or os.getpid() != self._pid:
+            return
+
+        for host in self.hosts:
+            command = ['ssh'] + self._control_options() + ['-O', 'exit', host]
+            try:
+                with open(os.devnull, 'w') as devnull:
+                    subprocess.call(command, stdout=devnull, stderr=devnull)
+            except Exception as err:
+                del err
+        self.hosts = []
+
+        if self._previous_ssh_command is None:
+            os.environ.pop('GIT_SSH_COMMAND', None)
+        else:
+            os.environ['GIT_SSH_COMMAND'] = self._previous_ssh_command
+
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+        self._control_dir = None
+
+    def _control_options(self, master=None):
+        """Return ssh options for shared control socket"""
+
+        options = ['-o', 'ControlPath=' + os.path.join(self._control_dir, '%C')]
+        if master is not None:
+            options += ['-o', 'ControlMaster=' + master]
+        return options
+
+    def _signal_handler(self, signal_num, frame):
+        """Close connections when terminated by a signal"""
+
+        del frame
+        if os.getpid() != self._pid:
+            # Forked pool workers inherit the handler, but don't own the connections
+            signal.signal(signal_num, signal.SIG_DFL)
+            os.kill(os.getpid(), signal_num)
+            return
+        self.stop()
+        if callable(self._previous_sigterm_handler):
+            self._previous_sigterm_handler(signal_num, None)
+        sys.exit(1)
@@ -1,23 +1,60 @@
 """Configure clowder subparsers"""
 
+import argparse
+
 
 def configure_argparse(parser, clowder, versions):
     """Configure clowder argparse"""
 
+    _configure_global_options(parser)
     subparsers = parser.add_subparsers(dest='clowder_command', metavar='SUBCOMMAND')
     _configure_subparsers(subparsers, clowder, versions)
 
 
+def parse_global_options(args):
+    """Parse options shared by all commands, ignoring command arguments"""
+
+    parser = argparse.ArgumentParser(add_help=False)
+    _configure_global_options(parser)
+    return parser.parse_known_args(args)[0]
+
+
+def _configure_global_options(parser):
+    """Configure clowder options shared by all commands"""
+
+    ssh_multiplex_help = 'share one ssh connection per ssh source host for the duration of the command'
+    parser.add_argument('--ssh-multiplex', action='store_true', help=ssh_multiplex_help)
+    trace_help = 'record every git and subprocess command to PATH as JSON Lines, also enabled by CLOWDER_TRACE=PATH'
+    parser.add_argument('--trace', metavar='PATH', help=trace_help)
+    trace_format_help = 'also write trace in Chrome trace event format to PATH.chrome.json when the command finishes'
+    parser.add_argument('--trace-format', choices=['jsonl', 'chrome'], default='jsonl', help=trace_format_help)
+    profile_help = 'profile clowder with cProfile, print a breakdown of time spent in each phase, and write a report'
+    parser.add_argument('--profile', action='store_true', help=profile_help)
+    profile_output_help = 'file to write profile report to (default: clowder-profile.txt)'
+    parser.add_argument('--profile-output', metavar='PATH', default='clowder-profile.txt', help=profile_output_help)
+    profile_memory_help = 'also trace memory allocations with tracemalloc (python 3 only)'
+    parser.add_argument('--profile-memory', action='store_true', help=profile_memory_help)
+    metrics_file_help = 'write OpenMetrics text with project durations and results to PATH when the command finishes'
+    parser.add_argument('--metrics-file', metavar='PATH', help=metrics_file_help)
+    git_backend_help = 'backend for reading refs, status, and commit counts, also set by CLOWDER_GIT_BACKEND=NAME'
+    parser.add_argument('--git-backend', choices=['git', 'pygit2'], default=None, help=git_backend_help)
+
+
 def _configure_subparsers(subparsers, clowder, versions):
     """Configure clowder command subparsers"""
 
+    _configure_subparser_batch(subparsers)
     _configure_subparser_branch(subparsers, clowder)
     _configure_subparser_clean(subparsers, clowder)
+    _configure_subparser_daemon(subparsers)
     _configure_subparser_diff(subparsers, clowder)
     _configure_subparser_forall(subparsers, clowder)
     _configure_subparser_herd(subparsers, clowder)
     _configure_subparser_init(subparsers)
     _configure_subparser_link(subparsers, versions)
+    _configure_subparser_logs(subparsers, clowder)
+    _configure_subparser_maintenance(subparsers, clowder)
+    _configure_subparser_prefetch(subparsers, clowder)
     _configure_subparser_prune(subparsers, clowder)
     _configure_subparser_repo(subparsers)
     _configure_subparser_reset(subparsers, clowder)
@@ -27,9 +64,20 @@ def _configure_subparsers(subparsers, clowder, versions):
     _configure_subparser_status(subparsers)
     _configure_subparser_sync(subparsers, clowder)
     _configure_subparser_version(subparsers)
+    _configure_subparser_worktree(subparsers, versions)
     _configure_subparser_yaml(subparsers)
 
 
+def _configure_subparser_batch(subparsers):
+    """Configure clowder batch subparser and arguments"""
+
+    batch_help = 'Run commands from a file, one per line, loading clowder.yaml once'
+    parser_batch = subparsers.add_parser('batch', help=batch_help)
+    parser_batch.add_argument('file', metavar='FILE', help="file of clowder commands, or '-' to read stdin")
+    parser_batch.add_argument('--keep-going', '-k', action='store_true',
+                              help='run remaining commands after a command fails')
+
+
 def _configure_subparser_branch(subparsers, clowder):
     """Configure clowder branch subparser and arguments"""
 
@@ -96,6 +144,27 @@ def _configure_subparser_clean(subparsers, clowder):
                              help=clean_help_projects)
 
 
+def _configure_subparser_daemon(subparsers):
+    """Configure clowder daemon subparser and arguments"""
+
+    # clowder daemon
+    daemon_help = 'Manage background daemon serving status and diff for this workspace'
+    parser_daemon = subparsers.add_parser('daemon', help=daemon_help)
+    daemon_subparsers = parser_daemon.add_subparsers(dest='daemon_command', metavar='SUBCOMMAND')
+    daemon_subparsers.required = True
+
+    # clowder daemon start
+    parser_daemon_start = daemon_subparsers.add_parser('start', help='Start daemon for this workspace')
+    parser_daemon_start.add_argument('--foreground', '-f', action='store_true',
+                                     help='run daemon in the foreground instead of detaching')
+
+    # clowder daemon status
+    daemon_subparsers.add_parser('status', help='Print whether daemon is running and what it watches')
+
+    # clowder daemon stop
+    daemon_subparsers.add_parser('stop', help='Stop daemon for this workspace')
+
+
 def _configure_subparser_diff(subparsers, clowder):
     """Configure clowder diff subparser and arguments"""
 
@@ -129,13 +198,24 @@ def _configure_subparser_forall(subparsers, clowder):
 
     parser_forall.add_argument('--parallel', action='store_true', help='run commands in parallel')
 
+    parser_forall.add_argument('--jobs', '-j', type=int, metavar='N',
+                               help='number of commands to run at the same time')
+
+    parser_forall.add_argument('--output', '-o', choices=['prefix', 'group', 'json'],
+                               help='prefix output lines with project path, group output by project, '
+                                    'or print json results')
+
     parser_forall.add_argument('--ignore-errors', '-i', action='store_true', help='ignore errors in command or script')
 
-    group_forall_command = parser_forall.add_mutually_exclusive_group()
+    group_forall_command = parser_forall.add_mutually_exclusive_group(required=True)
 
     group_forall_command.add_argument('--command', '-c', nargs=1, metavar='COMMAND',
                                       help='command or script to run in project directories')
 
+    group_forall_command.add_argument('--python', nargs=1, metavar='MODULE:FUNCTION',
+                                      help='python function to call with project context instead of running a '
+                                           'command')
+
     group_forall_targets = parser_forall.add_mutually_exclusive_group()
 
     forall_help_groups = _options_help_message(group_names, 'groups to run command or script for')
@@ -203,6 +283,92 @@ def _configure_subparser_link(subparsers, versions):
                              help=link_help_version)
 
 
+def _configure_subparser_logs(subparsers, clowder):
+    """Configure clowder logs subparser and arguments"""
+
+    project_names = _project_names(clowder)
+    parser_logs = subparsers.add_parser('logs', help='Print output logged by projects in parallel commands')
+    parser_logs.add_argument('--list', '-l', action='store_true', help='list logged commands, newest first')
+    parser_logs.add_argument('--run', '-r', metavar='RUN', help='run id of command to print logs for (default: last)')
+    parser_logs.add_argument('--tail', '-t', type=int, metavar='N', help='print only the last N lines of each log')
+    logs_help_projects = _options_help_message(project_names, 'projects to print logs for')
+    parser_logs.add_argument('--projects', '-p', choices=project_names, nargs='+', metavar='PROJECT',
+                             help=logs_help_projects)
+
+
+def _configure_subparser_maintenance(subparsers, clowder):
+    """Configure clowder maintenance subparser and arguments"""
+
+    # clowder maintenance
+    parser_maintenance = subparsers.add_parser('maintenance', help='Run incremental git maintenance for projects')
+    maintenance_subparsers = parser_maintenance.add_subparsers(dest='maintenance_command', metavar='SUBCOMMAND')
+    maintenance_subparsers.required = True
+
+    # clowder maintenance run
+    maintenance_run_help = 'Write commit-graph and multi-pack-index, repack incrementally, and prune loose objects'
+    parser_maintenance_run = maintenance_subparsers.add_parser('run', help=maintenance_run_help)
+    parser_maintenance_run.add_argument('--jobs', '-j', type=int, metavar='N',
+                                        help='number of projects to maintain at the same time')
+    _configure_maintenance_targets(parser_maintenance_run, clowder)
+
+    # clowder maintenance schedule
+    maintenance_schedule_help = "Register projects for git's hourly background maintenance"
+    parser_maintenance_schedule = maintenance_subparsers.add_parser('schedule', help=maintenance_schedule_help)
+    _configure_maintenance_targets(parser_maintenance_schedule, clowder)
+
+    # clowder maintenance unschedule
+    maintenance_unschedule_help = "Unregister projects from git's background maintenance"
+    parser_maintenance_unschedule = maintenance_subparsers.add_parser('unschedule', help=maintenance_unschedule_help)
+    _configure_maintenance_targets(parser_maintenance_unschedule, clowder)
+
+
+def _configure_maintenance_targets(parser, clowder):
+    """Configure maintenance project selection arguments"""
+
+    group_names = _group_names(clowder)
+    project_names = _project_names(clowder)
+
+    maintenance_help_skip = _options_help_message(project_names, 'projects to skip')
+    parser.add_argument('--skip', '-s', choices=project_names, nargs='+', metavar='PROJECT', default=[],
+                        help=maintenance_help_skip)
+
+    group_maintenance = parser.add_mutually_exclusive_group()
+
+    maintenance_help_groups = _options_help_message(group_names, 'groups to maintain')
+    group_maintenance.add_argument('--groups', '-g', choices=group_names, default=group_names, nargs='+',
+                                   metavar='GROUP', help=maintenance_help_groups)
+
+    maintenance_help_projects = _options_help_message(project_names, 'projects to maintain')
+    group_maintenance.add_argument('--projects', '-p', choices=project_names, nargs='+', metavar='PROJECT',
+                                   help=maintenance_help_projects)
+
+
+def _configure_subparser_prefetch(subparsers, clowder):
+    """Configure clowder prefetch subparser and arguments"""
+
+    prefetch_help = 'Fetch project remotes into refs/prefetch in the background so later herds only fetch the delta'
+    parser_prefetch = subparsers.add_parser('prefetch', help=prefetch_help)
+    parser_prefetch.add_argument('--jobs', '-j', type=int, metavar='N',
+                                 help='number of projects to prefetch at the same time')
+
+    group_names = _group_names(clowder)
+    project_names = _project_names(clowder)
+
+    prefetch_help_skip = _options_help_message(project_names, 'projects to skip')
+    parser_prefetch.add_argument('--skip', '-s', choices=project_names, nargs='+', metavar='PROJECT', default=[],
+                                 help=prefetch_help_skip)
+
+    group_prefetch = parser_prefetch.add_mutually_exclusive_group()
+
+    prefetch_help_groups = _options_help_message(group_names, 'groups to prefetch')
+    group_prefetch.add_argument('--groups', '-g', choices=group_names, default=group_names, nargs='+',
+                                metavar='GROUP', help=prefetch_help_groups)
+
+    prefetch_help_projects = _options_help_message(project_names, 'projects to prefetch')
+    group_prefetch.add_argument('--projects', '-p', choices=project_names, nargs='+', metavar='PROJECT',
+                                help=prefetch_help_projects)
+
+
 def _configure_subparser_prune(subparsers, clowder):
     """Configure clowder prune subparser and arguments"""
 
@@ -217,7 +383,8 @@ def _configure_subparser_prune(subparsers, clowder):
     parser_prune.add_argument('--force', '-f', action='store_true',
                               help='force prune branches')
 
-    parser_prune.add_argument('branch', help='name of branch to remove', metavar='BRANCH')
+    parser_prune.add_argument('branches', nargs='+', metavar='BRANCH',
+                              help='names or glob patterns of branches to remove')
 
     group_prune_options = parser_prune.add_mutually_exclusive_group()
 
@@ -394,6 +561,29 @@ def _configure_subparser_version(subparsers):
     subparsers.add_parser('version', help='Print clowder version')
 
 
+def _configure_subparser_worktree(subparsers, versions):
+    """Configure clowder worktree subparser and arguments"""
+
+    # clowder worktree
+    parser_worktree = subparsers.add_parser('worktree', help='Manage workspaces sharing git objects with this one')
+    worktree_subparsers = parser_worktree.add_subparsers(dest='worktree_command', metavar='SUBCOMMAND')
+    worktree_subparsers.required = True
+
+    # clowder worktree add
+    worktree_add_help = 'Add sibling workspace with each project checked out as a git worktree of this one'
+    parser_worktree_add = worktree_subparsers.add_parser('add', help=worktree_add_help)
+    parser_worktree_add.add_argument('name', metavar='NAME',
+                                     help='directory of new workspace, relative to the parent of this one')
+
+    group_worktree_add = parser_worktree_add.add_mutually_exclusive_group()
+
+    worktree_help_version = _options_help_message(versions, 'version to symlink in new workspace')
+    group_worktree_add.add_argument('--version', '-v', choices=versions, nargs=1, default=None, metavar='VERSION',
+                                    help=worktree_help_version)
+    group_worktree_add.add_argument('--branch', '-b', nargs=1, default=None, metavar='BRANCH',
+                                    help='branch to check out in every project, created if it does not exist')
+
+
 def _configure_subparser_yaml(subparsers):
     """Configure clowder yaml subparser and arguments"""
 
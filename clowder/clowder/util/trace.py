@@ -0,0 +1,179 @@
+"""Subprocess tracing"""
+
+import atexit
+import json
+import os
+import shlex
+import threading
+import time
+
+from git import GitCommandError
+from git.cmd import Git
+
+# Disable errors shown by pylint for catching too general exception
+# pylint: disable=W0703
+
+__trace_env__ = 'CLOWDER_TRACE'
+__gitpython_execute__ = Git.execute
+
+
+def chrome_file(trace_file):
+    """Return file Chrome trace event format export of trace file is written to"""
+
+    return trace_file + '.chrome.json'
+
+
+def export_chrome(trace_file, output_file):
+    """Convert JSON Lines trace to Chrome trace event format"""
+
+    records = load_trace(trace_file)
+    events = []
+    main_pid = records[0]['pid'] if records else None
+    for pid in sorted(set([r['pid'] for r in records])):
+        name = 'clowder' if pid == main_pid else 'clowder worker ' + str(pid)
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': name}})
+    for entry in records:
+        events.append({'name': _event_name(entry['argv']),
+                       'cat': entry['type'],
+                       'ph': 'X',
+                       'ts': int(entry['start'] * 1000000),
+                       'dur': int(entry['duration'] * 1000000),
+                       'pid': entry['pid'],
+                       'tid': entry['thread'],
+                       'args': {'argv': entry['argv'],
+                                'cwd': entry['cwd'],
+                                'exit_code': entry['exit_code'],
+                                'output_bytes': entry['output_bytes']}})
+
+    temp_file = output_file + '.' + str(os.getpid())
+    with open(temp_file, 'w') as raw_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, raw_file)
+    os.rename(temp_file, output_file)
+
+
+def export_chrome_at_exit():
+    """Write trace in Chrome trace event format next to the trace file when clowder exits, if tracing is enabled"""
+
+    path = os.environ.get(__trace_env__)
+    if not path:
+        return False
+
+    pid = os.getpid()
+
+    def export():
+        """Export trace if this is the process that registered the export"""
+
+        if os.getpid() == pid and os.path.isfile(path):
+            export_chrome(path, chrome_file(path))
+
+    atexit.register(export)
+    return True
+
+
+def load_trace(trace_file):
+    """Return trace records sorted by start time"""
+
+    records = []
+    with open(trace_file) as raw_file:
+        for line in raw_file:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return sorted(records, key=lambda r: r['start'])
+
+
+def record(record_type, command, cwd, start_time, end_time, exit_code, output_bytes):
+    """Append command record to trace file if tracing is enabled"""
+
+    path = os.environ.get(__trace_env__)
+    if not path:
+        return
+
+    line = json.dumps({'type': record_type,
+                       'argv': _argv(command),
+                       'cwd': cwd,
+                       'start': start_time,
+                       'end': end_time,
+                       'duration': end_time - start_time,
+                       'exit_code': exit_code,
+                       'output_bytes': output_bytes,
+                       'pid': os.getpid(),
+                       'thread': threading.current_thread().ident}, sort_keys=True) + '\n'
+    try:
+        # A single write to a file opened for appending keeps lines from workers whole
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def start(trace_file, append=True):
+    """Enable tracing to file for this process and the processes it starts"""
+
+    path = os.path.abspath(trace_file)
+    if not append and os.path.isfile(path):
+        os.remove(path)
+    os.environ[__trace_env__] = path
+    Git.execute = _traced_gitpython_execute
+
+
+def start_from_environment():
+    """Enable tracing if CLOWDER_TRACE is set, appending to existing trace"""
+
+    path = os.environ.get(__trace_env__)
+    if path:
+        start(path)
+
+
+def _argv(command):
+    """Return argument list for command given as argument list or shell string"""
+
+    if isinstance(command, (list, tuple)):
+        return [str(c) for c in command]
+    try:
+        return shlex.split(command)
+    except ValueError:
+        return [command]
+
+
+def _event_name(argv):
+    """Return short name for trace event"""
+
+    if len(argv) > 1 and os.path.basename(argv[0]) == 'git':
+        return 'git ' + argv[1]
+    return ' '.join(argv[:2])
+
+
+def _output_size(output):
+    """Return size of GitPython command output, or None if it wasn't captured"""
+
+    if isinstance(output, tuple):
+        return sum([len(o) for o in output[1:] if o is not None])
+    if hasattr(output, '__len__'):
+        return len(output)
+    return None
+
+
+def _traced_gitpython_execute(self, command, *args, **kwargs):
+    """Run GitPython command, recording it in the trace file"""
+
+    start_time = time.time()
+    exit_code = 0
+    output = None
+    try:
+        output = __gitpython_execute__(self, command, *args, **kwargs)
+        if isinstance(output, tuple) and isinstance(output[0], int):
+            exit_code = output[0]
+        return output
+    except GitCommandError as err:
+        exit_code = err.status
+        raise
+    except Exception:
+        exit_code = None
+        raise
+    finally:
+        cwd = getattr(self, '_working_dir', None) or os.getcwd()
+        record('gitpython', command, cwd, start_time, time.time(), exit_code, _output_size(output))
@@ -0,0 +1,171 @@
+"""File system change notification with inotify"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+
+__in_modify__ = 0x00000002
+__in_attrib__ = 0x00000004
+__in_moved_from__ = 0x00000040
+__in_moved_to__ = 0x00000080
+__in_create__ = 0x00000100
+__in_delete__ = 0x00000200
+__in_delete_self__ = 0x00000400
+__in_move_self__ = 0x00000800
+__in_q_overflow__ = 0x00004000
+__in_ignored__ = 0x00008000
+__in_onlydir__ = 0x01000000
+__in_isdir__ = 0x40000000
+__in_nonblock__ = 0o4000
+__in_cloexec__ = 0o2000000
+
+__watch_mask__ = (__in_modify__ | __in_attrib__ | __in_moved_from__ | __in_moved_to__ | __in_create__ |
+                  __in_delete__ | __in_delete_self__ | __in_move_self__ | __in_onlydir__)
+__event_header__ = struct.Struct('iIII')
+
+__libc__ = None
+
+
+class Watch(object):
+    """Class describing a watched directory"""
+
+    def __init__(self, key, path, recursive, names, exclude):
+        self.key = key
+        self.path = path
+        self.recursive = recursive
+        self.names = names
+        self.exclude = exclude
+
+
+class Watcher(object):
+    """Class reporting which keys had changes in their watched directories"""
+
+    # Returned by read() in place of keys when events were dropped and every key must be treated as changed
+    OVERFLOW = object()
+
+    def __init__(self):
+        libc = _libc()
+        self._fd = libc.inotify_init1(__in_nonblock__ | __in_cloexec__)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._watches = {}
+
+    @staticmethod
+    def available():
+        """Check if inotify is available on this platform"""
+
+        return sys.platform.startswith('linux') and _libc() is not None
+
+    def add(self, key, path, recursive=False, names=None, exclude=()):
+        """Watch directory, and subdirectories not in exclude if recursive, returning False if watches ran out"""
+
+        for directory in _directories(path, recursive, exclude):
+            watch = Watch(key, directory, recursive, names, exclude)
+            wd = _libc().inotify_add_watch(self._fd, directory.encode('utf-8'), __watch_mask__)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR) and directory != path:
+                    continue
+                return False
+            self._watches[wd] = watch
+        return True
+
+    def close(self):
+        """Stop watching and close inotify file descriptor"""
+
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._watches = {}
+
+    def count(self):
+        """Return number of watched directories"""
+
+        return len(self._watches)
+
+    def fileno(self):
+        """Return inotify file descriptor for select"""
+
+        return self._fd
+
+    def read(self):
+        """Return (changed keys, keys whose watched directory went away), or (OVERFLOW, empty set)"""
+
+        changed = set()
+        lost = set()
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as err:
+                if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not data:
+                break
+            for wd, mask, name in _events(data):
+                if mask & __in_q_overflow__:
+                    return Watcher.OVERFLOW, set()
+                watch = self._watches.get(wd)
+                if watch is None:
+                    continue
+                if mask & __in_ignored__:
+                    del self._watches[wd]
+                    lost.add(watch.key)
+                    continue
+                if mask & (__in_delete_self__ | __in_move_self__):
+                    lost.add(watch.key)
+                if name and (name in watch.exclude or (watch.names is not None and name not in watch.names)):
+                    continue
+                changed.add(watch.key)
+                if watch.recursive and mask & __in_isdir__ and mask & (__in_create__ | __in_moved_to__):
+                    if not self.add(watch.key, os.path.join(watch.path, name), True, watch.names, watch.exclude):
+                        lost.add(watch.key)
+        return changed, lost
+
+    def remove(self, key):
+        """Stop watching directories for key"""
+
+        for wd in [w for w, watch in self._watches.items() if watch.key == key]:
+            _libc().inotify_rm_watch(self._fd, wd)
+            del self._watches[wd]
+
+
+def _directories(path, recursive, exclude):
+    """Yield path and, if recursive, its subdirectories not named in exclude"""
+
+    yield path
+    if not recursive:
+        return
+    for root, dirs, _ in os.walk(path):
+        dirs[:] = [d for d in dirs if d not in exclude and not os.path.islink(os.path.join(root, d))]
+        for directory in dirs:
+            yield os.path.join(root, directory)
+
+
+def _events(data):
+    """Yield (watch descriptor, mask, name) for events in buffer read from inotify"""
+
+    offset = 0
+    while offset + __event_header__.size <= len(data):
+        wd, mask, _, length = __event_header__.unpack_from(data, offset)
+        offset += __event_header__.size
+        name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+        offset += length
+        yield wd, mask, name
+
+
+def _libc():
+    """Return libc with inotify functions, or None if it isn't available"""
+
+    global __libc__  # pylint: disable=W0603
+    if __libc__ is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            libc.inotify_init1  # pylint: disable=W0104
+        except (OSError, AttributeError):
+            return None
+        __libc__ = libc
+    return __libc__
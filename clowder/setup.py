@@ -37,5 +37,6 @@ setup(
             'clowder=clowder.cmd:main',
         ]
     },
-    install_requires=['argcomplete', 'colorama', 'GitPython', 'PyYAML', 'termcolor', 'psutil', 'tqdm']
+    install_requires=['argcomplete', 'colorama', 'GitPython', 'PyYAML', 'termcolor', 'psutil', 'tqdm'],
+    extras_require={'pygit2': ['pygit2']}
 )
@@ -0,0 +1,234 @@
+"""Hermetic benchmarks against a generated local fleet"""
+
+from __future__ import print_function
+
+import json
+import os
+import platform
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+from multiprocessing import cpu_count
+
+from termcolor import colored, cprint
+
+from clowder_test.fleet import Fleet, generate_fleet
+
+__backends__ = ['git', 'pygit2']
+__scenarios__ = ['startup', 'manifest', 'herd_cold', 'herd_warm', 'status', 'reset', 'forall', 'save']
+__parallel_scenarios__ = ['herd_cold', 'herd_warm', 'reset', 'forall']
+__results_format__ = 1
+__workspace_scenarios__ = ['herd_warm', 'status', 'reset', 'forall', 'save']
+
+
+class BenchmarkError(Exception):
+    """Error running benchmark command"""
+    pass
+
+
+class Workspace(object):
+    """Class running timed clowder commands in a workspace cloned from a fleet's clowder repo"""
+
+    def __init__(self, fleet, path, clowder_command, parallel=False):
+        self.fleet = fleet
+        self.path = os.path.abspath(path)
+        self.clowder_command = shlex.split(clowder_command)
+        self.parallel = parallel
+        self.env = os.environ.copy()
+        # Submodules of generated repos use relative file urls, which git refuses to clone by default
+        self.env.update({'GIT_CONFIG_COUNT': '1',
+                         'GIT_CONFIG_KEY_0': 'protocol.file.allow',
+                         'GIT_CONFIG_VALUE_0': 'always',
+                         'GIT_TERMINAL_PROMPT': '0'})
+        self._saved_versions = 0
+
+    def create(self):
+        """Clone clowder repo and link clowder.yaml"""
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        _run(['git', 'clone', '--quiet', self.fleet.clowder_url(), '.clowder'], self.path, self.env)
+        os.symlink(os.path.join('.clowder', 'clowder.yaml'), os.path.join(self.path, 'clowder.yaml'))
+
+    def herd(self):
+        """Herd projects if any are missing, without timing it"""
+
+        if all([os.path.isdir(os.path.join(self.path, n)) for n in self.fleet.project_names()]):
+            return
+        _run(self.clowder_command + ['herd'], self.path, self.env)
+
+    def remove_projects(self):
+        """Remove cloned projects, leaving the clowder repo"""
+
+        for name in self.fleet.project_names():
+            project_path = os.path.join(self.path, name)
+            if os.path.isdir(project_path):
+                shutil.rmtree(project_path)
+
+    def run_scenario(self, scenario):
+        """Run scenario once, returning wall time and failure output if it failed"""
+
+        if scenario == 'herd_cold':
+            self.remove_projects()
+        args = self._scenario_args(scenario)
+        if self.parallel and scenario in __parallel_scenarios__:
+            args.append('--parallel')
+        start = time.time()
+        return_code, output = _run(self.clowder_command + args, self.path, self.env, check=False)
+        duration = time.time() - start
+        return duration, None if return_code == 0 else output
+
+    def _scenario_args(self, scenario):
+        """Return clowder arguments for scenario"""
+
+        if scenario == 'startup':
+            return ['version']
+        if scenario == 'manifest':
+            return ['yaml']
+        if scenario in ('herd_cold', 'herd_warm'):
+            return ['herd']
+        if scenario == 'forall':
+            return ['forall', '-c', 'git rev-parse HEAD']
+        if scenario == 'save':
+            self._saved_versions += 1
+            return ['save', 'benchmark-' + str(self._saved_versions)]
+        return [scenario]
+
+
+def environment():
+    """Return description of the machine and tools benchmarks ran with"""
+
+    git_version = _run(['git', '--version'], os.getcwd(), os.environ.copy())[1].strip()
+    try:
+        commit = _run(['git', 'rev-parse', 'HEAD'], os.path.dirname(os.path.abspath(__file__)),
+                      os.environ.copy())[1].strip()
+    except BenchmarkError:
+        commit = None
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': cpu_count(),
+            'git': git_version,
+            'commit': commit}
+
+
+def median(values):
+    """Return median of values"""
+
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2.0
+
+
+def print_results(results):
+    """Print table of scenario timings, with a backend column if results compare git backends"""
+
+    backends = any(['backend' in r for r in results])
+    print()
+    print(colored('scenario'.ljust(12), attrs=['bold']) + colored('projects'.rjust(10), attrs=['bold']) +
+          (colored('backend'.rjust(10), attrs=['bold']) if backends else '') +
+          colored('median'.rjust(10), attrs=['bold']) + colored('min'.rjust(10), attrs=['bold']) +
+          colored('max'.rjust(10), attrs=['bold']))
+    for result in results:
+        line = result['scenario'].ljust(12) + str(result['projects']).rjust(10)
+        if backends:
+            line += result.get('backend', '-').rjust(10)
+        if result['failed']:
+            cprint(line + '    failed', 'red')
+            continue
+        print(line + ''.join([('%.3fs' % result[k]).rjust(10) for k in ('median', 'min', 'max')]))
+    print()
+
+
+def run_benchmarks(sizes, clowder_command, repeat=3, scenarios=None, parallel=False, work_dir=None,
+                   keep=False, backends=None, **fleet_options):
+    """
+    Generate a fleet for each size and time scenarios against it, returning results
+    With backends, every scenario runs once per git backend in the same workspace so timings are comparable
+    """
+
+    scenarios = __scenarios__ if scenarios is None else [s for s in __scenarios__ if s in scenarios]
+    root = tempfile.mkdtemp(prefix='clowder-benchmark-', dir=work_dir)
+    results = {'format': __results_format__,
+               'created': time.time(),
+               'environment': environment(),
+               'clowder_command': clowder_command,
+               'parallel': parallel,
+               'repeat': repeat,
+               'backends': backends,
+               'fleet': None,
+               'results': []}
+    try:
+        for size in sizes:
+            fleet_path = os.path.join(root, str(size))
+            cprint('Generate fleet of ' + str(size) + ' projects at ' + fleet_path, 'cyan')
+            fleet = generate_fleet(Fleet(fleet_path, size, **fleet_options))
+            parameters = fleet.parameters()
+            del parameters['projects']
+            results['fleet'] = parameters
+            workspace = Workspace(fleet, os.path.join(fleet_path, 'workspace'), clowder_command, parallel=parallel)
+            workspace.create()
+            if backends is None:
+                results['results'].extend(run_scenarios(workspace, scenarios, repeat))
+                continue
+            for backend in backends:
+                cprint('Git backend ' + backend, 'cyan')
+                workspace.env['CLOWDER_GIT_BACKEND'] = backend
+                for result in run_scenarios(workspace, scenarios, repeat):
+                    result['backend'] = backend
+                    results['results'].append(result)
+    finally:
+        if keep:
+            print('Benchmark files kept at ' + root)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def run_scenarios(workspace, scenarios, repeat):
+    """Run each scenario repeat times in workspace, returning one result per scenario"""
+
+    results = []
+    for scenario in scenarios:
+        durations = []
+        failure = None
+        print(' - ' + scenario + ' (' + str(workspace.fleet.projects) + ' projects)')
+        try:
+            if scenario in __workspace_scenarios__:
+                workspace.herd()
+        except BenchmarkError as err:
+            failure = str(err)
+        while failure is None and len(durations) < repeat:
+            duration, failure = workspace.run_scenario(scenario)
+            if failure is None:
+                durations.append(duration)
+        if failure is not None:
+            cprint('   Failed:', 'red')
+            print(failure)
+        result = {'scenario': scenario, 'projects': workspace.fleet.projects, 'runs': durations,
+                  'failed': failure is not None}
+        if durations:
+            result.update({'median': median(durations), 'min': min(durations), 'max': max(durations)})
+        results.append(result)
+    return results
+
+
+def write_results(results, output_file):
+    """Write results as JSON"""
+
+    with open(output_file, 'w') as raw_file:
+        json.dump(results, raw_file, indent=2, sort_keys=True)
+        raw_file.write('\n')
+
+
+def _run(command, path, env, check=True):
+    """Run command, returning return code and combined output"""
+
+    process = subprocess.Popen(command, cwd=path, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = process.communicate()[0].decode('utf-8', 'replace')
+    if check and process.returncode != 0:
+        raise BenchmarkError(' '.join(command) + ' failed in ' + path + '\n' + output)
+    return process.returncode, output
@@ -6,8 +6,13 @@ import argparse
 import os
 import sys
 import argcomplete
+from termcolor import cprint
 
-from clowder_test.execute import execute_command
+import clowder_test.benchmark as benchmark
+import clowder_test.perf as perf
+import clowder_test.runner as runner
+from clowder_test.fleet import Fleet, FleetError, generate_fleet
+from clowder_test.runner import Suite
 
 
 # Disable errors shown by pylint for too many public methods
@@ -39,13 +44,25 @@ class Command(object):
 
         parser.add_argument('--write', '-w', action='store_true', help='run tests requiring test repo write access')
 
+        parser.add_argument('--jobs', '-j', type=int, default=1, help='number of test suites to run at once')
+
+        parser.add_argument('--shard', default=None, metavar='i/N', help='run only shard i of N of the test suites')
+
+        parser.add_argument('--junit', default=None, metavar='FILE', help='write JUnit XML results to file')
+
+        parser.add_argument('--work-dir', default=os.path.join(os.path.expanduser('~'), '.clowder_tests'),
+                            help='directory to create test directories for each suite in')
+
         self._subparsers = parser.add_subparsers(dest='test_command', metavar='SUBCOMMAND')
         self._configure_all_subparser()
+        self._configure_benchmark_subparser()
         self._configure_cats_subparser()
         self._configure_cocos2d_subparser()
+        self._configure_fleet_subparser()
         self._configure_llvm_subparser()
         self._configure_offline_subparser()
         self._configure_parallel_subparser()
+        self._configure_perf_subparser()
         self._configure_swift_subparser()
         self._configure_unittest_subparser()
         self._configure_write_subparser()
@@ -56,32 +73,48 @@ class Command(object):
         if self.args.test_command is None or not hasattr(self, self.args.test_command):
             exit_unrecognized_command(parser)
 
-        # use dispatch pattern to invoke method with same name
-        scripts_dir = os.path.join(os.getcwd(), 'test', 'scripts')
-        return_code = execute_command('./setup_local_test_directory.sh', scripts_dir)
-        if return_code != 0:
-            print(' - Failed to setup local test directory')
-            sys.exit(return_code)
-
         access = 'write' if self.args.write else 'read'
         self.test_env = {'ACCESS_LEVEL': access}
         if self.args.parallel:
             self.test_env["PARALLEL"] = '--parallel'
 
+        # use dispatch pattern to invoke method with same name, collecting test suites to run
+        self._suites = []
+        scripts_dir = os.path.join(os.getcwd(), 'test', 'scripts')
         getattr(self, self.args.test_command)(scripts_dir)
+        if self._suites:
+            self._run_suites(scripts_dir)
         print()
 
     def all(self, path):
-        """clowder branch command"""
+        """clowder all tests"""
 
-        self.cats(path)
-        self.cocos2d(path)
-        self.llvm(path)
+        self.cats_all(path)
+        self.cocos2d_all(path)
+        self.llvm_all(path)
         self.offline(path)
         self.parallel(path)
-        self.swift(path)
+        self.swift_all(path)
         self.unittests(path)
 
+    def benchmark(self, path):
+        """clowder benchmarks against generated local fleets"""
+
+        del path
+        try:
+            results = benchmark.run_benchmarks(self.args.sizes, self.args.clowder, repeat=self.args.repeat,
+                                               scenarios=self.args.scenarios, parallel=self.args.parallel,
+                                               work_dir=self.args.fleet_dir, keep=self.args.keep,
+                                               backends=self.args.git_backends, **_fleet_options(self.args))
+        except (FleetError, benchmark.BenchmarkError) as err:
+            cprint(str(err), 'red')
+            sys.exit(1)
+        benchmark.print_results(results['results'])
+        benchmark.write_results(results, self.args.output)
+        print('Results written to ' + self.args.output)
+        if any([r['failed'] for r in results['results']]):
+            sys.exit(1)
+
     def cats(self, path):
         """clowder cats tests entrypoint"""
 
@@ -93,128 +126,107 @@ class Command(object):
     def cats_all(self, path):
         """clowder cats tests"""
 
-        return_code = self._execute_command('./test_example_cats.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats', './test_example_cats.sh', path)
 
     def cats_branch(self, path):
         """clowder cats branch tests"""
 
-        return_code = self._execute_command('./branch.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_branch', './branch.sh', path)
 
     def cats_clean(self, path):
         """clowder cats clean tests"""
 
-        return_code = self._execute_command('./clean.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_clean', './clean.sh', path)
 
     def cats_diff(self, path):
         """clowder cats diff tests"""
 
-        return_code = self._execute_command('./diff.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_diff', './diff.sh', path)
 
     def cats_forall(self, path):
         """clowder cats forall tests"""
 
-        return_code = self._execute_command('./forall.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_forall', './forall.sh', path)
 
     def cats_help(self, path):
         """clowder cats help tests"""
 
-        return_code = self._execute_command('./help.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_help', './help.sh', path)
 
     def cats_herd_branch(self, path):
         """clowder cats herd branch tests"""
 
-        return_code = self._execute_command('./herd_branch.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_herd_branch', './herd_branch.sh', path)
 
     def cats_herd_tag(self, path):
         """clowder cats herd tag tests"""
 
-        return_code = self._execute_command('./herd_tag.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_herd_tag', './herd_tag.sh', path)
 
     def cats_herd(self, path):
         """clowder cats herd tests"""
 
-        return_code = self._execute_command('./herd.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_herd', './herd.sh', path)
 
     def cats_import(self, path):
         """clowder cats import tests"""
 
-        return_code = self._execute_command('./import.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_import', './import.sh', path)
 
     def cats_init(self, path):
         """clowder cats init tests"""
 
-        return_code = self._execute_command('./init.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_init', './init.sh', path)
 
     def cats_link(self, path):
         """clowder cats link tests"""
 
-        return_code = self._execute_command('./link.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_link', './link.sh', path)
 
     def cats_prune(self, path):
         """clowder cats prune tests"""
 
-        return_code = self._execute_command('./prune.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_prune', './prune.sh', path)
 
     def cats_repo(self, path):
         """clowder cats repo tests"""
 
-        return_code = self._execute_command('./repo.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_repo', './repo.sh', path)
 
     def cats_reset(self, path):
         """clowder cats reset tests"""
 
-        return_code = self._execute_command('./reset.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_reset', './reset.sh', path)
 
     def cats_save(self, path):
         """clowder cats save tests"""
 
-        return_code = self._execute_command('./save.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_save', './save.sh', path)
 
     def cats_start(self, path):
         """clowder cats start tests"""
 
-        return_code = self._execute_command('./start.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_start', './start.sh', path)
 
     def cats_stash(self, path):
         """clowder cats stash tests"""
 
-        return_code = self._execute_command('./stash.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_stash', './stash.sh', path)
 
     def cats_status(self, path):
         """clowder cats status tests"""
 
-        return_code = self._execute_command('./status.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_status', './status.sh', path)
 
     def cats_yaml_validation(self, path):
         """clowder cats yaml validation tests"""
 
-        return_code = self._execute_command('./yaml_validation.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_yaml_validation', './yaml_validation.sh', path)
 
     def cats_yaml(self, path):
         """clowder cats yaml tests"""
 
-        return_code = self._execute_command('./yaml.sh', path)
-        self._exit(return_code)
+        self._add_suite('cats_yaml', './yaml.sh', path)
 
     def cocos2d(self, path):
         """clowder cocos2d tests entrypoint"""
@@ -227,26 +239,34 @@ class Command(object):
     def cocos2d_all(self, path):
         """clowder cocos2d tests"""
 
-        return_code = self._execute_command('./test_example_cocos2d.sh', path)
-        self._exit(return_code)
+        self._add_suite('cocos2d', './test_example_cocos2d.sh', path)
 
     def cocos2d_clean(self, path):
         """clowder cocos2d clean tests"""
 
-        return_code = self._execute_command('./clean.sh', path)
-        self._exit(return_code)
+        self._add_suite('cocos2d_clean', './clean.sh', path)
 
     def cocos2d_herd(self, path):
         """clowder cocos2d herd tests"""
 
-        return_code = self._execute_command('./herd.sh', path)
-        self._exit(return_code)
+        self._add_suite('cocos2d_herd', './herd.sh', path)
 
     def cocos2d_skip(self, path):
         """clowder cocos2d skip tests"""
 
-        return_code = self._execute_command('./skip.sh', path)
-        self._exit(return_code)
+        self._add_suite('cocos2d_skip', './skip.sh', path)
+
+    def fleet(self, path):
+        """Generate local fleet of bare repos and clowder repo"""
+
+        del path
+        try:
+            fleet = generate_fleet(Fleet(self.args.path, self.args.projects, **_fleet_options(self.args)))
+        except FleetError as err:
+            cprint(str(err), 'red')
+            sys.exit(1)
+        print('Generated ' + str(fleet.projects) + ' projects in ' + fleet.repos_dir())
+        print('Initialize a workspace with: clowder init ' + fleet.clowder_url())
 
     def llvm(self, path):
         """clowder llvm tests entrypoint"""
@@ -259,51 +279,76 @@ class Command(object):
     def llvm_all(self, path):
         """clowder llvm tests"""
 
-        return_code = self._execute_command('./test_example_llvm.sh', path)
-        self._exit(return_code)
+        self._add_suite('llvm', './test_example_llvm.sh', path)
 
     def llvm_branch(self, path):
         """clowder llvm branch tests"""
 
-        return_code = self._execute_command('./branch.sh', path)
-        self._exit(return_code)
+        self._add_suite('llvm_branch', './branch.sh', path)
 
     def llvm_forks(self, path):
         """clowder llvm forks tests"""
 
-        return_code = self._execute_command('./forks.sh', path)
-        self._exit(return_code)
+        self._add_suite('llvm_forks', './forks.sh', path)
 
     def llvm_herd(self, path):
         """clowder llvm herd tests"""
 
-        return_code = self._execute_command('./herd.sh', path)
-        self._exit(return_code)
+        self._add_suite('llvm_herd', './herd.sh', path)
 
     def llvm_reset(self, path):
         """clowder llvm reset tests"""
 
-        return_code = self._execute_command('./reset.sh', path)
-        self._exit(return_code)
+        self._add_suite('llvm_reset', './reset.sh', path)
 
     def llvm_sync(self, path):
         """clowder llvm sync tests"""
 
-        return_code = self._execute_command('./sync.sh', path)
-        self._exit(return_code)
+        self._add_suite('llvm_sync', './sync.sh', path)
 
     def offline(self, path):
         """clowder offline tests"""
 
+        # Disables the network connection, so it can't run alongside other suites
         path = os.path.join(path, 'cats')
-        return_code = self._execute_command('./offline.sh', path)
-        self._exit(return_code)
+        self._add_suite('offline', './offline.sh', path, exclusive=True)
 
     def parallel(self, path):
         """clowder parallel tests"""
 
-        return_code = self._execute_command('./test_parallel.sh', path)
-        self._exit(return_code)
+        self._add_suite('parallel', './test_parallel.sh', path)
+
+    def perf(self, path):
+        """clowder performance regression tests"""
+
+        del path
+        try:
+            baseline = perf.load_baseline(self.args.baseline)
+        except (IOError, ValueError) as err:
+            cprint('Failed to load baseline ' + self.args.baseline, 'red')
+            print(err)
+            sys.exit(1)
+        try:
+            results = perf.run_perf(baseline, self.args.clowder, work_dir=self.args.fleet_dir)
+        except (FleetError, benchmark.BenchmarkError) as err:
+            cprint(str(err), 'red')
+            sys.exit(1)
+        if self.args.output is not None:
+            benchmark.write_results(results, self.args.output)
+
+        if self.args.update_baseline:
+            perf.update_baseline(baseline, results, self.args.baseline)
+            benchmark.print_results(results['results'])
+            print('Baseline written to ' + self.args.baseline)
+            return
+
+        rows = perf.compare(baseline, results['results'], tolerance=self.args.tolerance,
+                            min_delta=self.args.min_delta)
+        perf.print_comparison(rows)
+        failed = [r for r in rows if r[5] in ['regression', 'failed']]
+        if failed:
+            cprint('Scenarios regressed or failed: ' + str(len(failed)), 'red')
+            sys.exit(1)
 
     def swift(self, path):
         """clowder swift tests entrypoint"""
@@ -316,68 +361,67 @@ class Command(object):
     def swift_all(self, path):
         """clowder swift tests"""
 
-        return_code = self._execute_command('./test_example_swift.sh', path)
-        self._exit(return_code)
+        self._add_suite('swift', './test_example_swift.sh', path)
 
     def swift_config_versions(self, path):
         """clowder swift config versions tests"""
 
-        return_code = self._execute_command('./config_versions.sh', path)
-        self._exit(return_code)
+        self._add_suite('swift_config_versions', './config_versions.sh', path)
 
     def swift_configure_remotes(self, path):
         """clowder swift configure remotes tests"""
 
-        return_code = self._execute_command('./configure_remotes.sh', path)
-        self._exit(return_code)
+        self._add_suite('swift_configure_remotes', './configure_remotes.sh', path)
 
     def swift_reset(self, path):
         """clowder swift reset tests"""
 
-        return_code = self._execute_command('./reset.sh', path)
-        self._exit(return_code)
+        self._add_suite('swift_reset', './reset.sh', path)
 
     def unittests(self, path):
         """clowder unit tests"""
 
-        if self.args.version == 'python2':
-            self.test_env["PYTHON_VERSION"] = 'python'
-        else:
-            self.test_env["PYTHON_VERSION"] = 'python3'
-
-        return_code = self._execute_command('./unittests.sh', path)
-        self._exit(return_code)
+        env = {'PYTHON_VERSION': 'python' if getattr(self.args, 'version', None) == 'python2' else 'python3'}
+        self._add_suite('unittests', './unittests.sh', path, env=env)
 
     def write(self, path):
         """clowder write tests"""
 
-        self.test_env['ACCESS_LEVEL'] = 'write'
-
-        example_dir = os.path.join(path, 'cats')
-        return_code = self._execute_command('./write_herd.sh', example_dir)
-        self._exit(return_code)
-        return_code = self._execute_command('./write_prune.sh', example_dir)
-        self._exit(return_code)
-        return_code = self._execute_command('./write_repo.sh', example_dir)
-        self._exit(return_code)
-        return_code = self._execute_command('./write_start.sh', example_dir)
-        self._exit(return_code)
+        # Scripts push to the same test repos, so they run in order as one suite
+        scripts = ['cats/write_herd.sh', 'cats/write_prune.sh', 'cats/write_repo.sh', 'cats/write_start.sh',
+                   'llvm/write_forks.sh', 'llvm/write_sync.sh', 'swift/write_configure_remotes.sh']
+        self._add_suite('write', ' && '.join(['./' + s for s in scripts]), path, env={'ACCESS_LEVEL': 'write'})
 
-        example_dir = os.path.join(path, 'llvm')
-        return_code = self._execute_command('./write_forks.sh', example_dir)
-        self._exit(return_code)
-        return_code = self._execute_command('./write_sync.sh', example_dir)
-        self._exit(return_code)
+    def _add_suite(self, name, command, path, env=None, exclusive=False):
+        """Add test script to suites to run"""
 
-        example_dir = os.path.join(path, 'swift')
-        return_code = self._execute_command('./write_configure_remotes.sh', example_dir)
-        self._exit(return_code)
+        suite_env = dict(self.test_env)
+        suite_env.update(env or {})
+        self._suites.append(Suite(name, command, path, env=suite_env, exclusive=exclusive))
 
     def _configure_all_subparser(self):
         """clowder all tests subparser"""
 
         self._subparsers.add_parser('all', help='Run all tests')
 
+    def _configure_benchmark_subparser(self):
+        """clowder benchmark subparser"""
+
+        parser = self._subparsers.add_parser('benchmark', help='Run benchmarks against generated local repos')
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000], metavar='PROJECTS',
+                            help='fleet sizes to benchmark')
+        parser.add_argument('--repeat', '-r', type=int, default=3, help='runs of each scenario')
+        parser.add_argument('--scenarios', nargs='+', choices=benchmark.__scenarios__, default=None,
+                            metavar='SCENARIO', help='scenarios to run: ' + ', '.join(benchmark.__scenarios__))
+        parser.add_argument('--clowder', default='clowder', help='clowder command to benchmark')
+        parser.add_argument('--output', '-o', default='benchmark.json', help='file to write JSON results to')
+        parser.add_argument('--fleet-dir', default=None, help='directory to generate fleets in')
+        parser.add_argument('--keep', action='store_true', help="don't remove generated fleets")
+        parser.add_argument('--git-backends', nargs='+', choices=benchmark.__backends__, default=None,
+                            metavar='BACKEND', help='run scenarios once per clowder git backend: ' +
+                            ', '.join(benchmark.__backends__))
+        _configure_fleet_arguments(parser)
+
     def _configure_cats_subparser(self):
         """clowder cats tests subparser"""
 
@@ -415,6 +459,14 @@ class Command(object):
         cocos2d_subparser.add_parser('herd', help='Run herd cocos2d tests')
         cocos2d_subparser.add_parser('skip', help='Run skip cocos2d tests')
 
+    def _configure_fleet_subparser(self):
+        """clowder fleet subparser"""
+
+        parser = self._subparsers.add_parser('fleet', help='Generate local repos and clowder repo')
+        parser.add_argument('path', help='directory to generate fleet in')
+        parser.add_argument('--projects', '-n', type=int, default=10, help='number of projects')
+        _configure_fleet_arguments(parser)
+
     def _configure_llvm_subparser(self):
         """clowder llvm tests subparser"""
 
@@ -437,6 +489,22 @@ class Command(object):
 
         self._subparsers.add_parser('parallel', help='Run parallel tests')
 
+    def _configure_perf_subparser(self):
+        """clowder perf subparser"""
+
+        parser = self._subparsers.add_parser('perf', help='Compare benchmark medians with performance baseline')
+        parser.add_argument('--baseline', '-b', default=os.path.join('test', 'perf', 'baseline.json'),
+                            help='baseline file with sizes, fleet, tolerances, and medians')
+        parser.add_argument('--tolerance', '-t', type=float, default=None,
+                            help='allowed slowdown as a fraction, overriding tolerances in baseline')
+        parser.add_argument('--min-delta', type=float, default=None,
+                            help='slowdown in seconds ignored regardless of tolerance')
+        parser.add_argument('--update-baseline', '-u', action='store_true',
+                            help='write measured medians to baseline instead of comparing')
+        parser.add_argument('--clowder', default='clowder', help='clowder command to benchmark')
+        parser.add_argument('--output', '-o', default=None, help='file to write JSON results to')
+        parser.add_argument('--fleet-dir', default=None, help='directory to generate fleets in')
+
     def _configure_swift_subparser(self):
         """clowder swift tests subparser"""
 
@@ -461,17 +529,47 @@ class Command(object):
 
         self._subparsers.add_parser('write', help='Run tests requiring remote write permissions')
 
-    def _execute_command(self, command, path):
-        """Private exit handler"""
-
-        return execute_command(command, path, env=self.test_env)
-
-    @staticmethod
-    def _exit(return_code):
-        """Private exit handler"""
-
-        if return_code != 0:
-            sys.exit(return_code)
+    def _run_suites(self, scripts_dir):
+        """Run collected suites in this shard, writing JUnit results and exiting with failure if any failed"""
+
+        suites = self._suites
+        if self.args.shard is not None:
+            try:
+                index, count = runner.parse_shard(self.args.shard)
+            except ValueError as err:
+                cprint(str(err), 'red')
+                sys.exit(1)
+            suites = runner.shard_suites(suites, index, count)
+            print('Shard ' + self.args.shard + ': ' + ', '.join([s.name for s in suites]))
+            if not suites:
+                return
+
+        results = runner.run_suites(suites, scripts_dir, os.path.abspath(self.args.work_dir), jobs=self.args.jobs)
+        runner.print_results(results)
+        if self.args.junit is not None:
+            runner.write_junit(results, self.args.junit)
+            print('JUnit results written to ' + self.args.junit)
+        failed = [r for r in results if not r.passed()]
+        if failed:
+            sys.exit(failed[0].return_code or 1)
+
+
+def _configure_fleet_arguments(parser):
+    """Add arguments describing generated repos"""
+
+    parser.add_argument('--commits', type=int, default=10, help='commits of history per repo')
+    parser.add_argument('--branches', type=int, default=2, help='branches per repo')
+    parser.add_argument('--tags', type=int, default=2, help='tags per repo')
+    parser.add_argument('--files', type=int, default=10, help='files per repo')
+    parser.add_argument('--submodules', type=int, default=0, help='submodules per repo')
+    parser.add_argument('--groups', type=int, default=1, help='groups to divide projects into')
+
+
+def _fleet_options(args):
+    """Return Fleet keyword arguments from parsed arguments"""
+
+    return {'commits': args.commits, 'branches': args.branches, 'tags': args.tags, 'files': args.files,
+            'submodules': args.submodules, 'groups': args.groups}
 
 
 def exit_unrecognized_command(parser):
@@ -0,0 +1,202 @@
+"""Synthetic multi-repo fleet generator"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+__author__ = 'Clowder Benchmark <benchmark@clowder.cat>'
+__base_timestamp__ = 1500000000
+
+
+class FleetError(Exception):
+    """Error generating fleet repository"""
+    pass
+
+
+class Fleet(object):
+    """Class describing generated fleet of bare repos and clowder repo"""
+
+    def __init__(self, path, projects, commits=10, branches=2, tags=2, files=10, submodules=0, groups=1):
+        self.path = os.path.abspath(path)
+        self.projects = projects
+        self.commits = max(1, commits)
+        self.branches = branches
+        self.tags = tags
+        self.files = max(1, files)
+        self.submodules = submodules
+        self.groups = max(1, min(groups, projects))
+
+    def clowder_url(self):
+        """Return url of generated clowder repo"""
+
+        return 'file://' + os.path.join(self.repos_dir(), 'clowder.git')
+
+    def get_yaml(self):
+        """Return clowder.yaml for fleet"""
+
+        lines = ['defaults:',
+                 '    ref: refs/heads/master',
+                 '    remote: origin',
+                 '    source: fleet',
+                 '',
+                 'sources:',
+                 '    - name: fleet',
+                 '      url: file://' + self.repos_dir(),
+                 '',
+                 'groups:']
+        names = self.project_names()
+        size = (len(names) + self.groups - 1) // self.groups
+        for index in range(self.groups):
+            lines.append('    - name: group-' + str(index))
+            lines.append('      projects:')
+            for name in names[index * size:(index + 1) * size]:
+                lines.append('        - name: ' + name)
+                lines.append('          path: ' + name)
+                if self.submodules:
+                    lines.append('          recursive: true')
+        return '\n'.join(lines) + '\n'
+
+    def library_names(self):
+        """Return names of repos used as submodules"""
+
+        return ['library-' + str(i).zfill(2) for i in range(self.submodules)]
+
+    def parameters(self):
+        """Return dict of generation parameters"""
+
+        return {'projects': self.projects, 'commits': self.commits, 'branches': self.branches,
+                'tags': self.tags, 'files': self.files, 'submodules': self.submodules, 'groups': self.groups}
+
+    def project_names(self):
+        """Return names of project repos"""
+
+        return ['project-' + str(i).zfill(4) for i in range(self.projects)]
+
+    def repos_dir(self):
+        """Return directory containing bare repos"""
+
+        return os.path.join(self.path, 'repos')
+
+
+def generate_fleet(fleet, jobs=None):
+    """Generate bare repos for fleet and a clowder repo with matching clowder.yaml"""
+
+    repos_dir = fleet.repos_dir()
+    if os.path.isdir(repos_dir) and os.listdir(repos_dir):
+        raise FleetError('Fleet already exists at ' + repos_dir)
+    if not os.path.isdir(repos_dir):
+        os.makedirs(repos_dir)
+
+    pool = ThreadPool(jobs or cpu_count())
+    try:
+        library_shas = pool.map(lambda n: _generate_repo(repos_dir, n, fleet.commits, 0, 0, fleet.files, []),
+                                fleet.library_names())
+        submodules = list(zip(fleet.library_names(), library_shas))
+        pool.map(lambda n: _generate_repo(repos_dir, n, fleet.commits, fleet.branches, fleet.tags, fleet.files,
+                                          submodules),
+                 fleet.project_names())
+    finally:
+        pool.close()
+        pool.join()
+
+    _import_repo(os.path.join(repos_dir, 'clowder.git'),
+                 _commit_stream(1, 'Add clowder.yaml', [('100644', 'clowder.yaml', fleet.get_yaml())], None))
+    return fleet
+
+
+def _commit_stream(mark, message, changes, parent):
+    """Return fast-import commands for commit on master"""
+
+    timestamp = str(__base_timestamp__ + mark * 60)
+    stream = ['commit refs/heads/master',
+              'mark :' + str(mark),
+              'author ' + __author__ + ' ' + timestamp + ' +0000',
+              'committer ' + __author__ + ' ' + timestamp + ' +0000',
+              _data(message)]
+    if parent is not None:
+        stream.append('from :' + str(parent))
+    for mode, path, content in changes:
+        if mode == '160000':
+            stream.append('M 160000 ' + content + ' ' + path)
+        else:
+            stream.append('M ' + mode + ' inline ' + path)
+            stream.append(_data(content))
+    return '\n'.join(stream) + '\n'
+
+
+def _data(content):
+    """Return fast-import data command"""
+
+    return 'data ' + str(len(content.encode('utf-8'))) + '\n' + content
+
+
+def _file_content(name, index, commit):
+    """Return contents of generated file"""
+
+    lines = [name + ' file ' + str(index) + ' revision ' + str(commit)]
+    lines.extend(['line ' + str(i) + ' of ' + name + '/file-' + str(index) for i in range(20)])
+    return '\n'.join(lines) + '\n'
+
+
+def _generate_repo(repos_dir, name, commits, branches, tags, files, submodules):
+    """Generate bare repo with history, branches, tags, and submodules, returning sha of master"""
+
+    stream = []
+    changes = [('100644', 'file-' + str(i).zfill(4) + '.txt', _file_content(name, i, 0)) for i in range(files)]
+    if submodules:
+        gitmodules = ''
+        for library, sha in submodules:
+            gitmodules += '[submodule "' + library + '"]\n\tpath = ' + library + '\n\turl = ../' + library + '.git\n'
+            changes.append(('160000', library, sha))
+        changes.append(('100644', '.gitmodules', gitmodules))
+    stream.append(_commit_stream(1, 'Initial commit of ' + name, changes, None))
+
+    for commit in range(1, commits):
+        index = commit % files
+        change = ('100644', 'file-' + str(index).zfill(4) + '.txt', _file_content(name, index, commit))
+        stream.append(_commit_stream(commit + 1, 'Update file ' + str(index), [change], commit))
+
+    for branch in range(branches):
+        stream.append('reset refs/heads/branch-' + str(branch) + '\nfrom :' + str(_ref_mark(branch, commits)) + '\n')
+    for tag in range(tags):
+        stream.append('reset refs/tags/v' + str(tag) + '\nfrom :' + str(_ref_mark(tag, commits)) + '\n')
+
+    repo_path = os.path.join(repos_dir, name + '.git')
+    _import_repo(repo_path, '\n'.join(stream))
+    return _git_output(['rev-parse', 'refs/heads/master'], repo_path)
+
+
+def _git(args, path, stdin=None):
+    """Run git command in path, raising FleetError if it fails"""
+
+    process = subprocess.Popen(['git'] + args, cwd=path, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate(stdin.encode('utf-8') if stdin is not None else None)
+    if process.returncode != 0:
+        raise FleetError('git ' + ' '.join(args) + ' failed in ' + path + '\n' + stderr.decode('utf-8', 'replace'))
+    return stdout.decode('utf-8')
+
+
+def _git_output(args, path):
+    """Return stripped output of git command"""
+
+    return _git(args, path).strip()
+
+
+def _import_repo(repo_path, stream):
+    """Create bare repo and import fast-import stream"""
+
+    if not os.path.isdir(repo_path):
+        os.makedirs(repo_path)
+    _git(['init', '--bare', '--quiet'], repo_path)
+    _git(['fast-import', '--quiet'], repo_path, stdin=stream)
+    _git(['symbolic-ref', 'HEAD', 'refs/heads/master'], repo_path)
+
+
+def _ref_mark(index, commits):
+    """Return mark of commit to point a generated branch or tag at, spread through history"""
+
+    return max(1, commits - index * max(1, commits // 4))
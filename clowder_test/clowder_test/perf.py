@@ -0,0 +1,95 @@
+"""Performance regression gate comparing benchmark medians with a baseline"""
+
+from __future__ import print_function
+
+import json
+
+from termcolor import colored
+
+import clowder_test.benchmark as benchmark
+
+__perf_scenarios__ = ['herd_cold', 'herd_warm', 'status', 'reset', 'forall']
+__default_tolerance__ = 0.25
+__default_min_delta__ = 0.05
+
+
+def compare(baseline, results, tolerance=None, min_delta=None):
+    """Return comparison rows of (scenario, projects, baseline, median, tolerance, status)"""
+
+    tolerances = baseline.get('tolerance', {})
+    min_delta = baseline.get('min_delta', __default_min_delta__) if min_delta is None else min_delta
+    rows = []
+    for result in results:
+        scenario = result['scenario']
+        projects = result['projects']
+        expected = baseline.get('medians', {}).get(scenario, {}).get(str(projects))
+        allowed = tolerance if tolerance is not None else tolerances.get(scenario, tolerances.get(
+            'default', __default_tolerance__))
+        if result['failed']:
+            status = 'failed'
+        elif expected is None:
+            status = 'new'
+        elif result['median'] > expected * (1 + allowed) and result['median'] - expected > min_delta:
+            status = 'regression'
+        elif result['median'] < expected * (1 - allowed) and expected - result['median'] > min_delta:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((scenario, projects, expected, result.get('median'), allowed, status))
+    return rows
+
+
+def load_baseline(baseline_file):
+    """Return baseline loaded from JSON file"""
+
+    with open(baseline_file) as raw_file:
+        return json.load(raw_file)
+
+
+def print_comparison(rows):
+    """Print table of medians and deltas from baseline"""
+
+    colors = {'ok': 'green', 'faster': 'cyan', 'new': 'yellow', 'regression': 'red', 'failed': 'red'}
+    print()
+    print(colored('scenario'.ljust(12) + 'projects'.rjust(10) + 'baseline'.rjust(11) + 'median'.rjust(11) +
+                  'delta'.rjust(10) + 'allowed'.rjust(10) + '  result', attrs=['bold']))
+    for scenario, projects, expected, median, allowed, status in rows:
+        line = scenario.ljust(12) + str(projects).rjust(10)
+        line += (_seconds(expected) if expected is not None else '-').rjust(11)
+        line += (_seconds(median) if median is not None else '-').rjust(11)
+        if expected and median is not None:
+            line += ('%+.1f%%' % ((median - expected) / expected * 100)).rjust(10)
+        else:
+            line += '-'.rjust(10)
+        line += ('%.0f%%' % (allowed * 100)).rjust(10)
+        print(line + '  ' + colored(status, colors[status]))
+    print()
+
+
+def run_perf(baseline, clowder_command, work_dir=None):
+    """Run perf scenarios with baseline sizes, repeat count, and fleet, returning benchmark results"""
+
+    return benchmark.run_benchmarks(baseline['sizes'], clowder_command, repeat=baseline.get('repeat', 5),
+                                    scenarios=__perf_scenarios__, parallel=baseline.get('parallel', False),
+                                    work_dir=work_dir,
+                                    **baseline.get('fleet', {}))
+
+
+def update_baseline(baseline, results, baseline_file):
+    """Replace baseline medians with measured medians, keeping sizes, fleet, and tolerances"""
+
+    medians = {}
+    for result in results['results']:
+        if not result['failed']:
+            medians.setdefault(result['scenario'], {})[str(result['projects'])] = round(result['median'], 3)
+    baseline['medians'] = medians
+    baseline['environment'] = results['environment']
+    with open(baseline_file, 'w') as raw_file:
+        json.dump(baseline, raw_file, indent=2, sort_keys=True)
+        raw_file.write('\n')
+
+
+def _seconds(value):
+    """Return seconds formatted for table"""
+
+    return '%.3fs' % value
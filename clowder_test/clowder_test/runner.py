@@ -0,0 +1,181 @@
+"""Concurrent test suite runner"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import subprocess
+import time
+import xml.etree.ElementTree as ElementTree
+from multiprocessing.pool import ThreadPool
+
+from termcolor import colored, cprint
+
+from clowder_test.execute import execute_subprocess_command
+
+__failure_output_lines__ = 50
+
+
+class Suite(object):
+    """Class describing test script run in its own test directory"""
+
+    def __init__(self, name, command, path, env=None, exclusive=False):
+        self.name = name
+        self.command = command
+        self.path = path
+        self.env = env or {}
+        self.exclusive = exclusive
+
+
+class SuiteResult(object):
+    """Class holding outcome of suite run"""
+
+    def __init__(self, suite, return_code, duration, log_file=None):
+        self.suite = suite
+        self.return_code = return_code
+        self.duration = duration
+        self.log_file = log_file
+
+    def output(self):
+        """Return output written to log, or None if output wasn't captured"""
+
+        if self.log_file is None or not os.path.isfile(self.log_file):
+            return None
+        with open(self.log_file, 'rb') as raw_file:
+            return raw_file.read().decode('utf-8', 'replace')
+
+    def passed(self):
+        """Check if suite passed"""
+
+        return self.return_code == 0
+
+
+def parse_shard(shard):
+    """Return (index, count) from 'i/N' shard string with 1 <= i <= N"""
+
+    try:
+        index, count = [int(s) for s in shard.split('/')]
+    except ValueError:
+        raise ValueError('Shard must be given as i/N')
+    if count < 1 or index < 1 or index > count:
+        raise ValueError('Shard ' + shard + ' must satisfy 1 <= i <= N')
+    return index, count
+
+
+def print_results(results):
+    """Print table of suite results and timings"""
+
+    print()
+    print(colored('suite'.ljust(24), attrs=['bold']) + colored('result'.ljust(8), attrs=['bold']) +
+          colored('time'.rjust(10), attrs=['bold']))
+    for result in results:
+        status = colored('pass'.ljust(8), 'green') if result.passed() else colored('fail'.ljust(8), 'red')
+        print(result.suite.name.ljust(24) + status + ('%.1fs' % result.duration).rjust(10))
+    print()
+
+
+def run_suites(suites, scripts_dir, work_dir, jobs=1, env=None):
+    """Run suites in isolated test directories, running up to jobs at once and exclusive suites alone"""
+
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+    capture = jobs > 1 or len(suites) > 1
+    concurrent = [s for s in suites if not s.exclusive]
+    exclusive = [s for s in suites if s.exclusive]
+
+    def run(suite):
+        """Run suite and print its result"""
+
+        result = run_suite(suite, scripts_dir, work_dir, env=env, capture=capture)
+        _print_result(result)
+        return result
+
+    results = []
+    pool = ThreadPool(max(1, jobs))
+    try:
+        results.extend(pool.map(run, concurrent))
+    finally:
+        pool.close()
+        pool.join()
+    results.extend([run(s) for s in exclusive])
+    order = [s.name for s in suites]
+    return sorted(results, key=lambda r: order.index(r.suite.name))
+
+
+def run_suite(suite, scripts_dir, work_dir, env=None, capture=True):
+    """Set up test directory for suite and run it, capturing output to a log file if capture is set"""
+
+    suite_dir = os.path.join(work_dir, suite.name)
+    if os.path.isdir(suite_dir):
+        shutil.rmtree(suite_dir)
+    suite_env = os.environ.copy()
+    suite_env.update(env or {})
+    suite_env.update(suite.env)
+    suite_env['CLOWDER_TEST_DIR'] = suite_dir
+
+    log_file = os.path.join(work_dir, suite.name + '.log') if capture else None
+    output = open(log_file, 'w') if capture else None
+    print(' - Start ' + suite.name)
+    start = time.time()
+    try:
+        return_code = execute_subprocess_command('./setup_local_test_directory.sh', scripts_dir, env=suite_env,
+                                                 stdout=output, stderr=subprocess.STDOUT if capture else None)
+        if return_code == 0:
+            return_code = execute_subprocess_command(suite.command, suite.path, env=suite_env, stdout=output,
+                                                     stderr=subprocess.STDOUT if capture else None)
+    finally:
+        if output is not None:
+            output.close()
+    return SuiteResult(suite, return_code, time.time() - start, log_file=log_file)
+
+
+def shard_suites(suites, index, count):
+    """Return suites in shard index of count, assigning suites round robin"""
+
+    return [s for i, s in enumerate(suites) if i % count == index - 1]
+
+
+def write_junit(results, junit_file):
+    """Write JUnit XML report with one test case per suite"""
+
+    failures = len([r for r in results if not r.passed()])
+    duration = sum([r.duration for r in results])
+    testsuites = ElementTree.Element('testsuites', name='clowder-test', tests=str(len(results)),
+                                     failures=str(failures), time='%.3f' % duration)
+    testsuite = ElementTree.SubElement(testsuites, 'testsuite', name='clowder-test', tests=str(len(results)),
+                                       failures=str(failures), errors='0', skipped='0', time='%.3f' % duration)
+    for result in results:
+        testcase = ElementTree.SubElement(testsuite, 'testcase', classname='clowder_test', name=result.suite.name,
+                                          time='%.3f' % result.duration)
+        output = result.output()
+        if not result.passed():
+            failure = ElementTree.SubElement(testcase, 'failure',
+                                             message='exit code ' + str(result.return_code))
+            failure.text = _tail(output) if output is not None else None
+        if output is not None:
+            ElementTree.SubElement(testcase, 'system-out').text = output
+
+    directory = os.path.dirname(os.path.abspath(junit_file))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    ElementTree.ElementTree(testsuites).write(junit_file, encoding='utf-8', xml_declaration=True)
+
+
+def _print_result(result):
+    """Print suite result, with end of its output if it failed"""
+
+    duration = ' (%.1fs)' % result.duration
+    if result.passed():
+        print(' - ' + colored('Pass ', 'green') + result.suite.name + duration)
+        return
+    print(' - ' + colored('Fail ', 'red') + result.suite.name + duration)
+    output = result.output()
+    if output is not None:
+        cprint('   Last lines of ' + result.log_file + ':', 'red')
+        print(_tail(output))
+
+
+def _tail(output):
+    """Return last lines of output"""
+
+    return '\n'.join(output.splitlines()[-__failure_output_lines__:])
@@ -6,13 +6,24 @@ cd "$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )" || exit 1
 
 cd "$1" || exit 1
 
-export commands=( 'branch' \
+export commands=( 'batch' \
+                  'branch' \
                   'clean' \
+                  'daemon' \
+                  'daemon start' \
+                  'daemon status' \
+                  'daemon stop' \
                   'diff' \
                   'forall' \
                   'herd' \
                   'init' \
                   'link' \
+                  'logs' \
+                  'maintenance' \
+                  'maintenance run' \
+                  'maintenance schedule' \
+                  'maintenance unschedule' \
+                  'prefetch' \
                   'prune' \
                   'repo' \
                   'repo add' \
@@ -28,6 +39,8 @@ export commands=( 'branch' \
                   'stash' \
                   'status' \
                   'sync' \
+                  'worktree' \
+                  'worktree add' \
                   'yaml' )
 
 print_double_separator
@@ -9,17 +9,22 @@ TEST_SCRIPT_DIR="$( cd $CURRENT_DIR && pwd)"
 export CLOWDER_PROJECT_DIR
 CLOWDER_PROJECT_DIR="$( cd $CURRENT_DIR/../.. && pwd)"
 
-if [ -n "$TRAVIS_OS_NAME" ]; then
+if [ -n "$TRAVIS_OS_NAME" ] && [ -z "$CLOWDER_TEST_DIR" ]; then
     export CATS_EXAMPLE_DIR="$CURRENT_DIR/../../examples/cats"
     export LLVM_EXAMPLE_DIR="$CURRENT_DIR/../../examples/llvm-projects"
     export SWIFT_EXAMPLE_DIR="$CURRENT_DIR/../../examples/swift-projects"
     export COCOS2D_EXAMPLE_DIR="$CURRENT_DIR/../../examples/cocos2d-objc"
+else
+    export CLOWDER_TEST_DIR="${CLOWDER_TEST_DIR:-$HOME/.clowder_tests}"
+    export CATS_EXAMPLE_DIR="$CLOWDER_TEST_DIR/cats"
+    export LLVM_EXAMPLE_DIR="$CLOWDER_TEST_DIR/llvm-projects"
+    export SWIFT_EXAMPLE_DIR="$CLOWDER_TEST_DIR/swift-projects"
+    export COCOS2D_EXAMPLE_DIR="$CLOWDER_TEST_DIR/cocos2d-objc"
+fi
+
+if [ -n "$TRAVIS_OS_NAME" ]; then
     export PYTHON_VERSIONS_DIR="$CURRENT_DIR/../../python2_virtualenv"
 else
-    export CATS_EXAMPLE_DIR="$HOME/.clowder_tests/cats"
-    export LLVM_EXAMPLE_DIR="$HOME/.clowder_tests/llvm-projects"
-    export SWIFT_EXAMPLE_DIR="$HOME/.clowder_tests//swift-projects"
-    export COCOS2D_EXAMPLE_DIR="$HOME/.clowder_tests/cocos2d-objc"
     export PYTHON_VERSIONS_DIR="$HOME/python2_virtualenv"
 fi
 
@@ -45,6 +45,26 @@ if [ -n "$TRAVIS_OS_NAME" ]; then
     $PYTHON_VERSION "$UNITTTEST_PATH/test_group.py" -v "$CATS_EXAMPLE_DIR" || exit 1
     $PYTHON_VERSION "$UNITTTEST_PATH/test_project.py" -v "$CATS_EXAMPLE_DIR" || exit 1
     $PYTHON_VERSION "$UNITTTEST_PATH/test_source.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_fleet.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_worktree.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_runner.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_api.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_perf.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_project_repo_recursive.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_maintenance.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_project_repo.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_batch.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_backend.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_logs.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_watcher.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_metrics.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_profiler.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_trace.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_progress.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_timestamp_index.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_forall.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_ref_reader.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_status_cache.py" -v "$CATS_EXAMPLE_DIR" || exit 1
 else
     $PYTHON_VERSION "$UNITTTEST_PATH/test_clowder_repo.py" -v "$CATS_EXAMPLE_DIR" || exit 1
     $PYTHON_VERSION "$UNITTTEST_PATH/test_fork.py" -v "$CATS_EXAMPLE_DIR" || exit 1
@@ -52,4 +72,24 @@ else
     $PYTHON_VERSION "$UNITTTEST_PATH/test_group.py" -v "$CATS_EXAMPLE_DIR" || exit 1
     $PYTHON_VERSION "$UNITTTEST_PATH/test_project.py" -v "$CATS_EXAMPLE_DIR" || exit 1
     $PYTHON_VERSION "$UNITTTEST_PATH/test_source.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_fleet.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_worktree.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_runner.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_api.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_perf.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_project_repo_recursive.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_maintenance.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_project_repo.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_batch.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_backend.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_logs.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_watcher.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_metrics.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_profiler.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_trace.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_progress.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_timestamp_index.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_forall.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_ref_reader.py" -v "$CATS_EXAMPLE_DIR" || exit 1
+    $PYTHON_VERSION "$UNITTTEST_PATH/test_status_cache.py" -v "$CATS_EXAMPLE_DIR" || exit 1
 fi
@@ -0,0 +1,147 @@
+"""Test clowder.api Workspace against local upstreams"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import clowder.util.logs as logs
+from clowder.api import Workspace
+from clowder.error.clowder_error import ClowderError
+
+__clowder_yaml__ = """defaults:
+    ref: refs/heads/master
+    remote: origin
+    source: local
+sources:
+    - name: local
+      url: file://{0}
+groups:
+    - name: cats
+      projects:
+        - name: kit
+          path: black-cats/kit
+        - name: sasha
+          path: black-cats/sasha
+    - name: broken
+      projects:
+        - name: missing
+          path: missing
+"""
+
+
+class WorkspaceTest(unittest.TestCase):
+    """api Workspace test subclass"""
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.upstream_path = os.path.join(self.directory, 'upstream')
+        self.root_directory = os.path.join(self.directory, 'workspace')
+        for name in ['kit', 'sasha']:
+            seed_path = os.path.join(self.directory, 'seed', name)
+            os.makedirs(seed_path)
+            self._git(seed_path, 'init', '--quiet')
+            self._commit(seed_path, 'first')
+            self._git(seed_path, 'branch', '-M', 'master')
+            self._git(self.directory, 'clone', '--quiet', '--bare', seed_path,
+                      os.path.join(self.upstream_path, name + '.git'))
+        os.makedirs(os.path.join(self.root_directory, '.clowder'))
+        with open(os.path.join(self.root_directory, '.clowder', 'clowder.yaml'), 'w') as yaml_file:
+            yaml_file.write(__clowder_yaml__.format(self.upstream_path))
+        os.symlink(os.path.join('.clowder', 'clowder.yaml'), os.path.join(self.root_directory, 'clowder.yaml'))
+        self.workspace = Workspace(self.root_directory)
+
+    def tearDown(self):
+
+        logs.__run__ = None
+        logs.__logs__.clear()
+        shutil.rmtree(self.directory)
+
+    def test_forall(self):
+        """Test forall() returns output of command in each project"""
+
+        self.workspace.herd(group_names=['cats'])
+        results = self.workspace.forall('git rev-parse --abbrev-ref HEAD', group_names=['cats'])
+        self.assertEqual([(r['name'], r['status'], r['output']) for r in results],
+                         [('kit', 'ok', 'master'), ('sasha', 'ok', 'master')])
+        self.assertRaises(ClowderError, self.workspace.forall, 'exit 1', project_names=['kit'],
+                          ignore_errors=False)
+
+    def test_herd(self):
+        """Test herd() clones projects and returns a record for each"""
+
+        results = self.workspace.herd(group_names=['cats'], jobs=2)
+        self.assertEqual([(r['name'], r['path'], r['status'], r['error']) for r in results],
+                         [('kit', 'black-cats/kit', 'ok', None), ('sasha', 'black-cats/sasha', 'ok', None)])
+        self.assertEqual(self._git(os.path.join(self.root_directory, 'black-cats', 'kit'), 'rev-parse', 'HEAD'),
+                         self._git(os.path.join(self.upstream_path, 'kit.git'), 'rev-parse', 'master'))
+
+    def test_herd_failed(self):
+        """Test herd() returns failed record for project without upstream instead of exiting"""
+
+        results = self.workspace.herd(project_names=['missing', 'kit'])
+        self.assertEqual([(r['name'], r['status']) for r in results], [('kit', 'ok'), ('missing', 'failed')])
+        self.assertTrue(results[1]['error'])
+
+    def test_reset(self):
+        """Test reset() moves branch back to upstream"""
+
+        self.workspace.herd(project_names=['kit'])
+        kit_path = os.path.join(self.root_directory, 'black-cats', 'kit')
+        upstream_sha = self._git(kit_path, 'rev-parse', 'HEAD')
+        self._commit(kit_path, 'local')
+        results = self.workspace.reset(project_names=['kit'])
+        self.assertEqual([(r['name'], r['status']) for r in results], [('kit', 'ok')])
+        self.assertEqual(self._git(kit_path, 'rev-parse', 'HEAD'), upstream_sha)
+
+    def test_status(self):
+        """Test status() record fields from workspace loaded once"""
+
+        controller = self.workspace.controller
+        self.workspace.herd(project_names=['kit'])
+        self._commit(os.path.join(self.root_directory, 'black-cats', 'kit'), 'local')
+        records = self.workspace.status(group_names=['cats'])
+        self.assertTrue(self.workspace.controller is controller)
+        self.assertEqual(records[0], {'name': 'kit', 'path': 'black-cats/kit', 'group': 'cats', 'missing': False,
+                                      'ref': 'master', 'detached': False, 'dirty': False,
+                                      'local_commits': 1, 'upstream_commits': 0})
+        self.assertEqual(records[1], {'name': 'sasha', 'path': 'black-cats/sasha', 'group': 'cats',
+                                      'missing': True, 'ref': None, 'detached': None, 'dirty': None,
+                                      'local_commits': None, 'upstream_commits': None})
+
+    def test_unknown_names(self):
+        """Test unknown group and project names raise ClowderError"""
+
+        self.assertRaises(ClowderError, self.workspace.herd, group_names=['dogs'])
+        self.assertRaises(ClowderError, self.workspace.status, project_names=['jules'])
+        self.assertRaises(ClowderError, self.workspace.forall, 'true', group_names=['cats', 'dogs'])
+
+    def test_invalid_yaml(self):
+        """Test loading invalid clowder.yaml raises ClowderError"""
+
+        with open(os.path.join(self.root_directory, '.clowder', 'clowder.yaml'), 'w') as yaml_file:
+            yaml_file.write('groups: []\n')
+        self.assertRaises(ClowderError, self.workspace.reload)
+        self.assertEqual([p.name for p in self.workspace.projects()], ['kit', 'sasha', 'missing'])
+
+    def _commit(self, path, message):
+        """Create empty commit in repo"""
+
+        self._git(path, '-c', 'user.name=clowder', '-c', 'user.email=clowder@example.com',
+                  'commit', '--quiet', '--allow-empty', '-m', message)
+
+    @staticmethod
+    def _git(path, *args):
+        """Run git command in directory, returning output"""
+
+        output = subprocess.check_output(('git',) + args, cwd=path)
+        return output.decode('utf-8').strip()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Test git backends"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import clowder.git.backend as backend
+from clowder.git.ref_reader import RefReader
+
+
+class GitBackendTest(unittest.TestCase):
+    """git backend test subclass"""
+
+    backend_name = 'git'
+
+    def setUp(self):
+
+        if not backend.available(self.backend_name):
+            self.skipTest(self.backend_name + ' backend is not available')
+        self.repo_path = tempfile.mkdtemp()
+        self._git('init', '--quiet')
+        self._git('config', 'user.name', 'clowder')
+        self._git('config', 'user.email', 'clowder@example.com')
+        self._git('remote', 'add', 'origin', 'https://example.com/cats.git')
+        self._write('file.txt')
+        self._git('add', 'file.txt')
+        self._git('commit', '--quiet', '-m', 'first')
+        self._git('branch', '-M', 'master')
+        self.first_sha = self._git('rev-parse', 'HEAD')
+        self._git('commit', '--quiet', '--allow-empty', '-m', 'second')
+        self.second_sha = self._git('rev-parse', 'HEAD')
+        self.backend = backend.__backends__[self.backend_name](self.repo_path, RefReader(self.repo_path))
+
+    def tearDown(self):
+
+        if hasattr(self, 'repo_path'):
+            shutil.rmtree(self.repo_path)
+
+    def test_commits(self):
+        """Test ahead_behind(), is_ancestor(), and short_sha()"""
+
+        self.assertEqual(self.backend.ahead_behind(self.second_sha, self.first_sha), (1, 0))
+        self.assertEqual(self.backend.ahead_behind(self.first_sha, self.second_sha), (0, 1))
+        self.assertTrue(self.backend.is_ancestor(self.first_sha, self.second_sha))
+        self.assertTrue(self.backend.is_ancestor(self.second_sha, self.second_sha))
+        self.assertFalse(self.backend.is_ancestor(self.second_sha, self.first_sha))
+        self.assertTrue(self.second_sha.startswith(self.backend.short_sha(self.second_sha)))
+
+    def test_dirty(self):
+        """Test is_dirty() and untracked_files()"""
+
+        self.assertFalse(self.backend.is_dirty())
+        self.assertFalse(self.backend.untracked_files())
+        self._write('new.txt')
+        self.assertFalse(self.backend.is_dirty())
+        self.assertTrue(self.backend.untracked_files())
+        os.remove(os.path.join(self.repo_path, 'new.txt'))
+        self._write('file.txt')
+        self.assertTrue(self.backend.is_dirty())
+        self.assertFalse(self.backend.untracked_files())
+        self._git('checkout', '--quiet', '--', 'file.txt')
+        os.remove(os.path.join(self.repo_path, 'file.txt'))
+        self.assertTrue(self.backend.untracked_files())
+
+    def test_refs(self):
+        """Test current_branch(), is_detached(), resolve_ref(), sha(), and remote_url()"""
+
+        self.assertEqual(self.backend.current_branch(), 'master')
+        self.assertFalse(self.backend.is_detached())
+        self.assertEqual(self.backend.resolve_ref('refs/heads/master'), self.second_sha)
+        self.assertEqual(self.backend.resolve_ref('refs/heads/missing'), None)
+        self.assertEqual(self.backend.sha(), self.second_sha)
+        self.assertEqual(self.backend.remote_url('origin'), 'https://example.com/cats.git')
+        self._git('checkout', '--quiet', self.first_sha)
+        self.assertEqual(self.backend.current_branch(), None)
+        self.assertTrue(self.backend.is_detached())
+        self.assertEqual(self.backend.sha(), self.first_sha)
+
+    def _git(self, *args):
+        """Run git command in test repo, returning output"""
+
+        output = subprocess.check_output(('git',) + args, cwd=self.repo_path)
+        return output.decode('utf-8').strip()
+
+    def _write(self, name):
+        """Write file in test repo"""
+
+        with open(os.path.join(self.repo_path, name), 'a') as raw_file:
+            raw_file.write('change\n')
+
+
+class Pygit2BackendTest(GitBackendTest):
+    """pygit2 backend test subclass"""
+
+    backend_name = 'pygit2'
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
@@ -0,0 +1,44 @@
+"""Test batch file parsing"""
+
+import argparse
+import sys
+import unittest
+
+from clowder.cmd import batch_global_options, read_batch_commands
+from clowder.util.subparsers import parse_global_options
+
+
+class BatchTest(unittest.TestCase):
+    """batch test subclass"""
+
+    def test_batch_global_options(self):
+        """Test batch_global_options() returns global options set in batch file command"""
+
+        args = parse_global_options(['--trace', 'herd.jsonl', '--metrics-file', 'herd.txt', 'herd', '--parallel'])
+        self.assertEqual(batch_global_options(args), ['--metrics-file', '--trace'])
+        self.assertEqual(batch_global_options(parse_global_options(['herd', '--parallel'])), [])
+        self.assertEqual(batch_global_options(argparse.Namespace(clowder_command='status')), [])
+
+    def test_read_batch_commands(self):
+        """Test read_batch_commands() skips blank lines and comments and splits like a shell"""
+
+        lines = ['# update workspace\n',
+                 'herd --parallel\n',
+                 '\n',
+                 'clowder forall -c "git gc --auto"  # maintenance\n',
+                 "status --fetch\n"]
+        self.assertEqual(read_batch_commands(lines),
+                         [(2, ['herd', '--parallel']),
+                          (4, ['forall', '-c', 'git gc --auto']),
+                          (5, ['status', '--fetch'])])
+
+    def test_read_batch_commands_unbalanced_quote(self):
+        """Test read_batch_commands() raises ValueError for unbalanced quotes"""
+
+        self.assertRaises(ValueError, read_batch_commands, ['forall -c "git status\n'])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
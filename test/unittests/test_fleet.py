@@ -0,0 +1,83 @@
+"""Test benchmark fleet generation"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import yaml
+
+import clowder_test.benchmark as benchmark
+import clowder_test.fleet as fleet
+
+
+class FleetTest(unittest.TestCase):
+    """fleet test subclass"""
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_generate_fleet(self):
+        """Test generate_fleet() creates bare repos with history, branches, and tags, and a clowder repo"""
+
+        generated = fleet.generate_fleet(fleet.Fleet(self.directory, 2, commits=5, branches=2, tags=3, files=3,
+                                                     groups=2), jobs=2)
+        repos_dir = os.path.join(self.directory, 'repos')
+        self.assertEqual(sorted(os.listdir(repos_dir)), ['clowder.git', 'project-0000.git', 'project-0001.git'])
+        for name in generated.project_names():
+            repo_path = os.path.join(repos_dir, name + '.git')
+            self.assertEqual(self._git(repo_path, 'rev-parse', '--is-bare-repository'), 'true')
+            self.assertEqual(self._git(repo_path, 'rev-list', '--count', 'master'), '5')
+            self.assertEqual(self._refs(repo_path, 'refs/heads/'), ['branch-0', 'branch-1', 'master'])
+            self.assertEqual(self._refs(repo_path, 'refs/tags/'), ['v0', 'v1', 'v2'])
+            self.assertEqual(self._git(repo_path, 'ls-tree', '--name-only', 'master').split(),
+                             ['file-0000.txt', 'file-0001.txt', 'file-0002.txt'])
+
+        clowder_yaml = yaml.safe_load(self._git(os.path.join(repos_dir, 'clowder.git'), 'show',
+                                                'master:clowder.yaml'))
+        self.assertEqual(clowder_yaml['sources'], [{'name': 'fleet', 'url': 'file://' + repos_dir}])
+        self.assertEqual(clowder_yaml['defaults']['source'], 'fleet')
+        self.assertEqual([(g['name'], [p['name'] for p in g['projects']]) for g in clowder_yaml['groups']],
+                         [('group-0', ['project-0000']), ('group-1', ['project-0001'])])
+        self.assertRaises(fleet.FleetError, fleet.generate_fleet, generated)
+
+    def test_generate_fleet_submodules(self):
+        """Test generate_fleet() adds library repos as submodules of each project"""
+
+        generated = fleet.generate_fleet(fleet.Fleet(self.directory, 1, commits=2, submodules=1), jobs=1)
+        project_path = os.path.join(generated.repos_dir(), 'project-0000.git')
+        library_path = os.path.join(generated.repos_dir(), 'library-00.git')
+        self.assertEqual(self._git(project_path, 'ls-tree', 'master', 'library-00').split()[:3],
+                         ['160000', 'commit', self._git(library_path, 'rev-parse', 'master')])
+        self.assertTrue('recursive: true' in generated.get_yaml())
+
+    def test_median(self):
+        """Test benchmark median()"""
+
+        self.assertEqual(benchmark.median([3.0, 1.0, 2.0]), 2.0)
+        self.assertEqual(benchmark.median([4.0, 1.0, 2.0, 3.0]), 2.5)
+
+    @staticmethod
+    def _git(path, *args):
+        """Run git command in directory, returning output"""
+
+        output = subprocess.check_output(('git',) + args, cwd=path)
+        return output.decode('utf-8').strip()
+
+    def _refs(self, path, prefix):
+        """Return short names of refs with prefix"""
+
+        return self._git(path, 'for-each-ref', '--format=%(refname)', prefix).replace(prefix, '').split()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Test forall runner"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from clowder.util.forall import ForallRunner, ForallTask
+
+
+class ForallTest(unittest.TestCase):
+    """forall test subclass"""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+        for name in ['mu', 'duke', 'kit']:
+            os.mkdir(os.path.join(self.root, name))
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def test_run_json(self):
+        """Test run() collecting output and return codes"""
+
+        tasks = self._tasks('echo $PROJECT_NAME; test $PROJECT_NAME != duke', ['mu', 'duke', 'kit'])
+        ForallRunner(2, output='json').run(tasks)
+        self.assertEqual([t.output for t in tasks], [['mu'], ['duke'], ['kit']])
+        self.assertEqual([t.failed() for t in tasks], [False, True, False])
+
+    def test_run_missing(self):
+        """Test run() with missing project directory"""
+
+        tasks = self._tasks('true', ['mu', 'cat'])
+        ForallRunner(2, output='json').run(tasks)
+        self.assertEqual([t.missing for t in tasks], [False, True])
+        self.assertFalse(any([t.failed() for t in tasks]))
+
+    def test_run_python(self):
+        """Test run_python() calling function with project context"""
+
+        with open(os.path.join(self.root, 'forall_hooks.py'), 'w') as hooks_file:
+            hooks_file.write('import os\n\n\n'
+                             'def check(context):\n'
+                             '    assert os.getcwd() == os.path.realpath(context.full_path)\n'
+                             '    return [context.name, context.ref]\n')
+        tasks = self._tasks('forall_hooks:check', ['mu', 'cat'])
+        for task in tasks:
+            task.env.update({'PROJECT_PATH': task.full_path, 'CLOWDER_PATH': self.root,
+                             'PROJECT_REMOTE': 'origin', 'PROJECT_REF': 'refs/heads/master'})
+        ForallRunner(1, output='json').run_python(tasks)
+        self.assertEqual(tasks[0].return_code, 0)
+        self.assertEqual(tasks[0].result, ['mu', 'refs/heads/master'])
+        self.assertTrue(tasks[1].missing)
+
+    def _tasks(self, command, names):
+        """Return forall tasks for project names"""
+
+        return [ForallTask(n, n, os.path.join(self.root, n), command, {'PROJECT_NAME': n}) for n in names]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Test project logs"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import clowder.util.logs as logs
+
+
+class ProjectLogTest(unittest.TestCase):
+    """logs test subclass"""
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.path, 'project.log')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.path)
+
+    def test_read(self):
+        """Test read() returns everything written"""
+
+        log = logs.ProjectLog(self.log_file)
+        log.write(b'one\ntw')
+        log.write(b'o\nthree\n')
+        self.assertEqual(log.read(), 'one\ntwo\nthree\n')
+
+    def test_rotate(self):
+        """Test write() rotates log and drops the oldest file"""
+
+        log = logs.ProjectLog(self.log_file, max_bytes=8, backups=2)
+        for line in (b'first\n', b'second\n', b'third\n', b'fourth\n'):
+            log.write(line)
+        self.assertEqual(log.files(), [self.log_file + '.2', self.log_file + '.1', self.log_file])
+        self.assertEqual(log.read(), 'second\nthird\nfourth\n')
+
+    def test_tail(self):
+        """Test tail() keeps only the last lines, including a partial line"""
+
+        log = logs.ProjectLog(self.log_file, tail_lines=2)
+        log.write(b'one\ntwo\nthree\nfour')
+        self.assertEqual(log.tail(), ['three', 'four'])
+        log.write(b'\r50%\r100%\n')
+        self.assertEqual(log.tail(), ['50%', '100%'])
+
+
+class RunTest(unittest.TestCase):
+    """logs run test subclass"""
+
+    def setUp(self):
+
+        self.root_directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root_directory, '.clowder', '.git', 'info'))
+
+    def tearDown(self):
+
+        logs.__run__ = None
+        logs.__logs__.clear()
+        shutil.rmtree(self.root_directory)
+
+    def test_project_log(self):
+        """Test project_log() creates run directory lazily and excludes it from clowder repo"""
+
+        self.assertEqual(logs.project_log(os.path.join(self.root_directory, 'llvm')), None)
+        logs.start(self.root_directory, 'clowder herd')
+        self.assertEqual(logs.run_ids(self.root_directory), [])
+
+        log = logs.project_log(os.path.join(self.root_directory, 'llvm', 'clang'))
+        log.write(b'fatal: error\n')
+        run_id = logs.run_ids(self.root_directory)[0]
+        self.assertEqual(logs.load_run(self.root_directory, run_id)['command'], 'clowder herd')
+        self.assertEqual(logs.run_log_files(self.root_directory, run_id),
+                         [(os.path.join('llvm', 'clang'), [log.log_file])])
+        self.assertEqual(logs.tail(os.path.join(self.root_directory, 'llvm', 'clang')),
+                         (log.log_file, ['fatal: error']))
+        with open(os.path.join(self.root_directory, '.clowder', '.git', 'info', 'exclude')) as raw_file:
+            self.assertEqual(raw_file.read(), '/logs/\n')
+
+    def test_start_again(self):
+        """Test start() gives each command run by the same process its own run"""
+
+        logs.start(self.root_directory, 'clowder herd')
+        logs.project_log(os.path.join(self.root_directory, 'llvm')).write(b'first\n')
+        logs.start(self.root_directory, 'clowder reset')
+        self.assertEqual(logs.tail(os.path.join(self.root_directory, 'llvm')), None)
+        logs.project_log(os.path.join(self.root_directory, 'llvm')).write(b'second\n')
+
+        run_ids = logs.run_ids(self.root_directory)
+        self.assertEqual(len(run_ids), 2)
+        self.assertEqual([logs.load_run(self.root_directory, r)['command'] for r in run_ids],
+                         ['clowder herd', 'clowder reset'])
+
+        run = logs.current_run()
+        logs.set_run(None)
+        self.assertEqual(logs.project_log(os.path.join(self.root_directory, 'llvm')), None)
+        logs.set_run(run)
+        self.assertEqual(logs.project_log(os.path.join(self.root_directory, 'llvm')).read(), 'second\n')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
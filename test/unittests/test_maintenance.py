@@ -0,0 +1,145 @@
+"""Test maintenance"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import clowder.util.formatting as fmt
+import clowder.util.trace as trace
+from clowder.git.repo import GitRepo
+
+
+class MaintenanceTest(unittest.TestCase):
+    """maintenance test subclass"""
+
+    def setUp(self):
+
+        self.repo_path = tempfile.mkdtemp()
+        self.trace_file = os.path.join(self.repo_path, 'trace.jsonl')
+        self._git('init', '--quiet')
+        self._git('config', 'user.name', 'clowder')
+        self._git('config', 'user.email', 'clowder@example.com')
+        self._commit('first')
+        self.environ = os.environ.get('CLOWDER_TRACE')
+        os.environ['CLOWDER_TRACE'] = self.trace_file
+
+    def tearDown(self):
+
+        if self.environ is None:
+            del os.environ['CLOWDER_TRACE']
+        else:
+            os.environ['CLOWDER_TRACE'] = self.environ
+        shutil.rmtree(self.repo_path)
+
+    def test_batch_size(self):
+        """Test _multi_pack_index_batch_size() leaves the largest pack alone"""
+
+        repo = self._repo()
+        self.assertEqual(repo._multi_pack_index_batch_size(), 0)
+        self._git('repack', '-d', '-q')
+        self.assertEqual(repo._multi_pack_index_batch_size(), 0)
+        self._commit('second')
+        self._git('repack', '-d', '-q')
+        self._commit('third')
+        self._git('repack', '-d', '-q')
+        sizes = sorted([os.path.getsize(os.path.join(self._pack_dir(), p))
+                        for p in os.listdir(self._pack_dir()) if p.endswith('.pack')], reverse=True)
+        self.assertEqual(len(sizes), 3)
+        self.assertEqual(repo._multi_pack_index_batch_size(), sizes[1] + 1)
+
+    def test_maintenance(self):
+        """Test maintenance() runs every step and packs loose objects"""
+
+        self._git('repack', '-d', '-q')
+        self._commit('second')
+        size_before, size_after, failed_command = self._repo().maintenance()
+        self.assertEqual(failed_command, None)
+        self.assertTrue(size_before > 0)
+        self.assertTrue(size_after > 0)
+        self.assertEqual(self._commands(),
+                         ['repack', 'prune', 'multi-pack-index', 'multi-pack-index', 'multi-pack-index',
+                          'commit-graph'])
+        self.assertTrue(trace.load_trace(self.trace_file)[4]['argv'][-1].startswith('--batch-size='))
+        self.assertFalse([d for d in os.listdir(os.path.join(self.repo_path, '.git', 'objects'))
+                          if len(d) == 2])
+
+    def test_maintenance_single_pack(self):
+        """Test maintenance() skips multi-pack-index repack with a single pack"""
+
+        _, _, failed_command = self._repo().maintenance()
+        self.assertEqual(failed_command, None)
+        self.assertEqual(self._commands(),
+                         ['repack', 'prune', 'multi-pack-index', 'multi-pack-index', 'commit-graph'])
+
+    def test_maintenance_failed(self):
+        """Test maintenance() stops at the first failed command"""
+
+        self._git('config', 'pack.depth', 'invalid')
+        _, _, failed_command = self._repo().maintenance()
+        self.assertEqual(failed_command, 'git repack -d -l -q')
+        self.assertEqual(self._commands(), ['repack'])
+
+    def test_maintenance_result(self):
+        """Test maintenance_result()"""
+
+        result = {'duration': 1.25, 'size_before': 2048, 'size_after': 1024, 'failed_command': None}
+        self.assertEqual(fmt.maintenance_result('cats', result),
+                         fmt.path('cats') + ' 1.2s 2.0 KB -> 1.0 KB (' + fmt.size_change(-1024) + ')')
+        result['failed_command'] = 'git prune'
+        self.assertTrue(fmt.maintenance_result('cats', result).endswith(fmt.command_failed_error('git prune')))
+        self.assertTrue('Project is missing' in fmt.maintenance_result('cats', None))
+
+    def test_maintenance_summary(self):
+        """Test maintenance_summary()"""
+
+        self.assertEqual(fmt.maintenance_summary(2, 3 * 1024 * 1024, 4.0),
+                         ' - Maintained 2 projects in 4.0s, reclaimed 3.0 MB')
+        self.assertEqual(fmt.maintenance_summary(2, -512, 4.0),
+                         ' - Maintained 2 projects in 4.0s, objects grew by 512.0 B')
+
+    def test_size(self):
+        """Test size() and size_change()"""
+
+        self.assertEqual(fmt.size(0), '0.0 B')
+        self.assertEqual(fmt.size(1536), '1.5 KB')
+        self.assertEqual(fmt.size(5 * 1024 ** 4), '5120.0 GB')
+        self.assertEqual(fmt.size_change(0), '0.0 B')
+        self.assertTrue('+1.0 KB' in fmt.size_change(1024))
+        self.assertTrue('-1.0 KB' in fmt.size_change(-1024))
+
+    def _commands(self):
+        """Return git subcommands recorded in trace"""
+
+        return [r['argv'][1] for r in trace.load_trace(self.trace_file)]
+
+    def _commit(self, message):
+        """Commit new file"""
+
+        with open(os.path.join(self.repo_path, message + '.txt'), 'w') as text_file:
+            text_file.write(message * 1000 + '\n')
+        self._git('add', message + '.txt')
+        self._git('commit', '--quiet', '-m', message)
+
+    def _git(self, *args):
+        """Run git command in repo without tracing it"""
+
+        subprocess.check_call(('git',) + args, cwd=self.repo_path)
+
+    def _pack_dir(self):
+        """Return pack directory"""
+
+        return os.path.join(self.repo_path, '.git', 'objects', 'pack')
+
+    def _repo(self):
+        """Return GitRepo for repo"""
+
+        return GitRepo(self.repo_path, 'origin', 'refs/heads/master', print_output=False)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Test metrics"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+import clowder.clowder_controller as clowder_controller
+import clowder.util.metrics as metrics
+
+
+class MetricsTest(unittest.TestCase):
+    """metrics test subclass"""
+
+    def setUp(self):
+
+        self.metrics_dir = tempfile.mkdtemp()
+        self.metrics = metrics.Metrics(os.path.join(self.metrics_dir, 'clowder.prom'), 'herd')
+        self.metrics.start_time = 100.0
+        self.metrics.projects = [
+            {'project': 'jrgoodle/kit', 'command': 'herd', 'status': 'ok', 'duration': 0.2, 'bytes': 0,
+             'noop': True},
+            {'project': 'jrgoodle/kishka', 'command': 'herd', 'status': 'ok', 'duration': 3.0, 'bytes': 2048,
+             'noop': False, 'worker': True},
+            {'project': 'jrgoodle/sasha', 'command': 'herd', 'status': 'failed', 'duration': 45.0, 'bytes': 0,
+             'noop': False},
+            {'project': 'jrgoodle/jules', 'command': 'herd', 'status': 'skipped', 'duration': 0.0, 'bytes': 0,
+             'noop': False}]
+
+    def tearDown(self):
+
+        shutil.rmtree(self.metrics_dir)
+
+    def test_render(self):
+        """Test render() output"""
+
+        self.metrics.pools = [(2, 4.0, None)]
+        lines = metrics.render(self.metrics, end_time=110.0).splitlines()
+        self.assertEqual(lines[-1], '# EOF')
+        self.assertIn('clowder_command_duration_seconds{command="herd"} 10.0', lines)
+        self.assertIn('clowder_projects{command="herd",status="ok"} 2', lines)
+        self.assertIn('clowder_projects{command="herd",status="skipped"} 1', lines)
+        self.assertIn('clowder_projects_noop{command="herd"} 1', lines)
+        self.assertIn('clowder_project_duration_seconds_bucket{command="herd",status="ok",le="0.25"} 1', lines)
+        self.assertIn('clowder_project_duration_seconds_bucket{command="herd",status="ok",le="+Inf"} 2', lines)
+        self.assertIn('clowder_project_duration_seconds_sum{command="herd",status="failed"} 45.0', lines)
+        self.assertIn('clowder_project_fetched_bytes{command="herd",project="jrgoodle/kishka",status="ok"} 2048',
+                      lines)
+        self.assertIn('clowder_pool_utilization_ratio{command="herd"} 0.375', lines)
+
+    def test_write(self):
+        """Test write() leaves only the metrics file"""
+
+        metrics.write(self.metrics)
+        self.assertEqual(os.listdir(self.metrics_dir), ['clowder.prom'])
+
+
+class MetricsPoolTest(unittest.TestCase):
+    """metrics worker pool test subclass"""
+
+    def setUp(self):
+
+        self.metrics_dir = tempfile.mkdtemp()
+        metrics.__metrics__ = metrics.Metrics(os.path.join(self.metrics_dir, 'clowder.prom'), 'herd')
+
+    def tearDown(self):
+
+        clowder_controller.close_pool(terminate=True)
+        metrics.__metrics__ = None
+        shutil.rmtree(self.metrics_dir)
+
+    def test_pool_results(self):
+        """Test results sent by more workers than fit in the queue's pipe are collected without blocking exit"""
+
+        count = 1000
+        for index in range(count):
+            result = {'project': 'project-' + str(index).zfill(200), 'command': 'herd', 'status': 'ok',
+                      'duration': 0.1, 'bytes': 0, 'noop': True}
+            clowder_controller.__clowder_results__.append(
+                clowder_controller.clowder_pool().apply_async(metrics.record_project, args=(result,)))
+        clowder_controller.pool_handler(count)
+
+        # Worker processes wait for everything they sent to be read before exiting
+        thread = threading.Thread(target=clowder_controller.close_pool)
+        thread.daemon = True
+        thread.start()
+        thread.join(60)
+        self.assertFalse(thread.is_alive())
+        metrics.drain()
+        self.assertEqual(len(metrics.__metrics__.projects), count)
+        self.assertTrue(all([p['worker'] for p in metrics.__metrics__.projects]))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Test perf regression gate"""
+
+import sys
+import unittest
+
+import clowder_test.perf as perf
+
+
+class PerfTest(unittest.TestCase):
+    """perf test subclass"""
+
+    def setUp(self):
+
+        self.baseline = {'medians': {'status': {'10': 1.0, '100': 4.0}, 'forall': {'10': 0.1}},
+                         'tolerance': {'default': 0.25, 'forall': 0.5},
+                         'min_delta': 0.05}
+
+    def test_statuses(self):
+        """Test compare() statuses"""
+
+        results = [self._result('status', 10, 1.2),
+                   self._result('status', 100, 5.1),
+                   self._result('status', 100, 2.9),
+                   self._result('reset', 10, 1.0),
+                   self._result('status', 10, None, failed=True)]
+        self.assertEqual([r[5] for r in perf.compare(self.baseline, results)],
+                         ['ok', 'regression', 'faster', 'new', 'failed'])
+
+    def test_rows(self):
+        """Test compare() row contents"""
+
+        rows = perf.compare(self.baseline, [self._result('status', 100, 5.1), self._result('reset', 10, 1.0)])
+        self.assertEqual(rows, [('status', 100, 4.0, 5.1, 0.25, 'regression'),
+                                ('reset', 10, None, 1.0, 0.25, 'new')])
+
+    def test_min_delta(self):
+        """Test compare() ignores relative changes smaller than min_delta"""
+
+        results = [self._result('forall', 10, 0.2), self._result('forall', 10, 0.04)]
+        self.assertEqual([r[5] for r in perf.compare(self.baseline, results)], ['regression', 'faster'])
+        self.baseline['min_delta'] = 0.2
+        self.assertEqual([r[5] for r in perf.compare(self.baseline, results)], ['ok', 'ok'])
+        self.assertEqual([r[5] for r in perf.compare(self.baseline, results, min_delta=0.01)],
+                         ['regression', 'faster'])
+        del self.baseline['min_delta']
+        results = [self._result('forall', 10, 0.149)]
+        self.assertEqual([r[5] for r in perf.compare(self.baseline, results, tolerance=0.1)], ['ok'])
+
+    def test_tolerance(self):
+        """Test compare() per-scenario tolerance and --tolerance override"""
+
+        self.baseline['tolerance']['forall'] = 0.75
+        results = [self._result('forall', 10, 0.16), self._result('status', 10, 1.4)]
+        self.assertEqual([(r[4], r[5]) for r in perf.compare(self.baseline, results)],
+                         [(0.75, 'ok'), (0.25, 'regression')])
+        self.assertEqual([(r[4], r[5]) for r in perf.compare(self.baseline, results, tolerance=1.0)],
+                         [(1.0, 'ok'), (1.0, 'ok')])
+        self.assertEqual([(r[4], r[5]) for r in perf.compare(self.baseline, results, tolerance=0.1)],
+                         [(0.1, 'regression'), (0.1, 'regression')])
+        del self.baseline['tolerance']
+        self.assertEqual([r[4] for r in perf.compare(self.baseline, results)], [perf.__default_tolerance__] * 2)
+
+    @staticmethod
+    def _result(scenario, projects, median, failed=False):
+        """Return benchmark result"""
+
+        return {'scenario': scenario, 'projects': projects, 'median': median, 'failed': failed}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
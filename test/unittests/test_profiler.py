@@ -0,0 +1,43 @@
+"""Test profiler"""
+
+import sys
+import unittest
+from collections import OrderedDict
+
+import clowder.util.profiler as profiler
+
+
+class ProfilerTest(unittest.TestCase):
+    """profiler test subclass"""
+
+    def tearDown(self):
+
+        profiler.__phases__ = None
+
+    def test_phase_disabled(self):
+        """Test phase() does nothing when profiling is disabled"""
+
+        with profiler.phase('manifest load'):
+            pass
+        self.assertFalse(profiler.enabled())
+        self.assertEqual(profiler.phase_breakdown(), [])
+
+    def test_phase_breakdown(self):
+        """Test phase() accumulates total, count, and max duration per phase"""
+
+        profiler.__phases__ = OrderedDict()
+        profiler.record_phase('project herd', 2.0)
+        profiler.record_phase('output', 0.5)
+        profiler.record_phase('project herd', 1.0)
+        with profiler.phase('output'):
+            pass
+        breakdown = profiler.phase_breakdown()
+        self.assertEqual([p[0] for p in breakdown], ['project herd', 'output'])
+        self.assertEqual(breakdown[0][1:], (3.0, 2, 2.0))
+        self.assertEqual(breakdown[1][2], 2)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Test progress"""
+
+import sys
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from clowder.util.progress import Progress, parse_git_progress
+
+
+class ProgressTest(unittest.TestCase):
+    """progress test subclass"""
+
+    def test_parse_count(self):
+        """Test parse_git_progress() with object count"""
+
+        self.assertEqual(parse_git_progress('remote: Enumerating objects: 9, done.        '),
+                         ('negotiate', None, 9, None, None, None))
+
+    def test_parse_receive(self):
+        """Test parse_git_progress() with bytes and throughput"""
+
+        self.assertEqual(parse_git_progress('Receiving objects:  45% (450/1000), 1.50 MiB | 512.00 KiB/s'),
+                         ('receive', 45, 450, 1000, 1572864, 524288))
+
+    def test_parse_resolve(self):
+        """Test parse_git_progress() with delta resolution"""
+
+        self.assertEqual(parse_git_progress('Resolving deltas: 100% (20/20), done.'),
+                         ('resolve', 100, 20, 20, None, None))
+
+    def test_parse_other(self):
+        """Test parse_git_progress() with non-progress output"""
+
+        self.assertEqual(parse_git_progress('From github.com:JrGoodle/cats'), None)
+        self.assertEqual(parse_git_progress('remote: Total 5 (delta 1), reused 0 (delta 0)'), None)
+
+    def test_single_line(self):
+        """Test Progress writes single status lines when not writing to a terminal"""
+
+        stream = StringIO()
+        progress = Progress(stream=stream)
+        progress.start(2)
+        progress._apply('kishka', ('receive', 45, 450, 1000, 2048, None))  # pylint: disable=W0212
+        progress.update()
+        progress.complete()
+        progress.close()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('Progress: 0/2 projects'))
+        self.assertTrue(lines[1].startswith('Progress: 2/2 projects, 2.0 KB received'))
+        self.assertTrue(lines[1].endswith('active: kishka (receive  45% 450/1000 objects)'))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
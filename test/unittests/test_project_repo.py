@@ -0,0 +1,128 @@
+"""Test project repo herding and prefetching against a local upstream"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from clowder.error.clowder_git_error import ClowderGitError
+from clowder.git.project_repo import ProjectRepo
+from clowder.model.project import Project
+from clowder.model.source import Source
+
+
+class ProjectRepoHerdTest(unittest.TestCase):
+    """project repo herd and prefetch test subclass"""
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.upstream_path = os.path.join(self.directory, 'upstream')
+        self.repo_path = os.path.join(self.directory, 'project')
+        self.url = 'file://' + self.upstream_path
+        os.makedirs(self.upstream_path)
+        self._git(self.upstream_path, 'init', '--quiet')
+        self._commit(self.upstream_path, 'first')
+        self._git(self.upstream_path, 'branch', '-M', 'master')
+        self._commit(self.upstream_path, 'second')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_herd_fast_forward(self):
+        """Test herd() fast-forwards branch to fetched upstream branch"""
+
+        self._git(self.directory, 'clone', '--quiet', self.url, self.repo_path)
+        self._commit(self.upstream_path, 'third')
+        self._repo().herd(self.url)
+        self.assertEqual(self._git(self.repo_path, 'rev-parse', 'HEAD'),
+                         self._git(self.upstream_path, 'rev-parse', 'HEAD'))
+
+    def test_herd_diverged(self):
+        """Test herd() fails instead of merging a branch that diverged from upstream"""
+
+        self._git(self.directory, 'clone', '--quiet', self.url, self.repo_path)
+        self._commit(self.upstream_path, 'third')
+        self._commit(self.repo_path, 'local')
+        self.assertRaises(ClowderGitError, self._repo().herd, self.url)
+        self._repo().herd(self.url, rebase=True)
+        self.assertEqual(self._git(self.repo_path, 'rev-parse', 'HEAD~1'),
+                         self._git(self.upstream_path, 'rev-parse', 'HEAD'))
+
+    def test_herd_branch_shallow(self):
+        """Test herd_branch() updates a shallow clone with commits past its depth"""
+
+        self._git(self.directory, 'clone', '--quiet', '--depth', '1', self.url, self.repo_path)
+        for message in ('third', 'fourth', 'fifth'):
+            self._commit(self.upstream_path, message)
+        self._repo().herd_branch(self.url, 'master', depth=1)
+        self.assertEqual(self._git(self.repo_path, 'rev-parse', 'HEAD'),
+                         self._git(self.upstream_path, 'rev-parse', 'HEAD'))
+
+    def test_prefetch(self):
+        """Test prefetch() fetches into refs/prefetch without touching remote refs, FETCH_HEAD, or work tree"""
+
+        self._git(self.directory, 'clone', '--quiet', self.url, self.repo_path)
+        self._git(self.repo_path, 'fetch', '--quiet', 'origin')
+        fetch_head_file = os.path.join(self.repo_path, '.git', 'FETCH_HEAD')
+        with open(fetch_head_file) as raw_file:
+            fetch_head = raw_file.read()
+        remote_sha = self._git(self.repo_path, 'rev-parse', 'refs/remotes/origin/master')
+        self._commit(self.upstream_path, 'third')
+        self._git(self.upstream_path, 'branch', 'feature')
+
+        self.assertEqual(self._repo().prefetch('origin'), None)
+        upstream_sha = self._git(self.upstream_path, 'rev-parse', 'HEAD')
+        self.assertEqual(self._git(self.repo_path, 'for-each-ref', '--format=%(refname) %(objectname)',
+                                   'refs/prefetch/').splitlines(),
+                         ['refs/prefetch/remotes/origin/feature ' + upstream_sha,
+                          'refs/prefetch/remotes/origin/master ' + upstream_sha])
+        self.assertEqual(self._git(self.repo_path, 'rev-parse', 'refs/remotes/origin/master'), remote_sha)
+        self.assertEqual(self._git(self.repo_path, 'rev-parse', 'HEAD'), remote_sha)
+        self.assertFalse(self._git(self.repo_path, 'for-each-ref', 'refs/remotes/origin/feature'))
+        self.assertEqual(self._git(self.repo_path, 'status', '--porcelain'), '')
+        with open(fetch_head_file) as raw_file:
+            self.assertEqual(raw_file.read(), fetch_head)
+
+    def test_prefetch_missing(self):
+        """Test prefetch() skips missing remote and Project.prefetch() skips missing project"""
+
+        self._git(self.directory, 'clone', '--quiet', self.url, self.repo_path)
+        self.assertEqual(self._repo().prefetch('upstream'), None)
+        self.assertFalse(self._git(self.repo_path, 'for-each-ref', 'refs/prefetch/'))
+
+        sources = [Source({'name': 'local', 'url': 'file://' + self.directory})]
+        defaults = {'ref': 'refs/heads/master', 'remote': 'origin', 'source': 'local', 'depth': 0}
+        project = Project(self.directory, {'name': 'upstream', 'path': 'project'}, {}, defaults, sources)
+        result = project.prefetch()
+        self.assertEqual((result['remotes'], result['failed_command']), (['origin'], None))
+        self.assertTrue(self._git(self.repo_path, 'for-each-ref', 'refs/prefetch/remotes/origin/master'))
+        missing = Project(self.directory, {'name': 'upstream', 'path': 'missing'}, {}, defaults, sources)
+        self.assertEqual(missing.prefetch(), None)
+
+    def _commit(self, path, message):
+        """Create empty commit in repo"""
+
+        self._git(path, '-c', 'user.name=clowder', '-c', 'user.email=clowder@example.com',
+                  'commit', '--quiet', '--allow-empty', '-m', message)
+
+    @staticmethod
+    def _git(path, *args):
+        """Run git command in directory, returning output"""
+
+        output = subprocess.check_output(('git',) + args, cwd=path)
+        return output.decode('utf-8').strip()
+
+    def _repo(self):
+        """Return project repo that raises instead of exiting on failure"""
+
+        return ProjectRepo(self.repo_path, 'origin', 'refs/heads/master', parallel=True, print_output=False)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
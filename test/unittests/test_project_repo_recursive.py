@@ -0,0 +1,100 @@
+"""Test ProjectRepoRecursive class"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from clowder.git.project_repo_recursive import ProjectRepoRecursive
+
+
+class ProjectRepoRecursiveTest(unittest.TestCase):
+    """project_repo_recursive test subclass"""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+        for name in ['kit', 'cats', 'dogs']:
+            self._init(name)
+        self._submodule_add('cats', 'kit', 'nested')
+        self._init('super')
+        self._submodule_add('super', 'cats', 'cats')
+        self._submodule_add('super', 'dogs', 'dogs dir')
+        self._git('super', 'submodule', 'update', '--init', '--recursive')
+        self.repo_path = os.path.join(self.root, 'super')
+        self.repo = ProjectRepoRecursive(self.repo_path, 'origin', 'refs/heads/master', print_output=False)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def test_clean(self):
+        """Test _dirty_submodules() with clean submodules and a modified file in the repo itself"""
+
+        self._write('super/file.txt')
+        self.assertEqual(self.repo._dirty_submodules(), set())
+        self.assertFalse(self.repo.is_dirty_submodule('cats'))
+
+    def test_modified(self):
+        """Test _dirty_submodules() with modified submodule"""
+
+        self._write('super/cats/file.txt')
+        self.assertEqual(self.repo._dirty_submodules(), set(['cats']))
+        self.assertTrue(self.repo.is_dirty_submodule('cats'))
+        self.assertFalse(self.repo.is_dirty_submodule('dogs dir'))
+
+    def test_new_commit(self):
+        """Test _dirty_submodules() with new commit checked out in submodule"""
+
+        self._git('super/dogs dir', 'commit', '--quiet', '--allow-empty', '-m', 'second')
+        self.assertEqual(self.repo._dirty_submodules(), set(['dogs dir']))
+
+    def test_nested(self):
+        """Test _dirty_submodules() reports top level submodule for changes in nested submodule"""
+
+        self._write('super/cats/nested/file.txt')
+        self.assertEqual(self.repo._dirty_submodules(), set(['cats']))
+
+    def test_untracked(self):
+        """Test _dirty_submodules() with untracked file in submodule path containing a space"""
+
+        self._write('super/dogs dir/untracked.txt')
+        self.assertEqual(self.repo._dirty_submodules(), set(['dogs dir']))
+        self.assertTrue(self.repo.is_dirty_submodule('dogs dir'))
+
+    def _git(self, path, *args):
+        """Run git command in repo, allowing local submodule urls"""
+
+        subprocess.check_output(('git', '-c', 'protocol.file.allow=always') + args,
+                                cwd=os.path.join(self.root, path), stderr=subprocess.STDOUT)
+
+    def _init(self, name):
+        """Create repo with one commit"""
+
+        os.makedirs(os.path.join(self.root, name))
+        self._git(name, 'init', '--quiet')
+        self._git(name, 'config', 'user.name', 'clowder')
+        self._git(name, 'config', 'user.email', 'clowder@example.com')
+        self._write(name + '/file.txt')
+        self._git(name, 'add', 'file.txt')
+        self._git(name, 'commit', '--quiet', '-m', 'first')
+
+    def _submodule_add(self, name, url, path):
+        """Add and commit submodule"""
+
+        self._git(name, 'submodule', '--quiet', 'add', os.path.join(self.root, url), path)
+        self._git(name, 'commit', '--quiet', '-m', 'add ' + path)
+
+    def _write(self, path):
+        """Write file with its own path as contents"""
+
+        with open(os.path.join(self.root, path), 'a') as text_file:
+            text_file.write(path + '\n')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
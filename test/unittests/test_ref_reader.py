@@ -0,0 +1,122 @@
+"""Test ref reader"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from clowder.git.ref_reader import RefReader, find_packed_ref, parse_config
+
+
+class RefReaderTest(unittest.TestCase):
+    """ref_reader test subclass"""
+
+    master_sha = 'f2e20031ddce5cb097105f4d8ccbc77f4ac20709'
+    tag_sha = '6ce5538d2c09fda2f56a9ca3859f5e8cfe706bf0'
+
+    def setUp(self):
+
+        self.repo_path = tempfile.mkdtemp()
+        self.git_dir = os.path.join(self.repo_path, '.git')
+        os.makedirs(os.path.join(self.git_dir, 'refs', 'heads'))
+        self._write('HEAD', 'ref: refs/heads/master\n')
+        self._write('refs/heads/master', self.master_sha + '\n')
+        self._write('config', '[core]\n'
+                              '\tbare = false\n'
+                              '[remote "origin"]\n'
+                              '\turl = gh:JrGoodle/cats.git\n'
+                              '\tfetch = +refs/heads/*:refs/remotes/origin/*\n'
+                              '[branch "master"]\n'
+                              '\tremote = origin\n'
+                              '\tmerge = refs/heads/master\n'
+                              '[url "git@github.com:"]\n'
+                              '\tinsteadOf = gh: ; shorthand\n')
+        self.reader = RefReader(self.repo_path)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.repo_path)
+
+    def test_current_branch(self):
+        """Test current_branch() and is_detached()"""
+
+        self.assertEqual(self.reader.current_branch(), 'master')
+        self.assertFalse(self.reader.is_detached())
+        self._write('HEAD', self.master_sha + '\n')
+        self.assertEqual(self.reader.current_branch(), None)
+        self.assertTrue(self.reader.is_detached())
+
+    def test_find_packed_ref(self):
+        """Test find_packed_ref() with sorted packed-refs"""
+
+        lines = [b'# pack-refs with: peeled fully-peeled sorted ']
+        for index in range(100):
+            lines.append(('%040d refs/tags/v%03d' % (index, index)).encode('utf-8'))
+            if index % 3 == 0:
+                lines.append(('^%039d' % index).encode('utf-8'))
+        contents = b'\n'.join(lines) + b'\n'
+        for index in range(100):
+            ref = ('refs/tags/v%03d' % index).encode('utf-8')
+            self.assertEqual(find_packed_ref(contents, ref), '%040d' % index)
+        self.assertEqual(find_packed_ref(contents, b'refs/tags/v100'), None)
+        self.assertEqual(find_packed_ref(contents, b'refs/heads/master'), None)
+
+    def test_packed_refs(self):
+        """Test resolve_ref() falling back to packed-refs"""
+
+        self._write('packed-refs', '# pack-refs with: peeled fully-peeled sorted \n' +
+                    self.master_sha + ' refs/remotes/origin/master\n' +
+                    self.tag_sha + ' refs/tags/v1.0\n')
+        self.assertEqual(self.reader.resolve_ref('refs/heads/master'), self.master_sha)
+        self.assertEqual(self.reader.resolve_ref('refs/tags/v1.0'), self.tag_sha)
+        self.assertTrue(self.reader.ref_exists('refs/remotes/origin/master'))
+        self.assertFalse(self.reader.ref_exists('refs/tags/v2.0'))
+
+    def test_parse_config(self):
+        """Test parse_config()"""
+
+        config = parse_config('[Core]\n\tFileMode\n[alias]\n\tl = "log --oneline" # comment\n')
+        self.assertEqual(config['core.filemode'], ['true'])
+        self.assertEqual(config['alias.l'], ['log --oneline'])
+
+    def test_remotes(self):
+        """Test remote_names(), remote_url(), and tracking_branch()"""
+
+        self.assertEqual(self.reader.remote_names(), ['origin'])
+        self.assertEqual(self.reader.remote_url('origin'), 'git@github.com:JrGoodle/cats.git')
+        self.assertEqual(self.reader.remote_url('upstream'), None)
+        self.assertEqual(self.reader.tracking_branch('master'), 'refs/remotes/origin/master')
+        self.assertEqual(self.reader.tracking_branch('develop'), None)
+
+    def test_worktree(self):
+        """Test reading HEAD from linked worktree and refs from the shared git directory"""
+
+        worktree_path = os.path.join(self.repo_path, 'feature')
+        os.makedirs(os.path.join(self.git_dir, 'worktrees', 'feature'))
+        os.makedirs(worktree_path)
+        self._write('worktrees/feature/HEAD', 'ref: refs/heads/feature\n')
+        self._write('worktrees/feature/commondir', '../..\n')
+        self._write('refs/heads/feature', self.tag_sha + '\n')
+        with open(os.path.join(worktree_path, '.git'), 'w') as raw_file:
+            raw_file.write('gitdir: ../.git/worktrees/feature\n')
+
+        reader = RefReader(worktree_path)
+        self.assertEqual(reader.git_dir(), os.path.join(self.git_dir, 'worktrees', 'feature'))
+        self.assertEqual(reader.common_dir(), self.git_dir)
+        self.assertEqual(reader.sha(), self.tag_sha)
+        self.assertEqual(reader.remote_names(), ['origin'])
+        self.assertEqual(reader.worktree_branches(), set(['master']))
+        self.assertEqual(self.reader.worktree_branches(), set(['feature']))
+
+    def _write(self, name, contents):
+        """Write file in .git directory"""
+
+        with open(os.path.join(self.git_dir, *name.split('/')), 'w') as raw_file:
+            raw_file.write(contents)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
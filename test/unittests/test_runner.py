@@ -0,0 +1,72 @@
+"""Test clowder-test suite runner"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+import clowder_test.runner as runner
+
+
+class RunnerTest(unittest.TestCase):
+    """runner test subclass"""
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.suites = [runner.Suite(name, './test_' + name + '.sh', self.directory)
+                       for name in ['cats', 'clean', 'forall', 'herd', 'import', 'reset', 'status']]
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_parse_shard(self):
+        """Test parse_shard()"""
+
+        self.assertEqual(runner.parse_shard('2/4'), (2, 4))
+        self.assertEqual(runner.parse_shard('1/1'), (1, 1))
+        for shard in ['0/3', '4/3', '1/0', 'a/b', '2', '1/2/3']:
+            self.assertRaises(ValueError, runner.parse_shard, shard)
+
+    def test_shard_suites(self):
+        """Test shard_suites() partitions suites round robin"""
+
+        shards = [runner.shard_suites(self.suites, index, 3) for index in range(1, 4)]
+        self.assertEqual([[s.name for s in shard] for shard in shards],
+                         [['cats', 'herd', 'status'], ['clean', 'import'], ['forall', 'reset']])
+        names = [s.name for shard in shards for s in shard]
+        self.assertEqual(sorted(names), sorted([s.name for s in self.suites]))
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(runner.shard_suites(self.suites, 1, 1), self.suites)
+        self.assertEqual([s.name for s in runner.shard_suites(self.suites, 8, 8)], [])
+
+    def test_write_junit(self):
+        """Test write_junit() reports failures and captured output"""
+
+        log_file = os.path.join(self.directory, 'herd.log')
+        with open(log_file, 'w') as raw_file:
+            raw_file.write('\n'.join(['line ' + str(i) for i in range(60)]) + '\n')
+        results = [runner.SuiteResult(self.suites[0], 0, 1.5),
+                   runner.SuiteResult(self.suites[3], 2, 2.25, log_file=log_file)]
+        junit_file = os.path.join(self.directory, 'reports', 'junit.xml')
+        runner.write_junit(results, junit_file)
+
+        root = ElementTree.parse(junit_file).getroot()
+        self.assertEqual((root.tag, root.get('tests'), root.get('failures'), root.get('time')),
+                         ('testsuites', '2', '1', '3.750'))
+        testcases = root.findall('testsuite/testcase')
+        self.assertEqual([(t.get('name'), t.get('time')) for t in testcases], [('cats', '1.500'), ('herd', '2.250')])
+        self.assertEqual(testcases[0].findall('failure') + testcases[0].findall('system-out'), [])
+        failure = testcases[1].find('failure')
+        self.assertEqual(failure.get('message'), 'exit code 2')
+        self.assertEqual(failure.text.splitlines(), ['line ' + str(i) for i in range(10, 60)])
+        self.assertEqual(testcases[1].find('system-out').text.splitlines()[0], 'line 0')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
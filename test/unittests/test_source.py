@@ -1,5 +1,6 @@
 """Test source class"""
 
+import os
 import sys
 import unittest
 
@@ -24,11 +25,32 @@ class SourceTest(unittest.TestCase):
         self.assertEqual(self.ssh_source.get_yaml(), __github_ssh_source_yaml__)
         self.assertEqual(self.https_source.get_yaml(), __github_https_source_yaml__)
 
+    def test_file_url_prefix(self):
+        """Test file url prefix"""
+
+        self.assertEqual(Source({'name': 'mirror', 'url': 'file:///srv/mirror/'}).get_url_prefix(),
+                         'file:///srv/mirror/')
+
     def test_https_url_prefix(self):
         """Test https url prefix"""
 
         self.assertEqual(self.https_source.get_url_prefix(), 'https://github.com/')
 
+    def test_is_local(self):
+        """Test is_local() method"""
+
+        self.assertFalse(self.ssh_source.is_local())
+        self.assertFalse(self.https_source.is_local())
+        self.assertTrue(Source({'name': 'mirror', 'url': 'file:///srv/mirror'}).is_local())
+        self.assertTrue(Source({'name': 'mirror', 'url': '/srv/mirror'}).is_local())
+
+    def test_local_path_url_prefix(self):
+        """Test local path url prefix"""
+
+        self.assertEqual(Source({'name': 'mirror', 'url': '/srv/mirror'}).get_url_prefix(), '/srv/mirror/')
+        self.assertEqual(Source({'name': 'mirror', 'url': '~/mirror'}).get_url_prefix(),
+                         os.path.expanduser('~/mirror') + '/')
+
     def test_member_variables(self):
         """Test the state of all project member variables initialized"""
 
@@ -37,6 +59,12 @@ class SourceTest(unittest.TestCase):
         self.assertEqual(self.https_source.name, 'github')
         self.assertEqual(self.https_source.url, 'https://github.com')
 
+    def test_ssh_host(self):
+        """Test ssh_host() method"""
+
+        self.assertEqual(self.ssh_source.ssh_host(), 'git@github.com')
+        self.assertEqual(self.https_source.ssh_host(), None)
+
     def test_ssh_url_prefix(self):
         """Test ssh url prefix"""
 
@@ -0,0 +1,73 @@
+"""Test status cache"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import clowder.git.status_cache as status_cache
+
+
+class StatusCacheTest(unittest.TestCase):
+    """status_cache test subclass"""
+
+    def setUp(self):
+
+        self.repo_path = tempfile.mkdtemp()
+        self.git_dir = os.path.join(self.repo_path, '.git')
+        os.makedirs(os.path.join(self.git_dir, 'refs', 'heads'))
+        self._write('HEAD', 'ref: refs/heads/master\n')
+        self._write('config', '[core]\n')
+        self._write('refs/heads/master', 'f2e20031ddce5cb097105f4d8ccbc77f4ac20709\n')
+        self.refs = ['refs/heads/master']
+        self.status = {'detached': False, 'ref': 'master', 'local_commits': '1', 'upstream_commits': '0'}
+
+    def tearDown(self):
+
+        shutil.rmtree(self.repo_path)
+
+    def test_load_missing(self):
+        """Test load_status() without saved status"""
+
+        self.assertEqual(status_cache.load_status(self.repo_path), None)
+
+    def test_load_unchanged(self):
+        """Test load_status() with unchanged refs"""
+
+        self._save()
+        self.assertEqual(status_cache.load_status(self.repo_path), self.status)
+
+    def test_load_changed_ref(self):
+        """Test load_status() after ref was updated"""
+
+        self._save()
+        self._write('refs/heads/master.lock', '6ce5538d2c09fda2f56a9ca3859f5e8cfe706bf0\n')
+        os.rename(os.path.join(self.git_dir, 'refs', 'heads', 'master.lock'),
+                  os.path.join(self.git_dir, 'refs', 'heads', 'master'))
+        self.assertEqual(status_cache.load_status(self.repo_path), None)
+
+    def test_load_packed_refs(self):
+        """Test load_status() after refs were packed"""
+
+        self._save()
+        self._write('packed-refs', '# pack-refs with: peeled fully-peeled sorted\n')
+        self.assertEqual(status_cache.load_status(self.repo_path), None)
+
+    def _save(self):
+        """Save status with current signature"""
+
+        ref_signature = status_cache.signature(self.repo_path, self.refs)
+        status_cache.save_status(self.repo_path, self.status, self.refs, ref_signature)
+
+    def _write(self, name, contents):
+        """Write file in .git directory"""
+
+        with open(os.path.join(self.git_dir, *name.split('/')), 'w') as raw_file:
+            raw_file.write(contents)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
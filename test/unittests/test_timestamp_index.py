@@ -0,0 +1,146 @@
+"""Test timestamp index"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import clowder.git.timestamp_index as timestamp_index
+from clowder.git.repo import GitRepo
+
+
+class TimestampIndexTest(unittest.TestCase):
+    """timestamp_index test subclass"""
+
+    entries = [(100, 'a' * 40, 'Kit <kit@cats.com>'),
+               (200, 'b' * 40, 'Duke <duke@cats.com>'),
+               (200, 'c' * 40, 'Kit <kit@cats.com>'),
+               (300, 'd' * 40, 'Duke <duke@cats.com>')]
+
+    def setUp(self):
+
+        self.repo_path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.repo_path, '.git'))
+
+    def tearDown(self):
+
+        shutil.rmtree(self.repo_path)
+
+    def test_find_sha(self):
+        """Test find_sha()"""
+
+        self.assertEqual(timestamp_index.find_sha(self.entries, 99), None)
+        self.assertEqual(timestamp_index.find_sha(self.entries, 100), 'a' * 40)
+        self.assertEqual(timestamp_index.find_sha(self.entries, 299), 'c' * 40)
+        self.assertEqual(timestamp_index.find_sha(self.entries, 1000), 'd' * 40)
+        self.assertEqual(timestamp_index.find_sha(self.entries, 250, author='Duke'), 'b' * 40)
+        self.assertEqual(timestamp_index.find_sha(self.entries, 150, author='Duke'), None)
+
+    def test_parse_iso_timestamp(self):
+        """Test parse_iso_timestamp()"""
+
+        self.assertEqual(timestamp_index.parse_iso_timestamp('2017-05-01T12:00:00+00:00'), 1493640000)
+        self.assertEqual(timestamp_index.parse_iso_timestamp('2017-05-01T05:00:00-07:00'), 1493640000)
+        self.assertEqual(timestamp_index.parse_iso_timestamp('2017-05-01T12:00:00Z'), 1493640000)
+        self.assertEqual(timestamp_index.parse_iso_timestamp('yesterday'), None)
+
+    def test_save_load(self):
+        """Test save_index() and load_index()"""
+
+        timestamp_index.save_index(self.repo_path, 'refs/heads/master', 'd' * 40, 'none', self.entries)
+        self.assertEqual(timestamp_index.load_index(self.repo_path, 'refs/heads/master'),
+                         ('d' * 40, 'none', self.entries))
+        self.assertEqual(timestamp_index.load_index(self.repo_path, 'refs/heads/knead'), (None, None, []))
+
+
+    def test_append_entries(self):
+        """Test append_entries() updates tip and load_index() sorts appended entries"""
+
+        timestamp_index.save_index(self.repo_path, 'refs/heads/master', 'c' * 40, 'none', self.entries[:3])
+        self.assertTrue(timestamp_index.append_entries(self.repo_path, 'refs/heads/master', 'd' * 40, 'none',
+                                                       [self.entries[3], (150, 'e' * 40, 'Kit <kit@cats.com>')]))
+        self.assertEqual(timestamp_index.load_header(self.repo_path, 'refs/heads/master'), ('d' * 40, 'none'))
+        self.assertEqual(timestamp_index.load_index(self.repo_path, 'refs/heads/master')[2],
+                         sorted(self.entries + [(150, 'e' * 40, 'Kit <kit@cats.com>')]))
+        self.assertFalse(timestamp_index.append_entries(self.repo_path, 'refs/heads/master', 'd' * 40, '12-345',
+                                                        []))
+        self.assertFalse(timestamp_index.append_entries(self.repo_path, 'refs/heads/knead', 'd' * 40, 'none', []))
+
+    def test_load_header(self):
+        """Test load_header()"""
+
+        self.assertEqual(timestamp_index.load_header(self.repo_path, 'refs/heads/master'), (None, None))
+        timestamp_index.save_index(self.repo_path, 'refs/heads/master', 'd' * 40, 'none', self.entries)
+        self.assertEqual(timestamp_index.load_header(self.repo_path, 'refs/heads/master'), ('d' * 40, 'none'))
+
+
+class TimestampIndexUpdateTest(unittest.TestCase):
+    """timestamp index update test subclass"""
+
+    def setUp(self):
+
+        self.repo_path = tempfile.mkdtemp()
+        self._git('init', '--quiet')
+        self._commit('first')
+        self._git('branch', '-M', 'master')
+        self.repo = GitRepo(self.repo_path, 'origin', 'refs/heads/master', print_output=False)
+        self.index_file = os.path.join(self.repo_path, '.git', 'clowder', 'timestamps', 'refs', 'heads', 'master')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.repo_path)
+
+    def test_update(self):
+        """Test update_timestamp_index() skips an up to date index and appends commits after fast-forward"""
+
+        self.assertTrue(self.repo.update_timestamp_index('refs/heads/master'))
+        with open(self.index_file) as raw_file:
+            saved = raw_file.read()
+        self.assertTrue(self.repo.update_timestamp_index('refs/heads/master'))
+        os.utime(self.index_file, (0, 0))
+        self.assertTrue(self.repo.update_timestamp_index('refs/heads/master'))
+        self.assertEqual(os.stat(self.index_file).st_mtime, 0)
+
+        self._commit('second')
+        inode = os.stat(self.index_file).st_ino
+        self.assertTrue(self.repo.update_timestamp_index('refs/heads/master'))
+        self.assertEqual(os.stat(self.index_file).st_ino, inode)
+        with open(self.index_file) as raw_file:
+            appended = raw_file.read()
+        self.assertTrue(appended.split('\n', 1)[1].startswith(saved.split('\n', 1)[1]))
+        tip, _, entries = timestamp_index.load_index(self.repo_path, 'refs/heads/master')
+        self.assertEqual(tip, self._git('rev-parse', 'HEAD'))
+        self.assertEqual(sorted([e[1] for e in entries]),
+                         sorted(self._git('rev-list', 'HEAD').split()))
+
+    def test_update_rewritten(self):
+        """Test update_timestamp_index() rebuilds index after history is rewritten"""
+
+        self._commit('second')
+        self.assertTrue(self.repo.update_timestamp_index('refs/heads/master'))
+        self._git('reset', '--quiet', '--hard', 'HEAD~1')
+        self._commit('other')
+        self.assertTrue(self.repo.update_timestamp_index('refs/heads/master'))
+        tip, _, entries = timestamp_index.load_index(self.repo_path, 'refs/heads/master')
+        self.assertEqual(tip, self._git('rev-parse', 'HEAD'))
+        self.assertEqual(sorted([e[1] for e in entries]), sorted(self._git('rev-list', 'HEAD').split()))
+
+    def _commit(self, message):
+        """Create empty commit in repo"""
+
+        self._git('-c', 'user.name=clowder', '-c', 'user.email=clowder@example.com',
+                  'commit', '--quiet', '--allow-empty', '-m', message)
+
+    def _git(self, *args):
+        """Run git command in repo, returning output"""
+
+        output = subprocess.check_output(('git',) + args, cwd=self.repo_path)
+        return output.decode('utf-8').strip()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
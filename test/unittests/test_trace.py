@@ -0,0 +1,94 @@
+"""Test trace"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import clowder.util.trace as trace
+from clowder.util.execute import execute_command
+
+
+class TraceTest(unittest.TestCase):
+    """trace test subclass"""
+
+    def setUp(self):
+
+        self.trace_dir = tempfile.mkdtemp()
+        self.trace_file = os.path.join(self.trace_dir, 'trace.jsonl')
+        self.environ = os.environ.get('CLOWDER_TRACE')
+        os.environ['CLOWDER_TRACE'] = self.trace_file
+
+    def tearDown(self):
+
+        if self.environ is None:
+            del os.environ['CLOWDER_TRACE']
+        else:
+            os.environ['CLOWDER_TRACE'] = self.environ
+        shutil.rmtree(self.trace_dir)
+
+    def test_execute_command(self):
+        """Test execute_command() is recorded"""
+
+        self.assertEqual(execute_command(['echo', 'kit'], self.trace_dir, print_output=False), 0)
+        records = trace.load_trace(self.trace_file)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['argv'], ['echo', 'kit'])
+        self.assertEqual(records[0]['cwd'], self.trace_dir)
+        self.assertEqual(records[0]['exit_code'], 0)
+        self.assertEqual(records[0]['output_bytes'], 4)
+        self.assertEqual(records[0]['pid'], os.getpid())
+
+    def test_export_chrome(self):
+        """Test export_chrome() writes complete events"""
+
+        trace.record('subprocess', 'git fetch origin', self.trace_dir, 10.0, 10.5, 0, 12)
+        chrome_file = os.path.join(self.trace_dir, 'trace.json')
+        trace.export_chrome(self.trace_file, chrome_file)
+        with open(chrome_file) as raw_file:
+            events = json.load(raw_file)['traceEvents']
+        self.assertEqual([e['ph'] for e in events], ['M', 'X'])
+        self.assertEqual(events[1]['name'], 'git fetch')
+        self.assertEqual(events[1]['ts'], 10000000)
+        self.assertEqual(events[1]['dur'], 500000)
+
+    def test_export_chrome_at_exit(self):
+        """Test export_chrome_at_exit() writes Chrome trace next to the trace file and keeps it appendable"""
+
+        exports = []
+        register = trace.atexit.register
+        trace.atexit.register = exports.append
+        try:
+            self.assertTrue(trace.export_chrome_at_exit())
+        finally:
+            trace.atexit.register = register
+        trace.record('subprocess', 'git fetch origin', self.trace_dir, 10.0, 10.5, 0, 12)
+        exports[0]()
+        trace.record('subprocess', 'git fetch upstream', self.trace_dir, 11.0, 11.5, 0, 12)
+        self.assertEqual(len(trace.load_trace(self.trace_file)), 2)
+        with open(trace.chrome_file(self.trace_file)) as raw_file:
+            events = json.load(raw_file)['traceEvents']
+        self.assertEqual([e['ph'] for e in events], ['M', 'X'])
+
+    def test_export_chrome_at_exit_disabled(self):
+        """Test export_chrome_at_exit() without CLOWDER_TRACE"""
+
+        del os.environ['CLOWDER_TRACE']
+        self.assertFalse(trace.export_chrome_at_exit())
+        os.environ['CLOWDER_TRACE'] = self.trace_file
+
+    def test_disabled(self):
+        """Test record() without CLOWDER_TRACE"""
+
+        del os.environ['CLOWDER_TRACE']
+        trace.record('subprocess', 'git fetch origin', self.trace_dir, 10.0, 10.5, 0, 12)
+        self.assertFalse(os.path.exists(self.trace_file))
+        os.environ['CLOWDER_TRACE'] = self.trace_file
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
@@ -0,0 +1,78 @@
+"""Test file system watcher"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from clowder.util.watcher import Watcher
+
+
+@unittest.skipUnless(Watcher.available(), 'inotify is not available')
+class WatcherTest(unittest.TestCase):
+    """watcher test subclass"""
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.path, 'project', '.git', 'refs'))
+        os.makedirs(os.path.join(self.path, 'project', 'src'))
+        self.watcher = Watcher()
+        self.watcher.add('project', os.path.join(self.path, 'project'), recursive=True, exclude=('.git',))
+        self.watcher.add('manifest', self.path, names=('clowder.yaml',))
+
+    def tearDown(self):
+
+        self.watcher.close()
+        shutil.rmtree(self.path)
+
+    def test_change(self):
+        """Test read() after file in subdirectory changed"""
+
+        self._write('project/src/file')
+        self.assertEqual(self.watcher.read(), (set(['project']), set()))
+        self.assertEqual(self.watcher.read(), (set(), set()))
+
+    def test_exclude(self):
+        """Test read() ignores excluded directories"""
+
+        self._write('project/.git/index')
+        self.assertEqual(self.watcher.read(), (set(), set()))
+
+    def test_names(self):
+        """Test read() only reports names watched in directory"""
+
+        self._write('other.yaml')
+        self.assertEqual(self.watcher.read(), (set(), set()))
+        self._write('clowder.yaml')
+        self.assertEqual(self.watcher.read(), (set(['manifest']), set()))
+
+    def test_new_directory(self):
+        """Test read() reports changes in directory created after watch was added"""
+
+        os.makedirs(os.path.join(self.path, 'project', 'new'))
+        self.assertEqual(self.watcher.read(), (set(['project']), set()))
+        self._write('project/new/file')
+        self.assertEqual(self.watcher.read(), (set(['project']), set()))
+
+    def test_removed(self):
+        """Test read() reports key as lost when watched directory is removed"""
+
+        shutil.rmtree(os.path.join(self.path, 'project'))
+        lost = self.watcher.read()[1]
+        self.assertEqual(lost, set(['project']))
+        self.watcher.remove('project')
+        self.assertEqual(self.watcher.count(), 1)
+
+    def _write(self, path):
+        """Write file in test directory"""
+
+        with open(os.path.join(self.path, path), 'w') as raw_file:
+            raw_file.write('change\n')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Test adding and herding project worktrees against a local upstream"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from clowder.git.project_repo import ProjectRepo
+
+
+class WorktreeTest(unittest.TestCase):
+    """worktree test subclass"""
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.upstream_path = os.path.join(self.directory, 'upstream')
+        self.repo_path = os.path.join(self.directory, "kit's workspace", 'kit')
+        self.url = 'file://' + self.upstream_path
+        os.makedirs(self.upstream_path)
+        self._git(self.upstream_path, 'init', '--quiet')
+        self._commit(self.upstream_path, 'first')
+        self._git(self.upstream_path, 'branch', '-M', 'master')
+        self._git(self.upstream_path, 'branch', 'dev')
+        self._git(self.directory, 'clone', '--quiet', self.url, self.repo_path)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_worktree_add_detached(self):
+        """Test worktree_add() checks out detached HEAD at remote branch in path containing a quote"""
+
+        worktree_path = os.path.join(self.directory, "kit's worktree", 'kit')
+        self.assertEqual(self._repo(self.repo_path).worktree_add(worktree_path, 'refs/heads/master'), None)
+        self.assertEqual(self._git(worktree_path, 'rev-parse', 'HEAD'),
+                         self._git(self.repo_path, 'rev-parse', 'refs/remotes/origin/master'))
+        self.assertFalse(self._symbolic_ref(worktree_path))
+
+    def test_worktree_add_branch(self):
+        """Test worktree_add() creates new branch, tracks remote branch, and fails for branch checked out"""
+
+        repo = self._repo(self.repo_path)
+        feature_path = os.path.join(self.directory, "kit's feature", 'kit')
+        self.assertEqual(repo.worktree_add(feature_path, 'refs/heads/master', branch='feature'), None)
+        self.assertEqual(self._symbolic_ref(feature_path), 'refs/heads/feature')
+
+        dev_path = os.path.join(self.directory, "kit's dev", 'kit')
+        self.assertEqual(repo.worktree_add(dev_path, 'refs/heads/master', branch='dev'), None)
+        self.assertEqual(self._symbolic_ref(dev_path), 'refs/heads/dev')
+        self.assertEqual(self._git(dev_path, 'rev-parse', '--abbrev-ref', 'dev@{upstream}'), 'origin/dev')
+
+        master_path = os.path.join(self.directory, "kit's master", 'kit')
+        self.assertTrue(repo.worktree_add(master_path, 'refs/heads/master', branch='master'))
+        self.assertFalse(os.path.isdir(master_path))
+
+    def test_herd_branch_in_other_worktree(self):
+        """Test herd_branch() of branch checked out in another worktree leaves HEAD detached at remote commit"""
+
+        worktree_path = os.path.join(self.directory, "kit's worktree", 'kit')
+        self._repo(self.repo_path).worktree_add(worktree_path, 'refs/heads/master', branch='feature')
+        master_sha = self._git(self.repo_path, 'rev-parse', 'HEAD')
+        self._commit(self.upstream_path, 'second')
+
+        self._repo(worktree_path).herd_branch(self.url, 'master')
+        self.assertFalse(self._symbolic_ref(worktree_path))
+        self.assertEqual(self._git(worktree_path, 'rev-parse', 'HEAD'),
+                         self._git(self.upstream_path, 'rev-parse', 'HEAD'))
+        self.assertEqual(self._git(self.repo_path, 'rev-parse', 'HEAD'), master_sha)
+        self.assertEqual(self._symbolic_ref(self.repo_path), 'refs/heads/master')
+
+    def _commit(self, path, message):
+        """Create empty commit in repo"""
+
+        self._git(path, '-c', 'user.name=clowder', '-c', 'user.email=clowder@example.com',
+                  'commit', '--quiet', '--allow-empty', '-m', message)
+
+    @staticmethod
+    def _git(path, *args):
+        """Run git command in directory, returning output"""
+
+        output = subprocess.check_output(('git',) + args, cwd=path)
+        return output.decode('utf-8').strip()
+
+    @staticmethod
+    def _repo(path):
+        """Return project repo that raises instead of exiting on failure"""
+
+        return ProjectRepo(path, 'origin', 'refs/heads/master', parallel=True, print_output=False)
+
+    @staticmethod
+    def _symbolic_ref(path):
+        """Return branch HEAD points to, or None if HEAD is detached"""
+
+        try:
+            output = subprocess.check_output(['git', 'symbolic-ref', '-q', 'HEAD'], cwd=path)
+        except subprocess.CalledProcessError:
+            return None
+        return output.decode('utf-8').strip()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        _ = sys.argv.pop()
+    unittest.main()